@@ -107,6 +107,21 @@ else:
     }
 
 
+# Cache
+# Memória local por padrão (desenvolvimento e testes). Com vários workers do gunicorn, aponte
+# CACHE_BACKEND/CACHE_LOCATION para um cache compartilhado (Redis, Memcached): a memória local é
+# de cada processo e a invalidação feita em um worker não chega aos outros.
+
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='buffet'),
+        'KEY_PREFIX': 'buffet',
+        'TIMEOUT': config('CACHE_TIMEOUT', default=300, cast=int),
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -149,12 +164,26 @@ STATICFILES_DIRS = [
     BASE_DIR / 'static',
 ]
 
-STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
-
 MEDIA_URL = '/media/'
 
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Os anexos são gravados com o hash do conteúdo como nome, sem duplicar arquivos iguais
+STORAGES = {
+    'default': {
+        'BACKEND': 'core.armazenamento.ArmazenamentoLocalPorConteudo',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+}
+
+# Uploads são lidos em blocos e o hash é calculado enquanto chegam
+FILE_UPLOAD_HANDLERS = [
+    'core.armazenamento.HashMemoryFileUploadHandler',
+    'core.armazenamento.HashTemporaryFileUploadHandler',
+]
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -174,6 +203,13 @@ if SECRET_KEY:
     AWS_LOCATION = 'static'
     AWS_S3_FILE_OVERWRITE = False
     AWS_DEFAULT_ACL = None
-    STATIC_URL = f'https://{AWS_S3_CUSTOM_DOMAIN}/{AWS_LOCATION}/'
-    STATICFILES_STORAGE = 'storages.backends.s3boto3.S3Boto3Storage'
-    DEFAULT_FILE_STORAGE = 'meu_projeto.storage_backends.MediaStorage'
+    if AWS_STORAGE_BUCKET_NAME:
+        STATIC_URL = f'https://{AWS_S3_CUSTOM_DOMAIN}/{AWS_LOCATION}/'
+        STORAGES = {
+            'default': {
+                'BACKEND': 'storages_backend.MediaStorage',
+            },
+            'staticfiles': {
+                'BACKEND': 'storages.backends.s3boto3.S3Boto3Storage',
+            },
+        }
@@ -4,16 +4,19 @@ from .models import (Cliente, Funcao,
                      Documento, DadosBancariosFunc,
                      EnderecoFunc, EnderecoCliente,
                      ContatoCliente, InfoFiscal)
+from .busca import BuscaTextoMixin
+from .cache import ReferenciasEmCacheMixin
 
 
 class EmpresaAdmin(admin.ModelAdmin):
     list_display = ('nome_fantasia', 'cnpj')
 
 
-class ClienteAdmin(admin.ModelAdmin):
+class ClienteAdmin(BuscaTextoMixin, admin.ModelAdmin):
     exclude = ('data_cadastro',)
     list_display = ('nome', 'tipo', 'cpf_cnpj',
                     'email', 'telefone', 'esta_ativo')
+    search_fields = Cliente.CAMPOS_BUSCA
 
     def esta_ativo(self, obj):
         if obj.ativo:
@@ -22,12 +25,15 @@ class ClienteAdmin(admin.ModelAdmin):
             return 'Não'
 
 
-class FuncionarioAdmin(admin.ModelAdmin):
+class FuncionarioAdmin(ReferenciasEmCacheMixin, admin.ModelAdmin):
     exclude = ('usuario',)
 
     list_display = ('nome', 'tipo', 'cpf',
                     'funcao', 'telefone', 'email',
                     'data_admissao', 'tem_foto', 'esta_ativo')
+    list_select_related = ('funcao',)
+    search_fields = ('nome', 'cpf')
+    ordering = ('nome',)
 
     def tem_foto(self, obj):
         if obj.foto:
@@ -44,6 +50,7 @@ class FuncionarioAdmin(admin.ModelAdmin):
 
 class DocumentoAdmin(admin.ModelAdmin):
     list_display = ('empresa', 'nome', 'tem_arquivo', 'vencimento')
+    list_select_related = ('empresa',)
 
     def tem_arquivo(self, obj):
         if obj.arquivo:
@@ -65,24 +72,29 @@ class FuncaoAdmin(admin.ModelAdmin):
 class DadosBancariosFuncAdmin(admin.ModelAdmin):
     list_display = ('funcionario', 'nome_banco', 'nr_bco',
                     'agencia', 'conta', 'pix')
+    list_select_related = ('funcionario',)
 
 
 class EnderecoFuncAdmin(admin.ModelAdmin):
     list_display = ('funcionario', 'logadouro', 'numero',
                     'complemento', 'bairro', 'cidade', 'cep')
+    list_select_related = ('funcionario',)
 
 
 class EnderecoClienteAdmin(admin.ModelAdmin):
     list_display = ('cliente', 'logadouro', 'numero',
                     'complemento', 'bairro', 'cidade', 'cep')
+    list_select_related = ('cliente',)
 
 
 class ContatoClienteAdmin(admin.ModelAdmin):
     list_display = ('cliente', 'nome', 'email', 'cargo', 'telefone')
+    list_select_related = ('cliente',)
 
 
 class InfoFiscalAdmin(admin.ModelAdmin):
     list_display = ('cliente', 'inscricao_estadual', 'inscricao_municipal')
+    list_select_related = ('cliente',)
 
 
 admin.site.register(Cliente, ClienteAdmin)
@@ -4,3 +4,13 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+        from django.db.models.signals import post_migrate
+        from .busca import esquecer_tabelas_busca, garantir_indices_busca
+        from .cache import conectar_invalidacao
+
+        connection_created.connect(esquecer_tabelas_busca, dispatch_uid='busca-conexao')
+        post_migrate.connect(garantir_indices_busca, sender=self, dispatch_uid='busca-migrate')
+        conectar_invalidacao()
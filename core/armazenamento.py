@@ -0,0 +1,95 @@
+import hashlib
+import posixpath
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadhandler import MemoryFileUploadHandler, TemporaryFileUploadHandler
+
+TAMANHO_BLOCO = 64 * 1024
+
+
+def calcular_hash(conteudo):
+    # Usa o hash calculado durante o upload quando existe; senão lê o arquivo em blocos
+    if getattr(conteudo, 'hash_sha256', None):
+        return conteudo.hash_sha256
+    resumo = hashlib.sha256()
+    if hasattr(conteudo, 'seek'):
+        conteudo.seek(0)
+    for bloco in conteudo.chunks(TAMANHO_BLOCO):
+        resumo.update(bloco)
+    if hasattr(conteudo, 'seek'):
+        conteudo.seek(0)
+    return resumo.hexdigest()
+
+
+class ArmazenamentoPorConteudoMixin:
+    # O nome do arquivo passa a ser o hash do conteúdo dentro da pasta do upload_to
+    # (documentos/ab/abcd....pdf). Arquivos iguais caem no mesmo nome e são gravados uma vez só.
+    # Por isso um arquivo pode ser compartilhado por vários registros e não deve ser apagado
+    # junto com um deles.
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.nome_por_conteudo(name, content)
+        try:
+            return super().save(name, content, max_length=max_length)
+        except FileExistsError:
+            # O arquivo já existe, inclusive quando outro upload igual o gravou entre a
+            # verificação e a escrita: é o mesmo conteúdo e não precisa ser gravado de novo
+            if not self.exists(name):
+                raise
+            return name
+
+    def get_available_name(self, name, max_length=None):
+        # O nome vem do conteúdo e não há outro a procurar. Também é chamado pelo _save do
+        # FileSystemStorage quando a escrita encontra o arquivo já criado.
+        if max_length is not None and len(name) > max_length:
+            raise SuspiciousFileOperation(
+                f'O nome "{name}" tem mais de {max_length} caracteres; aumente o max_length do campo.')
+        if self.exists(name):
+            raise FileExistsError(name)
+        return name
+
+    def nome_por_conteudo(self, name, conteudo):
+        pasta, nome = posixpath.split(name)
+        extensao = posixpath.splitext(nome)[1].lower()
+        resumo = calcular_hash(conteudo)
+        return posixpath.join(pasta, resumo[:2], f"{resumo}{extensao}")
+
+
+class ArmazenamentoLocalPorConteudo(ArmazenamentoPorConteudoMixin, FileSystemStorage):
+    # Armazenamento em disco (MEDIA_ROOT) para desenvolvimento e testes
+    pass
+
+
+class HashUploadMixin:
+    # Calcula o SHA-256 enquanto os blocos do upload chegam, para não reler o arquivo ao salvar
+
+    def new_file(self, *args, **kwargs):
+        self.resumo = hashlib.sha256()
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        restante = super().receive_data_chunk(raw_data, start)
+        # None indica que este handler ficou com o bloco
+        if restante is None:
+            self.resumo.update(raw_data)
+        return restante
+
+    def file_complete(self, file_size):
+        arquivo = super().file_complete(file_size)
+        if arquivo is not None:
+            arquivo.hash_sha256 = self.resumo.hexdigest()
+        return arquivo
+
+
+class HashMemoryFileUploadHandler(HashUploadMixin, MemoryFileUploadHandler):
+    pass
+
+
+class HashTemporaryFileUploadHandler(HashUploadMixin, TemporaryFileUploadHandler):
+    pass
@@ -0,0 +1,125 @@
+from django.apps import apps
+from django.db import OperationalError, connections, transaction
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+# O índice de trigramas só encontra trechos a partir de 3 caracteres
+MINIMO_TRIGRAMA = 3
+
+def _tabela_busca(modelo):
+    return f"{modelo._meta.db_table}_busca"
+
+
+def _colunas(modelo, campos):
+    return [modelo._meta.get_field(campo).column for campo in campos]
+
+
+def criar_indice_busca(conexao, modelo, campos):
+    # PostgreSQL: um índice GIN de trigramas por campo sobre UPPER(coluna), a mesma expressão
+    # que o icontains gera, então as buscas por trecho deixam de varrer a tabela.
+    # SQLite: tabela FTS5 "<tabela>_busca" com tokenizador de trigramas espelhando os campos,
+    # mantida por triggers. Sem suporte a FTS5/trigram a busca continua com icontains.
+    # Pode ser chamada de novo: só cria o que falta.
+    q = conexao.ops.quote_name
+    tabela = modelo._meta.db_table
+    colunas = _colunas(modelo, campos)
+    with conexao.cursor() as cursor:
+        if conexao.vendor == 'postgresql':
+            cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+            for coluna in colunas:
+                cursor.execute(f"CREATE INDEX IF NOT EXISTS {q(f'{tabela}_{coluna}_trgm')} ON {q(tabela)} "
+                               f"USING gin ((UPPER({q(coluna)}::text)) gin_trgm_ops)")
+        elif conexao.vendor == 'sqlite':
+            busca = _tabela_busca(modelo)
+            nova = busca not in conexao.introspection.table_names(cursor)
+            try:
+                with transaction.atomic(using=conexao.alias):
+                    cursor.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {q(busca)} USING fts5("
+                                   f"{', '.join(q(coluna) for coluna in colunas)}, content='{tabela}', "
+                                   f"content_rowid='{modelo._meta.pk.column}', tokenize='trigram')")
+            except OperationalError:
+                return
+            lista = ', '.join(q(coluna) for coluna in colunas)
+            novos = ', '.join(f"new.{q(coluna)}" for coluna in colunas)
+            antigos = ', '.join(f"old.{q(coluna)}" for coluna in colunas)
+            pk = q(modelo._meta.pk.column)
+            inserir = f"INSERT INTO {q(busca)} (rowid, {lista}) VALUES (new.{pk}, {novos});"
+            apagar = f"INSERT INTO {q(busca)} ({q(busca)}, rowid, {lista}) VALUES ('delete', old.{pk}, {antigos});"
+            for sufixo, evento, corpo in (('ai', 'INSERT', inserir), ('ad', 'DELETE', apagar),
+                                          ('au', 'UPDATE', apagar + inserir)):
+                cursor.execute(f"CREATE TRIGGER IF NOT EXISTS {q(f'{busca}_{sufixo}')} AFTER {evento} "
+                               f"ON {q(tabela)} BEGIN {corpo} END")
+            if nova:
+                cursor.execute(f"INSERT INTO {q(busca)} ({q(busca)}) VALUES ('rebuild')")
+
+
+def remover_indice_busca(conexao, modelo, campos):
+    q = conexao.ops.quote_name
+    tabela = modelo._meta.db_table
+    with conexao.cursor() as cursor:
+        if conexao.vendor == 'postgresql':
+            for coluna in _colunas(modelo, campos):
+                cursor.execute(f"DROP INDEX IF EXISTS {q(f'{tabela}_{coluna}_trgm')}")
+        elif conexao.vendor == 'sqlite':
+            busca = _tabela_busca(modelo)
+            for sufixo in ('ai', 'ad', 'au'):
+                cursor.execute(f"DROP TRIGGER IF EXISTS {q(f'{busca}_{sufixo}')}")
+            cursor.execute(f"DROP TABLE IF EXISTS {q(busca)}")
+
+
+def esquecer_tabelas_busca(sender, connection, **kwargs):
+    # connection_created: a conexão nova pode apontar para outro banco (o de testes, por exemplo)
+    connection.tabelas_busca = None
+
+
+def garantir_indices_busca(sender, using, **kwargs):
+    # post_migrate (uma vez por migrate): no SQLite, alterar um campo recria a tabela e apaga os
+    # triggers da busca; recria os que faltarem nas tabelas de busca criadas pelas migrações
+    conexao = connections[using]
+    conexao.tabelas_busca = None
+    if conexao.vendor != 'sqlite':
+        return
+    tabelas = conexao.introspection.table_names()
+    for modelo in apps.get_models():
+        if getattr(modelo, 'CAMPOS_BUSCA', None) and _tabela_busca(modelo) in tabelas:
+            criar_indice_busca(conexao, modelo, modelo.CAMPOS_BUSCA)
+
+
+def _tem_tabela_busca(conexao, modelo):
+    # Tabelas do banco lidas uma vez por conexão, não a cada busca
+    if getattr(conexao, 'tabelas_busca', None) is None:
+        conexao.tabelas_busca = set(conexao.introspection.table_names())
+    return _tabela_busca(modelo) in conexao.tabelas_busca
+
+
+def buscar(queryset, termo):
+    # Filtra pelos campos de CAMPOS_BUSCA do modelo: cada palavra de `termo` precisa aparecer,
+    # como trecho e sem diferenciar maiúsculas, em algum deles. No SQLite as palavras com 3 ou
+    # mais caracteres vão para a tabela FTS5; no PostgreSQL o icontains usa os índices de trigramas.
+    modelo = queryset.model
+    palavras = termo.split()
+    conexao = connections[queryset.db]
+    if conexao.vendor == 'sqlite' and _tem_tabela_busca(conexao, modelo):
+        longas = [palavra for palavra in palavras if len(palavra) >= MINIMO_TRIGRAMA]
+        if longas:
+            busca = conexao.ops.quote_name(_tabela_busca(modelo))
+            expressao = ' AND '.join('"%s"' % palavra.replace('"', '""') for palavra in longas)
+            queryset = queryset.filter(pk__in=RawSQL(f"SELECT rowid FROM {busca} WHERE {busca} MATCH %s",
+                                                     [expressao]))
+            palavras = [palavra for palavra in palavras if len(palavra) < MINIMO_TRIGRAMA]
+    for palavra in palavras:
+        condicao = Q()
+        for campo in modelo.CAMPOS_BUSCA:
+            condicao |= Q(**{f'{campo}__icontains': palavra})
+        queryset = queryset.filter(condicao)
+    return queryset
+
+
+class BuscaTextoMixin:
+    # Busca do admin e do autocomplete pelos índices de texto em vez de icontains em search_fields
+    # (que continua definindo a caixa de busca)
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip():
+            return queryset, False
+        return buscar(queryset, search_term), False
@@ -0,0 +1,119 @@
+import hashlib
+import time
+from functools import partial
+
+from django.apps import apps
+from django.contrib import admin
+from django.core.cache import cache
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.forms.models import ModelChoiceField, ModelChoiceIterator
+
+# Tabelas de referência: mudam pouco e aparecem em quase todo formulário e filtro do admin
+REFERENCIAS = ('core.Funcao', 'estoque.Categoria', 'estoque.LocalEstoque', 'estoque.ConversaoUnidade',
+               'eventos.TipoEvento', 'financas.CategoriaFinanceira')
+
+
+def _chave_versao(modelo):
+    return f"versao:{modelo._meta.label_lower}"
+
+
+def versoes(modelos):
+    # A versão de cada modelo fica no próprio cache, visível para todos os workers que o
+    # compartilham. Se sumir (reinício, expulsão), recomeça de um valor novo baseado no relógio
+    # para não voltar a ler chaves de uma versão antiga.
+    chaves = [_chave_versao(modelo) for modelo in modelos]
+    atuais = cache.get_many(chaves)
+    for chave in chaves:
+        if chave not in atuais:
+            cache.add(chave, time.time_ns(), None)
+            atuais[chave] = cache.get(chave)
+    return [atuais[chave] for chave in chaves]
+
+
+def invalidar(modelo):
+    # Incremento atômico no Redis/Memcached: as chaves da versão anterior deixam de ser lidas
+    # e expiram pelo TIMEOUT
+    try:
+        cache.incr(_chave_versao(modelo))
+    except ValueError:
+        cache.add(_chave_versao(modelo), time.time_ns(), None)
+
+
+def em_cache(nome, carregar, modelos, timeout=DEFAULT_TIMEOUT):
+    # Leitura com preenchimento: devolve o valor guardado em `nome` para as versões atuais dos
+    # `modelos` de que ele depende; senão chama carregar() e guarda o resultado
+    sufixo = '.'.join(f"{modelo._meta.label_lower}-{versao}"
+                      for modelo, versao in zip(modelos, versoes(modelos)))
+    chave = f"{nome}:{sufixo}"
+    valor = cache.get(chave)
+    if valor is None:
+        valor = carregar()
+        cache.set(chave, valor, timeout)
+    return valor
+
+
+def consulta_em_cache(queryset, transformar=list, timeout=DEFAULT_TIMEOUT):
+    # Resultado de uma consulta a uma tabela de referência, identificado pelo SQL gerado
+    sql = hashlib.md5(str(queryset.query).encode()).hexdigest()
+    return em_cache(f"consulta:{sql}", partial(transformar, queryset), [queryset.model], timeout)
+
+
+def _invalidar_referencia(sender, using, **kwargs):
+    # Na hora, para o próprio processo; e de novo após o commit, para que um worker que leu a
+    # tabela antes do commit não deixe a versão nova preenchida com os dados antigos
+    invalidar(sender)
+    transaction.on_commit(partial(invalidar, sender), using=using)
+
+
+def conectar_invalidacao():
+    # Só save() e delete() disparam a invalidação; update() e bulk_* em massa nessas tabelas
+    # precisam chamar invalidar(modelo)
+    for label in REFERENCIAS:
+        modelo = apps.get_model(label)
+        post_save.connect(_invalidar_referencia, sender=modelo, dispatch_uid=f"cache-referencia-save-{label}")
+        post_delete.connect(_invalidar_referencia, sender=modelo, dispatch_uid=f"cache-referencia-delete-{label}")
+
+
+class IteradorEmCache(ModelChoiceIterator):
+    def _objetos(self):
+        return consulta_em_cache(self.queryset)
+
+    def __iter__(self):
+        if self.field.empty_label is not None:
+            yield ("", self.field.empty_label)
+        for obj in self._objetos():
+            yield self.choice(obj)
+
+    def __len__(self):
+        return len(self._objetos()) + (1 if self.field.empty_label is not None else 0)
+
+    def __bool__(self):
+        return self.field.empty_label is not None or bool(self._objetos())
+
+
+class CampoReferencia(ModelChoiceField):
+    # Opções do select vindas do cache; a validação do valor enviado continua consultando o banco
+    iterator = IteradorEmCache
+
+
+class ReferenciasEmCacheMixin:
+    # Selects de chaves estrangeiras para as tabelas de REFERENCIAS montados a partir do cache
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if (db_field.related_model._meta.label in REFERENCIAS
+                and db_field.name not in self.get_autocomplete_fields(request)
+                and db_field.name not in self.raw_id_fields):
+            kwargs.setdefault('form_class', CampoReferencia)
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+
+class FiltroReferencia(admin.RelatedFieldListFilter):
+    # Opções do filtro lateral lidas do cache em vez de consultadas a cada carregamento da listagem
+
+    def field_choices(self, field, request, model_admin):
+        ordenacao = ','.join(map(str, self.field_admin_ordering(field, request, model_admin)))
+        nome = f"filtro:{field.model._meta.label_lower}.{field.name}:{ordenacao}"
+        return em_cache(nome, partial(super().field_choices, field, request, model_admin),
+                        [field.related_model])
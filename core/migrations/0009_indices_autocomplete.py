@@ -0,0 +1,19 @@
+# Generated by Django 5.2.2 on 2026-10-18 17:44
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_busca_cliente'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='funcionario',
+            index=models.Index(fields=['nome'], name='funcionario_nome_idx'),
+        ),
+    ]
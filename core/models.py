@@ -28,6 +28,8 @@ class Cliente(models.Model):
         ('GO', 'Governo'),
         ('ON', 'ONG'),
     ]
+    # Campos da busca por trecho (core.busca)
+    CAMPOS_BUSCA = ('nome', 'cpf_cnpj', 'email', 'telefone')
 
     nome = models.CharField(max_length=100)
     tipo = models.CharField(max_length=2, choices=TIPO_CLIENTE)
@@ -80,6 +82,9 @@ class Funcionario(models.Model):
     class Meta:
         verbose_name = _('Colaborador')
         verbose_name_plural = _('Colaboradores')
+        indexes = [
+            models.Index(fields=['nome'], name='funcionario_nome_idx'),
+        ]
 
     def __str__(self):
         return self.nome
@@ -0,0 +1,114 @@
+import json
+
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ORDER_VAR, ChangeList
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+# Parâmetro da URL com a chave primária da última linha da página anterior
+CURSOR_VAR = 'apos'
+# Acima disso a listagem mostra o número de linhas estimado pelo banco em vez de contar
+LIMITE_CONTAGEM_EXATA = 10000
+
+
+def contagem_estimada(queryset):
+    # Linhas que o planejador do PostgreSQL estima para a consulta (EXPLAIN, sem executá-la);
+    # None nos outros bancos
+    conexao = connections[queryset.db]
+    if conexao.vendor != 'postgresql':
+        return None
+    sql, params = queryset.order_by().values('pk').query.get_compiler(queryset.db).as_sql()
+    with conexao.cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plano = cursor.fetchone()[0]
+    if isinstance(plano, str):
+        plano = json.loads(plano)
+    return int(plano[0]['Plan']['Plan Rows'])
+
+
+class PaginadorEstimado(Paginator):
+    estimado = False
+
+    @cached_property
+    def count(self):
+        estimativa = contagem_estimada(self.object_list)
+        if estimativa is not None and estimativa > LIMITE_CONTAGEM_EXATA:
+            self.estimado = True
+            return estimativa
+        return super().count
+
+
+class ChangeListCursor(ChangeList):
+    # Sem ordenação escolhida pelo usuário a listagem vem da mais recente para a mais antiga pela
+    # chave primária, e cada página filtra pk < última linha da anterior: o banco desce pelo índice
+    # da chave em vez de pular OFFSET linhas. Ordenando por uma coluna volta a paginação numerada.
+
+    def __init__(self, request, *args, **kwargs):
+        self.por_cursor = ORDER_VAR not in request.GET
+        self.cursor = request.GET.get(CURSOR_VAR)
+        self.contagem_estimada = False
+        self.primeira_pagina_url = self.proxima_pagina_url = None
+        super().__init__(request, *args, **kwargs)
+        # Filtros, busca e ordenação montam links novos, que recomeçam da primeira página
+        self.params.pop(CURSOR_VAR, None)
+        self.filter_params.pop(CURSOR_VAR, None)
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(CURSOR_VAR, None)
+        return lookup_params
+
+    def get_ordering(self, request, queryset):
+        if self.por_cursor:
+            return ['-pk']
+        return super().get_ordering(request, queryset)
+
+    def get_ordering_field_columns(self):
+        if self.por_cursor:
+            return {}
+        return super().get_ordering_field_columns()
+
+    def get_results(self, request):
+        if not self.por_cursor:
+            super().get_results(request)
+            self.contagem_estimada = self.paginator.estimado
+            return
+
+        pagina = self.queryset
+        if self.cursor is not None:
+            try:
+                pagina = pagina.filter(pk__lt=self.lookup_opts.pk.to_python(self.cursor))
+            except ValidationError:
+                raise IncorrectLookupParameters
+        # Uma linha além da página indica se há uma próxima, sem contar nem consultar de novo
+        linhas = list(pagina[:self.list_per_page + 1])
+        mais = len(linhas) > self.list_per_page
+        self.result_list = linhas[:self.list_per_page]
+
+        # O total é só a estimativa do PostgreSQL; nos outros bancos a listagem não conta as linhas
+        self.paginator = self.model_admin.get_paginator(request, self.queryset, self.list_per_page)
+        estimativa = contagem_estimada(self.queryset)
+        self.contagem_estimada = estimativa is not None
+        self.result_count = estimativa if estimativa is not None else len(self.result_list)
+        self.show_full_result_count = self.model_admin.show_full_result_count
+        self.full_result_count = self.root_queryset.count() if self.show_full_result_count else None
+        self.show_admin_actions = not self.show_full_result_count or bool(self.full_result_count)
+        self.can_show_all = False
+        self.multi_page = self.cursor is not None or mais
+        if self.cursor is not None:
+            self.primeira_pagina_url = self.get_query_string(remove=[CURSOR_VAR])
+        if mais:
+            self.proxima_pagina_url = self.get_query_string({CURSOR_VAR: self.result_list[-1].pk})
+
+
+class PaginacaoCursorMixin:
+    # Para o admin de tabelas que crescem sem limite: paginação por cursor, contagem estimada
+    # no PostgreSQL e sem a segunda contagem da tabela inteira ao lado do total filtrado
+    paginator = PaginadorEstimado
+    show_full_result_count = False
+    change_list_template = 'admin/core/change_list_cursor.html'
+
+    def get_changelist(self, request, **kwargs):
+        return ChangeListCursor
@@ -1,3 +1,173 @@
-from django.test import TestCase
+import tempfile
+from datetime import date
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from estoque.models import Categoria
+from .armazenamento import ArmazenamentoLocalPorConteudo
+from .busca import buscar
+from .cache import consulta_em_cache
+from .models import Cliente, ContatoCliente, DadosBancariosFunc, Documento, Empresa, Funcao, Funcionario
+
+
+class ConsultasChangelistMixin:
+    # Garante que a listagem do admin faz sempre o mesmo número de consultas, com 1 ou com
+    # várias linhas: chaves estrangeiras exibidas precisam estar no list_select_related.
+    linhas = 20
+
+    def setUp(self):
+        super().setUp()
+        # O cache em memória sobrevive ao rollback de cada teste
+        cache.clear()
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@exemplo.com', 'senha'))
+
+    def assertChangelistConsultas(self, modelo, criar, consultas):
+        url = reverse(f'admin:{modelo._meta.app_label}_{modelo._meta.model_name}_changelist')
+        criar(0)
+        with self.assertNumQueries(consultas):
+            self.assertEqual(self.client.get(url).status_code, 200)
+        for numero in range(1, self.linhas):
+            criar(numero)
+        with self.assertNumQueries(consultas):
+            resposta = self.client.get(url)
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.context['cl'].result_count, self.linhas)
+
+    def assertFormularioConsultas(self, modelo, criar, consultas):
+        # O formulário de inclusão também não pode crescer com as tabelas das chaves estrangeiras
+        url = reverse(f'admin:{modelo._meta.app_label}_{modelo._meta.model_name}_add')
+        # A primeira visita preenche o cache de ContentType do processo
+        self.client.get(url)
+        criar(0)
+        with self.assertNumQueries(consultas):
+            self.assertEqual(self.client.get(url).status_code, 200)
+        for numero in range(1, self.linhas):
+            criar(numero)
+        with self.assertNumQueries(consultas):
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+
+class ChangelistCoreTests(ConsultasChangelistMixin, TestCase):
+    def funcionario(self, numero):
+        funcao = Funcao.objects.create(nome=f"Função {numero}", valor_hora=10)
+        return Funcionario.objects.create(nome=f"Colaborador {numero}", funcao=funcao, data_admissao=date.today())
+
+    def cliente(self, numero):
+        return Cliente.objects.create(nome=f"Cliente {numero}", tipo='PF', cpf_cnpj=str(numero))
+
+    def test_funcionario(self):
+        self.assertChangelistConsultas(Funcionario, self.funcionario, 5)
+
+    def test_documento(self):
+        def criar(numero):
+            empresa = Empresa.objects.create(nome_fantasia=f"Empresa {numero}", cnpj=str(numero))
+            Documento.objects.create(nome="Alvará", vencimento=date.today(), empresa=empresa)
+        self.assertChangelistConsultas(Documento, criar, 5)
+
+    def test_dados_bancarios(self):
+        def criar(numero):
+            DadosBancariosFunc.objects.create(nome_banco="Banco", agencia=1, conta=numero,
+                                              funcionario=self.funcionario(numero))
+        self.assertChangelistConsultas(DadosBancariosFunc, criar, 5)
+
+    def test_contato_cliente(self):
+        def criar(numero):
+            ContatoCliente.objects.create(nome="Contato", email="contato@exemplo.com", cargo="Compras",
+                                          telefone="0", cliente=self.cliente(numero))
+        self.assertChangelistConsultas(ContatoCliente, criar, 5)
+
+
+class BuscaClienteTests(ConsultasChangelistMixin, TestCase):
+    def test_busca_por_trechos_de_varios_campos(self):
+        maria = Cliente.objects.create(nome="Maria da Silva", tipo='PF', cpf_cnpj="123.456.789-00",
+                                       telefone="(11) 98765-4321")
+        Cliente.objects.create(nome="João Souza", tipo='PF', cpf_cnpj="987.654.321-00")
+        self.assertEqual(list(buscar(Cliente.objects.all(), "silva 98765")), [maria])
+        cl = self.client.get(reverse('admin:core_cliente_changelist'), {'q': '456.789'}).context['cl']
+        self.assertEqual(list(cl.result_list), [maria])
+
+    @skipUnless(connection.vendor == 'sqlite', "Tabela FTS5 só existe no SQLite")
+    def test_tabelas_de_busca_verificadas_por_conexao(self):
+        Cliente.objects.create(nome="Maria da Silva", tipo='PF', cpf_cnpj="1")
+        # Uma conexão nova (outro banco) não reaproveita o que a anterior encontrou
+        connection.tabelas_busca = set()
+        self.assertNotIn('core_cliente_busca', str(buscar(Cliente.objects.all(), "silva").query))
+        connection_created.send(sender=type(connection), connection=connection)
+        self.assertIn('core_cliente_busca', str(buscar(Cliente.objects.all(), "silva").query))
+
+
+class CacheReferenciasTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_leitura_e_invalidacao(self):
+        garcom = Funcao.objects.create(nome="Garçom", valor_hora=10)
+        nomes = lambda: consulta_em_cache(Funcao.objects.order_by('nome').values_list('nome', flat=True))
+        self.assertEqual(nomes(), ["Garçom"])
+        with self.assertNumQueries(0):
+            self.assertEqual(nomes(), ["Garçom"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Funcao.objects.create(nome="Copeiro", valor_hora=8)
+        self.assertEqual(nomes(), ["Copeiro", "Garçom"])
+        garcom.delete()
+        self.assertEqual(nomes(), ["Copeiro"])
+
+
+    def test_formulario_do_admin_le_as_referencias_do_cache(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@exemplo.com', 'senha'))
+        url = reverse('admin:estoque_produto_add')
+        Categoria.objects.create(nome="Grãos", tipo='AL')
+        with CaptureQueriesContext(connection) as primeira:
+            self.client.get(url)
+        with CaptureQueriesContext(connection) as segunda:
+            self.client.get(url)
+        self.assertLess(len(segunda), len(primeira))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Categoria.objects.create(nome="Bebidas", tipo='AL')
+        self.assertContains(self.client.get(url), "Bebidas")
+
+class ArmazenamentoPorConteudoTests(TestCase):
+    def setUp(self):
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        self.armazenamento = ArmazenamentoLocalPorConteudo(location=pasta.name)
+
+    def test_arquivos_iguais_compartilham_o_nome(self):
+        with override_settings(MEDIA_ROOT=self.armazenamento.location):
+            empresa = Empresa.objects.create(nome_fantasia="Buffet", cnpj="1")
+            contrato = Documento.objects.create(nome="Contrato", vencimento=date.today(), empresa=empresa)
+            contrato.arquivo.save("Contrato.PDF", ContentFile(b"abc" * 1000))
+            copia = Documento.objects.create(nome="Cópia", vencimento=date.today(), empresa=empresa)
+            copia.arquivo.save("outro.pdf", ContentFile(b"abc" * 1000))
+            self.assertEqual(contrato.arquivo.name, copia.arquivo.name)
+            self.assertTrue(contrato.arquivo.name.endswith(".pdf"))
+
+            # Uploads pequenos (memória) e grandes (arquivo temporário) passam pelo hash do upload
+            self.client.force_login(User.objects.create_superuser('admin', 'admin@exemplo.com', 'senha'))
+            for tamanho in (10, 3 * 1024 * 1024):
+                resposta = self.client.post(reverse('admin:core_documento_add'), {
+                    'nome': "Alvará", 'vencimento': '2026-01-01', 'empresa': empresa.pk,
+                    'arquivo': SimpleUploadedFile("alvara.pdf", b"z" * tamanho)})
+                self.assertEqual(resposta.status_code, 302)
+
+    def test_upload_igual_gravado_durante_a_escrita(self):
+        nome = self.armazenamento.save("documentos/a.txt", ContentFile(b"abc"))
+        # O outro upload verificou antes do arquivo existir e encontra o arquivo ao gravar
+        with mock.patch.object(self.armazenamento, 'exists', side_effect=[False, True, True]):
+            self.assertEqual(self.armazenamento.save("documentos/b.txt", ContentFile(b"abc")), nome)
+
+    def test_max_length(self):
+        with self.assertRaises(SuspiciousFileOperation):
+            self.armazenamento.save("documentos/a.txt", ContentFile(b"abc"), max_length=20)
@@ -1,9 +1,17 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from core.busca import BuscaTextoMixin
+from core.cache import FiltroReferencia, ReferenciasEmCacheMixin
+from core.paginacao import PaginacaoCursorMixin
 from .models import (Categoria,
                      Fornecedor,
                      LocalEstoque,
                      Produto,
                      MovimentacaoEstoque,
+                     SaldoEstoque,
+                     Lote,
+                     ConversaoUnidade,
+                     FechamentoEstoque,
+                     SaldoFechamento,
                      Inventario,
                      ItemInventario,
                      EnderecoFornecedor,
@@ -23,11 +31,12 @@ class CategoriaAdmin(admin.ModelAdmin):
 
 
 
-class FornecedorAdmin(admin.ModelAdmin):
+class FornecedorAdmin(BuscaTextoMixin, admin.ModelAdmin):
     readonly_fields = ('criado_em','atualizado_em',)
     list_display = ('nome', 'tipo', 'cpf_cnpj', 'email',
                     'telefone', 'esta_ativo',
                     'data_criacao', 'ultima_atualizacao')
+    search_fields = Fornecedor.CAMPOS_BUSCA
 
     def esta_ativo(self, obj):
         if obj.ativo:
@@ -60,25 +69,98 @@ class LocalEstoqueAdmin(admin.ModelAdmin):
         return obj.atualizado_em.strftime('%d/%m/%Y')
 
 
-class ProdutoAdmin(admin.ModelAdmin):
+class ProdutoAdmin(BuscaTextoMixin, ReferenciasEmCacheMixin, admin.ModelAdmin):
     readonly_fields = ('criado_em','atualizado_em',)
     list_display = ('nome', 'marca', 'categoria', 'fornecedor',
                     'quantidade_atual', 'unidade_medida', 'localizacao',
-                    'preco_custo', 'localizacao', 'data_validade', 'status')
+                    'preco_custo', 'data_validade', 'status')
+    list_select_related = ('categoria', 'fornecedor', 'localizacao')
+    search_fields = Produto.CAMPOS_BUSCA
 
+    def get_readonly_fields(self, request, obj=None):
+        # Depois do cadastro a quantidade só muda pelas movimentações
+        if obj:
+            return (*self.readonly_fields, 'quantidade_atual')
+        return self.readonly_fields
 
-class MovimentacaoEstoqueAdmin(admin.ModelAdmin):
+    def get_queryset(self, request):
+        # Autocomplete e formulários também usam o __str__, que mostra a categoria
+        return super().get_queryset(request).select_related(*self.list_select_related)
+
+
+class MovimentacaoEstoqueAdmin(PaginacaoCursorMixin, ReferenciasEmCacheMixin, admin.ModelAdmin):
     exclude = ('usuario',)
     readonly_fields = ('data_movimentacao','data_atualizacao',)
     list_display = ('produto', 'tipo', 'quantidade',
                     'local_origem', 'local_destino',
                     'data_movimentacao', 'data_atualizacao')
+    list_select_related = ('produto__categoria', 'local_origem', 'local_destino')
+    autocomplete_fields = ('produto',)
+    # Filtros de data em vez de date_hierarchy, que não combina com a paginação por cursor
+    list_filter = ('tipo', 'data_movimentacao', ('local_origem', FiltroReferencia), ('local_destino', FiltroReferencia))
+    search_fields = ('produto__nome',)
+
+
+class SaldoEstoqueAdmin(admin.ModelAdmin):
+    readonly_fields = ('produto', 'local', 'quantidade', 'atualizado_em')
+    list_display = ('local', 'produto', 'quantidade', 'atualizado_em')
+    list_select_related = ('local', 'produto__categoria')
+    list_filter = (('local', FiltroReferencia),)
+
+
+class ConversaoUnidadeAdmin(admin.ModelAdmin):
+    list_display = ('unidade_origem', 'unidade_destino', 'fator', 'produto')
+    list_select_related = ('produto__categoria',)
+    autocomplete_fields = ('produto',)
+    list_filter = ('unidade_origem', 'unidade_destino')
+
+
+class LoteAdmin(ReferenciasEmCacheMixin, admin.ModelAdmin):
+    readonly_fields = ('criado_em',)
+    list_display = ('produto', 'local', 'codigo', 'data_validade', 'quantidade')
+    list_select_related = ('produto__categoria', 'local')
+    autocomplete_fields = ('produto',)
+    list_filter = (('local', FiltroReferencia),)
+    date_hierarchy = 'data_validade'
+
+
+class SaldoFechamentoInline(admin.TabularInline):
+    model = SaldoFechamento
+    readonly_fields = ('produto', 'quantidade')
+    can_delete = False
+    extra = 0
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('produto__categoria')
+
+
+class FechamentoEstoqueAdmin(admin.ModelAdmin):
+    readonly_fields = ('data_referencia', 'criado_em')
+    list_display = ('data_referencia', 'criado_em')
+    inlines = [SaldoFechamentoInline]
 
 
-class InventarioAdmin(admin.ModelAdmin):
+class InventarioAdmin(ReferenciasEmCacheMixin, admin.ModelAdmin):
     readonly_fields = ('criado_em', 'atualizado_em',)
     list_display = ('responsavel', 'local', 'data_inicio', 'data_fim',
                     'status', 'data_criacao', 'ultima_atualizacao')
+    list_select_related = ('responsavel', 'local')
+    search_fields = ('local__nome',)
+    actions = ['finalizar']
+
+    def get_queryset(self, request):
+        # O autocomplete dos itens lista inventários pelo __str__, que inclui o local
+        return super().get_queryset(request).select_related(*self.list_select_related)
+
+    @admin.action(description='Finalizar inventários selecionados (lança os ajustes)')
+    def finalizar(self, request, queryset):
+        for inventario in queryset:
+            try:
+                ajustes = inventario.finalizar(usuario=request.user)
+            except ValueError as erro:
+                self.message_user(request, f"{inventario}: {erro}", messages.ERROR)
+            else:
+                self.message_user(request, f"{inventario}: {len(ajustes)} ajustes lançados.")
 
     def data_criacao(self, obj):
         return obj.criado_em.strftime('%d/%m/%Y')
@@ -87,19 +169,25 @@ class InventarioAdmin(admin.ModelAdmin):
         return obj.atualizado_em.strftime('%d/%m/%Y')
 
 
-class ItemInvetarioAdmin(admin.ModelAdmin):
+class ItemInvetarioAdmin(PaginacaoCursorMixin, admin.ModelAdmin):
     list_display = ('produto', 'inventario', 'quantidade_sistema', 'quantidade_fisica',
                     'conferido', 'data_conferencia', 'usuario_conferencia')
+    list_select_related = ('produto__categoria', 'inventario__local', 'usuario_conferencia')
+    autocomplete_fields = ('inventario', 'produto')
+    list_filter = ('conferido', 'data_conferencia', 'inventario__status')
+    search_fields = ('produto__nome',)
 
 
 class EnderecoFornecedorAdmin(admin.ModelAdmin):
     list_display = ('cliente', 'logadouro', 'numero',
                     'complemento', 'bairro', 'cidade', 'cep')
+    list_select_related = ('cliente',)
 
 
-class EnderecoLocalEstoqueAdmin(admin.ModelAdmin):
+class EnderecoLocalEstoqueAdmin(ReferenciasEmCacheMixin, admin.ModelAdmin):
     list_display = ('estoque', 'logadouro', 'numero',
                     'complemento', 'bairro', 'cidade', 'cep')
+    list_select_related = ('estoque',)
 
 
 admin.site.register(Fornecedor, FornecedorAdmin)
@@ -107,6 +195,10 @@ admin.site.register(Categoria, CategoriaAdmin)
 admin.site.register(LocalEstoque, LocalEstoqueAdmin)
 admin.site.register(Produto, ProdutoAdmin)
 admin.site.register(MovimentacaoEstoque, MovimentacaoEstoqueAdmin)
+admin.site.register(SaldoEstoque, SaldoEstoqueAdmin)
+admin.site.register(ConversaoUnidade, ConversaoUnidadeAdmin)
+admin.site.register(Lote, LoteAdmin)
+admin.site.register(FechamentoEstoque, FechamentoEstoqueAdmin)
 admin.site.register(Inventario, InventarioAdmin)
 admin.site.register(ItemInventario, ItemInvetarioAdmin)
 admin.site.register(EnderecoFornecedor, EnderecoFornecedorAdmin)
@@ -0,0 +1,72 @@
+import csv
+import json
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ItemInventario, Produto, SaldoEstoque
+
+
+def ler_csv(arquivo):
+    # Colunas esperadas: produto (id), quantidade e, opcionalmente, observacoes
+    for numero, linha in enumerate(csv.DictReader(arquivo), start=2):
+        yield numero, linha
+
+
+def ler_jsonl(arquivo):
+    for numero, linha in enumerate(arquivo, start=1):
+        if linha.strip():
+            yield numero, json.loads(linha)
+
+
+def _em_lotes(linhas, tamanho):
+    linhas = iter(linhas)
+    while lote := list(islice(linhas, tamanho)):
+        yield lote
+
+
+def _converter(numero, linha):
+    try:
+        produto_id = int(linha['produto'])
+        quantidade = Decimal(str(linha['quantidade']).replace(',', '.'))
+    except (KeyError, TypeError, ValueError, InvalidOperation):
+        raise ValueError(f"Linha {numero}: informe 'produto' (id) e 'quantidade' válidos.")
+    if quantidade < 0:
+        raise ValueError(f"Linha {numero}: quantidade negativa.")
+    return produto_id, quantidade, linha.get('observacoes') or None
+
+
+def importar_contagem(inventario, linhas, usuario=None, tamanho_lote=1000):
+    # Grava a contagem física em blocos: para cada bloco, uma consulta traz o saldo do
+    # sistema no local do inventário e um único INSERT cria (ou atualiza) os itens.
+    if inventario.status != 'A':
+        raise ValueError("Só é possível importar contagens em inventários abertos.")
+    total = 0
+    agora = timezone.now()
+    with transaction.atomic():
+        for lote in _em_lotes(linhas, tamanho_lote):
+            contagem = {}
+            for numero, linha in lote:
+                produto_id, quantidade, observacoes = _converter(numero, linha)
+                contagem[produto_id] = (quantidade, observacoes)
+            existentes = set(Produto.objects.filter(pk__in=contagem).values_list('id', flat=True))
+            if len(existentes) != len(contagem):
+                faltantes = ', '.join(str(produto_id) for produto_id in sorted(set(contagem) - existentes))
+                raise ValueError(f"Produtos não encontrados: {faltantes}")
+            saldos = dict(SaldoEstoque.objects.filter(local_id=inventario.local_id, produto_id__in=contagem)
+                          .values_list('produto_id', 'quantidade'))
+            ItemInventario.objects.bulk_create(
+                [ItemInventario(inventario=inventario, produto_id=produto_id,
+                                quantidade_sistema=saldos.get(produto_id, Decimal(0)),
+                                quantidade_fisica=quantidade, observacoes=observacoes, conferido=True,
+                                data_conferencia=agora, usuario_conferencia=usuario)
+                 for produto_id, (quantidade, observacoes) in contagem.items()],
+                update_conflicts=True,
+                unique_fields=['inventario', 'produto'],
+                update_fields=['quantidade_sistema', 'quantidade_fisica', 'observacoes', 'conferido',
+                               'data_conferencia', 'usuario_conferencia'],
+            )
+            total += len(contagem)
+    return total
@@ -0,0 +1,28 @@
+from datetime import datetime, time, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from estoque.models import FechamentoEstoque
+
+
+class Command(BaseCommand):
+    help = ('Grava um fechamento com o saldo de cada produto, usado para consultar saldos '
+            'passados sem somar todo o histórico. Pensado para rodar diariamente (cron/scheduler).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--data', help='Fecha o estoque ao final deste dia (AAAA-MM-DD). Padrão: agora.')
+
+    def handle(self, *args, **options):
+        data_referencia = timezone.now()
+        if options['data']:
+            try:
+                dia = datetime.strptime(options['data'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError("Data inválida, use o formato AAAA-MM-DD.")
+            data_referencia = timezone.make_aware(datetime.combine(dia + timedelta(days=1), time.min))
+        if FechamentoEstoque.objects.filter(data_referencia=data_referencia).exists():
+            raise CommandError(f"Já existe um fechamento em {data_referencia:%d/%m/%Y %H:%M}.")
+        fechamento = FechamentoEstoque.objects.gerar(data_referencia)
+        self.stdout.write(self.style.SUCCESS(
+            f"{fechamento} gravado com {fechamento.saldos.count()} produtos em estoque."))
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from estoque.importacao import importar_contagem, ler_csv, ler_jsonl
+from estoque.models import Inventario
+
+
+class Command(BaseCommand):
+    help = ('Importa a contagem física de um inventário a partir de um arquivo CSV ou JSONL '
+            'com as colunas produto (id), quantidade e observacoes (opcional).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('inventario', type=int, help='Id do inventário aberto.')
+        parser.add_argument('arquivo', help='Caminho do arquivo .csv ou .jsonl.')
+        parser.add_argument('--formato', choices=['csv', 'jsonl'],
+                            help='Formato do arquivo; por padrão é deduzido pela extensão.')
+        parser.add_argument('--tamanho-lote', type=int, default=1000)
+        parser.add_argument('--finalizar', action='store_true',
+                            help='Finaliza o inventário após a importação, lançando os ajustes.')
+
+    def handle(self, *args, **options):
+        try:
+            inventario = Inventario.objects.get(pk=options['inventario'])
+        except Inventario.DoesNotExist:
+            raise CommandError(f"Inventário {options['inventario']} não encontrado.")
+        formato = options['formato'] or ('jsonl' if options['arquivo'].endswith(('.jsonl', '.json')) else 'csv')
+        leitor = ler_jsonl if formato == 'jsonl' else ler_csv
+        with open(options['arquivo'], encoding='utf-8', newline='') as arquivo:
+            try:
+                total = importar_contagem(inventario, leitor(arquivo), tamanho_lote=options['tamanho_lote'])
+            except ValueError as erro:
+                raise CommandError(str(erro))
+        self.stdout.write(self.style.SUCCESS(f"{total} itens importados no {inventario}."))
+        if options['finalizar']:
+            try:
+                ajustes = inventario.finalizar()
+            except ValueError as erro:
+                raise CommandError(str(erro))
+            self.stdout.write(self.style.SUCCESS(f"Inventário finalizado com {len(ajustes)} ajustes."))
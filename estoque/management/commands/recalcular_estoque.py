@@ -0,0 +1,104 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from estoque.models import MovimentacaoEstoque, Produto, SaldoEstoque
+
+
+class Command(BaseCommand):
+    help = ('Recalcula Produto.quantidade_atual e os saldos por local a partir do histórico '
+            'de movimentações, mostra as diferenças e, com --aplicar, grava as correções.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--aplicar', action='store_true', help='Grava os saldos recalculados.')
+        parser.add_argument('--chunk-size', type=int, default=2000,
+                            help='Quantidade de linhas lidas do banco por vez (padrão: 2000).')
+        parser.add_argument('--produto', type=int, action='append', dest='produtos',
+                            help='Limita o recálculo ao produto informado (pode ser repetido).')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            aplicado = self.recalcular(options)
+        if aplicado:
+            self.stdout.write(self.style.SUCCESS("Correções gravadas."))
+
+    def travar(self, queryset, chunk_size):
+        # Percorre a consulta só para travar as linhas até o fim da transação
+        for _ in queryset.select_for_update().values_list('id', flat=True).iterator(chunk_size=chunk_size):
+            pass
+
+    def recalcular(self, options):
+        chunk_size = options['chunk_size']
+        movimentacoes = MovimentacaoEstoque.objects.order_by('data_movimentacao', 'id')
+        produtos = Produto.objects.order_by('id')
+        saldos = SaldoEstoque.objects.all()
+        if options['produtos']:
+            movimentacoes = movimentacoes.filter(produto_id__in=options['produtos'])
+            produtos = produtos.filter(id__in=options['produtos'])
+            saldos = saldos.filter(produto_id__in=options['produtos'])
+        if options['aplicar']:
+            # Produtos e saldos ficam travados desde antes da leitura do histórico até a gravação, na
+            # mesma ordem de MovimentacaoEstoque.save: uma movimentação salva durante o recálculo espera
+            # e é aplicada sobre os saldos corrigidos, em vez de ser sobrescrita por eles
+            self.travar(produtos, chunk_size)
+            self.travar(saldos, chunk_size)
+
+        # O histórico é lido em ordem cronológica e em blocos; só os totais ficam em memória
+        totais = defaultdict(Decimal)
+        por_local = defaultdict(Decimal)
+        linhas = movimentacoes.values_list('produto_id', 'tipo', 'quantidade', 'local_origem_id', 'local_destino_id')
+        for produto_id, tipo, quantidade, local_origem_id, local_destino_id in linhas.iterator(chunk_size=chunk_size):
+            totais[produto_id] += MovimentacaoEstoque.calcular_delta(
+                tipo, quantidade, local_origem_id, local_destino_id)
+            for local_id, delta in MovimentacaoEstoque.calcular_deltas_por_local(
+                    tipo, quantidade, local_origem_id, local_destino_id):
+                por_local[produto_id, local_id] += delta
+
+        # Produtos sem nenhuma movimentação não têm histórico a partir do qual recalcular
+        correcoes = []
+        com_local = defaultdict(Decimal)
+        for (produto_id, local_id), quantidade in por_local.items():
+            com_local[produto_id] += quantidade
+        for produto in produtos.only('id', 'nome', 'quantidade_atual', 'localizacao_id').iterator(chunk_size=chunk_size):
+            if produto.id not in totais:
+                continue
+            recalculado = totais[produto.id]
+            # Quantidade movimentada sem local registrado (lançamentos antigos) fica na localização atual
+            residuo = recalculado - com_local[produto.id]
+            if residuo and produto.localizacao_id:
+                por_local[produto.id, produto.localizacao_id] += residuo
+            if recalculado != produto.quantidade_atual:
+                self.stdout.write(f"Produto {produto.id} ({produto.nome}): atual {produto.quantidade_atual}, "
+                                  f"recalculado {recalculado} (diferença {recalculado - produto.quantidade_atual})")
+                produto.quantidade_atual = recalculado
+                correcoes.append(produto)
+
+        saldos_atuais = {(produto_id, local_id): (saldo_id, quantidade) for saldo_id, produto_id, local_id, quantidade in
+                         saldos.values_list('id', 'produto_id', 'local_id', 'quantidade').iterator(chunk_size=chunk_size)
+                         if produto_id in totais}
+        saldos_corrigidos = []
+        for (produto_id, local_id), quantidade in por_local.items():
+            atual = saldos_atuais.get((produto_id, local_id), (None, Decimal(0)))[1]
+            if quantidade != atual:
+                self.stdout.write(f"Produto {produto_id} no local {local_id}: atual {atual}, recalculado {quantidade}")
+                saldos_corrigidos.append(SaldoEstoque(produto_id=produto_id, local_id=local_id, quantidade=quantidade))
+        zerados = []
+        for (produto_id, local_id), (saldo_id, quantidade) in saldos_atuais.items():
+            if (produto_id, local_id) not in por_local and quantidade:
+                self.stdout.write(f"Produto {produto_id} no local {local_id}: atual {quantidade}, recalculado 0")
+                zerados.append(saldo_id)
+
+        self.stdout.write(f"{len(totais)} produtos recalculados, {len(correcoes)} com saldo divergente e "
+                          f"{len(saldos_corrigidos) + len(zerados)} saldos por local divergentes.")
+        if not options['aplicar']:
+            if correcoes or saldos_corrigidos or zerados:
+                self.stdout.write("Nada foi alterado; use --aplicar para gravar as correções.")
+            return False
+
+        Produto.objects.bulk_update(correcoes, ['quantidade_atual'], batch_size=chunk_size)
+        SaldoEstoque.objects.bulk_create(saldos_corrigidos, batch_size=chunk_size, update_conflicts=True,
+                                         unique_fields=['produto', 'local'], update_fields=['quantidade'])
+        SaldoEstoque.objects.filter(id__in=zerados).update(quantidade=0)
+        return True
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.2 on 2026-10-18 17:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def popular_saldos(apps, schema_editor):
+    # Até aqui o produto inteiro ficava em Produto.localizacao
+    Produto = apps.get_model('estoque', 'Produto')
+    SaldoEstoque = apps.get_model('estoque', 'SaldoEstoque')
+    produtos = Produto.objects.filter(localizacao__isnull=False).values_list('id', 'localizacao_id', 'quantidade_atual')
+    SaldoEstoque.objects.bulk_create(
+        (SaldoEstoque(produto_id=produto_id, local_id=local_id, quantidade=quantidade)
+         for produto_id, local_id, quantidade in produtos.iterator(chunk_size=2000)),
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('estoque', '0006_alter_categoria_tipo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SaldoEstoque',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantidade', models.DecimalField(decimal_places=3, default=0, max_digits=10, verbose_name='Quantidade')),
+                ('atualizado_em', models.DateTimeField(auto_now=True, verbose_name='Atualizado em')),
+                ('local', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='saldos', to='estoque.localestoque', verbose_name='Local')),
+                ('produto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='saldos', to='estoque.produto', verbose_name='Produto')),
+            ],
+            options={
+                'verbose_name': 'Saldo por Local',
+                'verbose_name_plural': 'Saldos por Local',
+                'indexes': [models.Index(fields=['local', 'produto', 'quantidade'], name='saldo_estoque_local_idx')],
+                'constraints': [models.UniqueConstraint(fields=('produto', 'local'), name='saldo_estoque_produto_local_uniq')],
+            },
+        ),
+        migrations.RunPython(popular_saldos, migrations.RunPython.noop),
+    ]
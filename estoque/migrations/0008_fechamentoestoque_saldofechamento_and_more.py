@@ -0,0 +1,58 @@
+# Generated by Django 5.2.2 on 2026-10-18 17:14
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('estoque', '0007_saldoestoque'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FechamentoEstoque',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data_referencia', models.DateTimeField(unique=True, verbose_name='Data de Referência')),
+                ('criado_em', models.DateTimeField(auto_now_add=True, verbose_name='Criado em')),
+            ],
+            options={
+                'verbose_name': 'Fechamento de Estoque',
+                'verbose_name_plural': 'Fechamentos de Estoque',
+                'ordering': ['-data_referencia'],
+            },
+        ),
+        migrations.CreateModel(
+            name='SaldoFechamento',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantidade', models.DecimalField(decimal_places=3, max_digits=10, verbose_name='Quantidade')),
+            ],
+            options={
+                'verbose_name': 'Saldo do Fechamento',
+                'verbose_name_plural': 'Saldos do Fechamento',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='movimentacaoestoque',
+            index=models.Index(fields=['data_movimentacao', 'produto'], name='mov_estoque_data_produto_idx'),
+        ),
+        migrations.AddField(
+            model_name='saldofechamento',
+            name='fechamento',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='saldos', to='estoque.fechamentoestoque', verbose_name='Fechamento'),
+        ),
+        migrations.AddField(
+            model_name='saldofechamento',
+            name='produto',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='estoque.produto', verbose_name='Produto'),
+        ),
+        migrations.AddConstraint(
+            model_name='saldofechamento',
+            constraint=models.UniqueConstraint(fields=('fechamento', 'produto'), name='saldo_fechamento_produto_uniq'),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.2.2 on 2026-10-18 17:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('estoque', '0008_fechamentoestoque_saldofechamento_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Lote',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('codigo', models.CharField(blank=True, max_length=50, null=True, verbose_name='Código')),
+                ('data_validade', models.DateField(blank=True, null=True, verbose_name='Validade')),
+                ('quantidade', models.DecimalField(decimal_places=3, default=0, max_digits=10, verbose_name='Quantidade')),
+                ('criado_em', models.DateTimeField(auto_now_add=True, verbose_name='Criado em')),
+            ],
+            options={
+                'verbose_name': 'Lote',
+                'verbose_name_plural': 'Lotes',
+                'ordering': ['data_validade'],
+            },
+        ),
+        migrations.AddField(
+            model_name='movimentacaoestoque',
+            name='data_validade',
+            field=models.DateField(blank=True, null=True, verbose_name='Validade do Lote'),
+        ),
+        migrations.AddIndex(
+            model_name='produto',
+            index=models.Index(fields=['data_validade'], name='produto_validade_idx'),
+        ),
+        migrations.AddField(
+            model_name='lote',
+            name='local',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='lotes', to='estoque.localestoque', verbose_name='Local'),
+        ),
+        migrations.AddField(
+            model_name='lote',
+            name='produto',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lotes', to='estoque.produto', verbose_name='Produto'),
+        ),
+        migrations.AddField(
+            model_name='movimentacaoestoque',
+            name='lote',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='movimentacoes', to='estoque.lote', verbose_name='Lote'),
+        ),
+        migrations.AddIndex(
+            model_name='lote',
+            index=models.Index(condition=models.Q(('quantidade__gt', 0)), fields=['data_validade', 'produto'], name='lote_validade_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lote',
+            index=models.Index(condition=models.Q(('quantidade__gt', 0)), fields=['produto', 'data_validade'], name='lote_produto_validade_idx'),
+        ),
+    ]
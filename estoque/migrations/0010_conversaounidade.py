@@ -0,0 +1,55 @@
+# Generated by Django 5.2.2 on 2026-10-18 17:18
+
+import django.core.validators
+import django.db.models.deletion
+from decimal import Decimal
+
+from django.db import migrations, models
+
+
+CONVERSOES_GERAIS = [
+    ('KG', 'GR', Decimal('1000')),
+    ('TON', 'KG', Decimal('1000')),
+    ('DZ', 'UN', Decimal('12')),
+]
+
+
+def criar_conversoes(apps, schema_editor):
+    ConversaoUnidade = apps.get_model('estoque', 'ConversaoUnidade')
+    ConversaoUnidade.objects.bulk_create(
+        [ConversaoUnidade(unidade_origem=origem, unidade_destino=destino, fator=fator)
+         for origem, destino, fator in CONVERSOES_GERAIS],
+        ignore_conflicts=True,
+    )
+
+
+def remover_conversoes(apps, schema_editor):
+    ConversaoUnidade = apps.get_model('estoque', 'ConversaoUnidade')
+    for origem, destino, fator in CONVERSOES_GERAIS:
+        ConversaoUnidade.objects.filter(produto__isnull=True, unidade_origem=origem, unidade_destino=destino).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('estoque', '0009_lote_movimentacaoestoque_data_validade_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConversaoUnidade',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('unidade_origem', models.CharField(choices=[('UN', 'Unidade'), ('PC', 'Peça'), ('KG', 'Quilograma'), ('GR', 'Grama'), ('LT', 'Litro'), ('MT', 'Metro'), ('M2', 'Metro Quadrado'), ('M3', 'Metro Cúbico'), ('CX', 'Caixa'), ('DZ', 'Dúzia'), ('SC', 'Saco'), ('FD', 'Fardo'), ('RL', 'Rolo'), ('PCT', 'Pacote'), ('TON', 'Tonelada')], max_length=3, verbose_name='Unidade de Origem')),
+                ('unidade_destino', models.CharField(choices=[('UN', 'Unidade'), ('PC', 'Peça'), ('KG', 'Quilograma'), ('GR', 'Grama'), ('LT', 'Litro'), ('MT', 'Metro'), ('M2', 'Metro Quadrado'), ('M3', 'Metro Cúbico'), ('CX', 'Caixa'), ('DZ', 'Dúzia'), ('SC', 'Saco'), ('FD', 'Fardo'), ('RL', 'Rolo'), ('PCT', 'Pacote'), ('TON', 'Tonelada')], max_length=3, verbose_name='Unidade de Destino')),
+                ('fator', models.DecimalField(decimal_places=6, max_digits=14, validators=[django.core.validators.MinValueValidator(Decimal('0.000001'))], verbose_name='Fator')),
+                ('produto', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='conversoes', to='estoque.produto', verbose_name='Produto')),
+            ],
+            options={
+                'verbose_name': 'Conversão de Unidade',
+                'verbose_name_plural': 'Conversões de Unidade',
+                'constraints': [models.UniqueConstraint(fields=('produto', 'unidade_origem', 'unidade_destino'), name='conversao_produto_uniq'), models.UniqueConstraint(condition=models.Q(('produto__isnull', True)), fields=('unidade_origem', 'unidade_destino'), name='conversao_geral_uniq')],
+            },
+        ),
+        migrations.RunPython(criar_conversoes, remover_conversoes),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.2 on 2026-10-18 17:39
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('estoque', '0010_conversaounidade'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='iteminventario',
+            index=models.Index(fields=['conferido', 'id'], name='item_inv_conferido_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='iteminventario',
+            index=models.Index(fields=['data_conferencia'], name='item_inv_data_conferencia_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movimentacaoestoque',
+            index=models.Index(fields=['tipo', 'id'], name='mov_estoque_tipo_idx'),
+        ),
+    ]
@@ -0,0 +1,77 @@
+from django.db import OperationalError, migrations, transaction
+
+CAMPOS = {
+    'Produto': ('nome', 'marca', 'descricao'),
+    'Fornecedor': ('nome', 'cpf_cnpj', 'email', 'telefone'),
+}
+
+
+def criar_indice_busca(conexao, modelo, campos):
+    # PostgreSQL: índices GIN de trigramas sobre UPPER(coluna), a expressão gerada pelo icontains.
+    # SQLite: tabela FTS5 "<tabela>_busca" com tokenizador de trigramas, mantida por triggers
+    # (sem suporte a FTS5/trigram a busca continua com icontains).
+    q = conexao.ops.quote_name
+    tabela = modelo._meta.db_table
+    colunas = [modelo._meta.get_field(campo).column for campo in campos]
+    with conexao.cursor() as cursor:
+        if conexao.vendor == 'postgresql':
+            cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+            for coluna in colunas:
+                cursor.execute(f"CREATE INDEX IF NOT EXISTS {q(f'{tabela}_{coluna}_trgm')} ON {q(tabela)} "
+                               f"USING gin ((UPPER({q(coluna)}::text)) gin_trgm_ops)")
+        elif conexao.vendor == 'sqlite':
+            busca = f"{tabela}_busca"
+            try:
+                with transaction.atomic(using=conexao.alias):
+                    cursor.execute(f"CREATE VIRTUAL TABLE {q(busca)} USING fts5("
+                                   f"{', '.join(q(coluna) for coluna in colunas)}, content='{tabela}', "
+                                   f"content_rowid='{modelo._meta.pk.column}', tokenize='trigram')")
+            except OperationalError:
+                return
+            lista = ', '.join(q(coluna) for coluna in colunas)
+            novos = ', '.join(f"new.{q(coluna)}" for coluna in colunas)
+            antigos = ', '.join(f"old.{q(coluna)}" for coluna in colunas)
+            pk = q(modelo._meta.pk.column)
+            inserir = f"INSERT INTO {q(busca)} (rowid, {lista}) VALUES (new.{pk}, {novos});"
+            apagar = f"INSERT INTO {q(busca)} ({q(busca)}, rowid, {lista}) VALUES ('delete', old.{pk}, {antigos});"
+            for sufixo, evento, corpo in (('ai', 'INSERT', inserir), ('ad', 'DELETE', apagar),
+                                          ('au', 'UPDATE', apagar + inserir)):
+                cursor.execute(f"CREATE TRIGGER {q(f'{busca}_{sufixo}')} AFTER {evento} "
+                               f"ON {q(tabela)} BEGIN {corpo} END")
+            cursor.execute(f"INSERT INTO {q(busca)} ({q(busca)}) VALUES ('rebuild')")
+
+
+def remover_indice_busca(conexao, modelo, campos):
+    q = conexao.ops.quote_name
+    tabela = modelo._meta.db_table
+    with conexao.cursor() as cursor:
+        if conexao.vendor == 'postgresql':
+            for campo in campos:
+                coluna = modelo._meta.get_field(campo).column
+                cursor.execute(f"DROP INDEX IF EXISTS {q(f'{tabela}_{coluna}_trgm')}")
+        elif conexao.vendor == 'sqlite':
+            busca = f"{tabela}_busca"
+            for sufixo in ('ai', 'ad', 'au'):
+                cursor.execute(f"DROP TRIGGER IF EXISTS {q(f'{busca}_{sufixo}')}")
+            cursor.execute(f"DROP TABLE IF EXISTS {q(busca)}")
+
+
+def criar_indices(apps, schema_editor):
+    for modelo, campos in CAMPOS.items():
+        criar_indice_busca(schema_editor.connection, apps.get_model('estoque', modelo), campos)
+
+
+def remover_indices(apps, schema_editor):
+    for modelo, campos in CAMPOS.items():
+        remover_indice_busca(schema_editor.connection, apps.get_model('estoque', modelo), campos)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('estoque', '0011_indices_admin'),
+    ]
+
+    operations = [
+        migrations.RunPython(criar_indices, remover_indices),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.2 on 2026-10-18 17:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('estoque', '0012_busca_produto_fornecedor'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='produto',
+            index=models.Index(fields=['nome'], name='produto_nome_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.2 on 2026-10-18 17:57
+
+from django.db import migrations, models
+
+
+def separar_ajustes_inventario(apps, schema_editor):
+    # Os ajustes lançados por Inventario.finalizar eram 'A' só com destino (sobra) ou só com
+    # origem (falta); passam a ter tipo próprio. Os demais ajustes continuam sendo realocações.
+    MovimentacaoEstoque = apps.get_model('estoque', 'MovimentacaoEstoque')
+    ajustes = MovimentacaoEstoque.objects.filter(tipo='A', observacoes__startswith='Ajuste do inventário ')
+    ajustes.filter(local_origem__isnull=True, local_destino__isnull=False).update(tipo='O')
+    ajustes.filter(local_origem__isnull=False, local_destino__isnull=True).update(tipo='F')
+
+
+def juntar_ajustes_inventario(apps, schema_editor):
+    MovimentacaoEstoque = apps.get_model('estoque', 'MovimentacaoEstoque')
+    MovimentacaoEstoque.objects.filter(tipo__in=('O', 'F')).update(tipo='A')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('estoque', '0013_indices_autocomplete'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='movimentacaoestoque',
+            name='tipo',
+            field=models.CharField(choices=[('E', 'Entrada'), ('S', 'Saída'), ('A', 'Ajuste'), ('T', 'Transferência'), ('O', 'Sobra'), ('F', 'Falta')], max_length=1, verbose_name='Tipo'),
+        ),
+        migrations.RunPython(separar_ajustes_inventario, juntar_ajustes_inventario),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.2 on 2026-10-18 17:58
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Case, DecimalField, F, OuterRef, Subquery, Sum, Value, When
+
+OBSERVACAO = 'Saldo anterior ao histórico de movimentações'
+
+
+def lancar_saldos_iniciais(apps, schema_editor):
+    # A quantidade cadastrada direto no produto (e semeada em SaldoEstoque pela 0007) nunca
+    # entrou no histórico. A diferença entre o saldo gravado e a soma das movimentações vira
+    # uma movimentação de saldo inicial na localização do produto, datada do cadastro.
+    Produto = apps.get_model('estoque', 'Produto')
+    MovimentacaoEstoque = apps.get_model('estoque', 'MovimentacaoEstoque')
+    delta = Case(
+        When(tipo__in=('E', 'O', 'I'), then=F('quantidade')),
+        When(tipo__in=('S', 'F'), then=-F('quantidade')),
+        default=Value(Decimal(0)),
+        output_field=DecimalField(max_digits=10, decimal_places=3),
+    )
+    totais = dict(MovimentacaoEstoque.objects.order_by().values('produto_id').annotate(
+        total=Sum(delta)).values_list('produto_id', 'total'))
+    produtos = Produto.objects.values_list('id', 'quantidade_atual', 'localizacao_id')
+    MovimentacaoEstoque.objects.bulk_create(
+        (MovimentacaoEstoque(produto_id=produto_id, tipo='I', local_destino_id=local_id, observacoes=OBSERVACAO,
+                             quantidade=quantidade - (totais.get(produto_id) or 0))
+         for produto_id, quantidade, local_id in produtos.iterator(chunk_size=2000)
+         if quantidade > (totais.get(produto_id) or 0)),
+        batch_size=2000,
+    )
+    MovimentacaoEstoque.objects.filter(tipo='I', observacoes=OBSERVACAO).update(
+        data_movimentacao=Subquery(Produto.objects.filter(pk=OuterRef('produto_id')).values('criado_em')[:1]))
+
+
+def remover_saldos_iniciais(apps, schema_editor):
+    MovimentacaoEstoque = apps.get_model('estoque', 'MovimentacaoEstoque')
+    MovimentacaoEstoque.objects.filter(tipo='I', observacoes=OBSERVACAO).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('estoque', '0014_movimentacao_sobra_falta'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='movimentacaoestoque',
+            name='tipo',
+            field=models.CharField(choices=[('E', 'Entrada'), ('S', 'Saída'), ('A', 'Ajuste'), ('T', 'Transferência'), ('O', 'Sobra'), ('F', 'Falta'), ('I', 'Saldo Inicial')], max_length=1, verbose_name='Tipo'),
+        ),
+        migrations.RunPython(lancar_saldos_iniciais, remover_saldos_iniciais),
+    ]
@@ -0,0 +1,20 @@
+from django.db import migrations
+
+
+def apagar_fechamentos(apps, schema_editor):
+    # Os fechamentos gravados antes da 0015 não contam o saldo inicial dos produtos. Eles só
+    # antecipam a soma do histórico: sem eles saldos_em volta a somar desde o início, e os
+    # próximos fechamentos já saem com os saldos iniciais.
+    FechamentoEstoque = apps.get_model('estoque', 'FechamentoEstoque')
+    FechamentoEstoque.objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('estoque', '0015_saldo_inicial'),
+    ]
+
+    operations = [
+        migrations.RunPython(apagar_fechamentos, migrations.RunPython.noop),
+    ]
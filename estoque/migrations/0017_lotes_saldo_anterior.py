@@ -0,0 +1,41 @@
+from decimal import Decimal
+
+from django.db import migrations
+from django.db.models import Sum
+
+CODIGO = 'Saldo anterior'
+
+
+def criar_lotes_saldo_anterior(apps, schema_editor):
+    # Os lotes só nascem das entradas lançadas depois da 0009. O que os produtos perecíveis já
+    # tinham em estoque e não está em nenhum lote vira um lote na localização do produto, com a
+    # validade cadastrada nele (sem validade, o FEFO o consome por último).
+    Produto = apps.get_model('estoque', 'Produto')
+    Lote = apps.get_model('estoque', 'Lote')
+    em_lotes = dict(Lote.objects.filter(quantidade__gt=0).order_by().values('produto_id').annotate(
+        total=Sum('quantidade')).values_list('produto_id', 'total'))
+    produtos = Produto.objects.exclude(perecivel='N').filter(quantidade_atual__gt=0).values_list(
+        'id', 'quantidade_atual', 'localizacao_id', 'data_validade')
+    Lote.objects.bulk_create(
+        (Lote(produto_id=produto_id, local_id=local_id, codigo=CODIGO, data_validade=validade,
+              quantidade=quantidade - em_lotes.get(produto_id, Decimal(0)))
+         for produto_id, quantidade, local_id, validade in produtos.iterator(chunk_size=2000)
+         if quantidade > em_lotes.get(produto_id, Decimal(0))),
+        batch_size=2000,
+    )
+
+
+def remover_lotes_saldo_anterior(apps, schema_editor):
+    Lote = apps.get_model('estoque', 'Lote')
+    Lote.objects.filter(codigo=CODIGO, movimentacoes__isnull=True).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('estoque', '0016_refazer_fechamentos'),
+    ]
+
+    operations = [
+        migrations.RunPython(criar_lotes_saldo_anterior, remover_lotes_saldo_anterior),
+    ]
@@ -1,5 +1,13 @@
-from django.db import models
+from collections import defaultdict
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.db import models, transaction
+from django.db.models import Case, DecimalField, F, Q, Value, When
+from django.db.models.sql import UpdateQuery
+from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 
@@ -61,6 +69,8 @@ class Fornecedor(models.Model):
         ('F', 'Pessoa Física'),
         ('J', 'Pessoa Jurídica'),
     ]
+    # Campos da busca por trecho (core.busca)
+    CAMPOS_BUSCA = ('nome', 'cpf_cnpj', 'email', 'telefone')
 
     nome = models.CharField(max_length=100, verbose_name=_('Nome'))
     tipo = models.CharField(max_length=1, choices=TIPO_CHOICES, verbose_name=_('Tipo'))
@@ -98,6 +108,85 @@ class LocalEstoque(models.Model):
         return self.nome
 
 
+class EstoqueInsuficiente(ValueError):
+    pass
+
+
+def _update_returning(queryset, valores, campo):
+    # Executa o UPDATE do queryset devolvendo o valor final de `campo` (UPDATE ... RETURNING),
+    # para não precisar reler a linha depois de alterá-la.
+    conexao = transaction.get_connection(queryset.db)
+    field = queryset.model._meta.get_field(campo)
+    if not conexao.features.can_return_columns_from_insert:
+        if not queryset.update(**valores):
+            return None
+        return queryset.values_list(campo, flat=True).first()
+    query = queryset.query.chain(UpdateQuery)
+    query.add_update_values(valores)
+    sql, params = query.get_compiler(queryset.db).as_sql()
+    with conexao.cursor() as cursor:
+        cursor.execute(f"{sql} RETURNING {conexao.ops.quote_name(field.column)}", params)
+        linha = cursor.fetchone()
+    if linha is None:
+        return None
+    return field.to_python(linha[0]).quantize(Decimal(10) ** -field.decimal_places)
+
+
+class ProdutoQuerySet(models.QuerySet):
+    def movimentar(self, produto_id, delta, localizacao_id=None):
+        # Aplica o delta no saldo em um único UPDATE condicional e retorna o novo saldo.
+        # Quando o delta é negativo o UPDATE só acontece se houver saldo suficiente.
+        delta = Decimal(delta)
+        valores = {'quantidade_atual': F('quantidade_atual') + delta,
+                   'atualizado_em': timezone.now()}
+        if localizacao_id:
+            valores['localizacao'] = localizacao_id
+        produtos = self.filter(pk=produto_id)
+        if delta < 0:
+            produtos = produtos.filter(quantidade_atual__gte=-delta)
+        saldo = _update_returning(produtos, valores, 'quantidade_atual')
+        if saldo is None:
+            disponivel = self.filter(pk=produto_id).values_list('quantidade_atual', flat=True).first()
+            if disponivel is None:
+                raise self.model.DoesNotExist(f"Produto {produto_id} não encontrado.")
+            raise EstoqueInsuficiente(
+                f"Quantidade insuficiente em estoque. Disponível: {disponivel}"
+            )
+        return saldo
+
+    def movimentar_lote(self, deltas, localizacoes=None):
+        # Aplica vários deltas ({produto_id: delta}) em um único UPDATE. Se algum produto
+        # com delta negativo não tiver saldo suficiente nada é alterado.
+        localizacoes = localizacoes or {}
+        deltas = {produto_id: delta for produto_id, delta in deltas.items() if delta}
+        ids = set(deltas) | set(localizacoes)
+        if not ids:
+            return
+        campo = self.model._meta.get_field('quantidade_atual')
+        soma = Case(
+            *[When(pk=produto_id, then=Value(delta)) for produto_id, delta in deltas.items()],
+            default=Value(Decimal(0)),
+            output_field=DecimalField(max_digits=campo.max_digits, decimal_places=campo.decimal_places),
+        )
+        valores = {'quantidade_atual': F('quantidade_atual') + soma,
+                   'atualizado_em': timezone.now()}
+        if localizacoes:
+            valores['localizacao'] = Case(
+                *[When(pk=produto_id, then=Value(local_id)) for produto_id, local_id in localizacoes.items()],
+                default=F('localizacao'),
+                output_field=models.BigIntegerField(),
+            )
+        sem_saida = [produto_id for produto_id in ids if deltas.get(produto_id, 0) >= 0]
+        atualizados = self.filter(pk__in=ids).alias(novo_saldo=F('quantidade_atual') + soma).filter(
+            Q(pk__in=sem_saida) | Q(novo_saldo__gte=0)
+        ).update(**valores)
+        if atualizados != len(ids):
+            faltantes = self.filter(pk__in=ids).alias(novo_saldo=F('quantidade_atual') + soma).filter(
+                novo_saldo__lt=0).values_list('nome', 'quantidade_atual')
+            detalhes = ', '.join(f"{nome} (disponível: {disponivel})" for nome, disponivel in faltantes)
+            raise EstoqueInsuficiente(f"Quantidade insuficiente em estoque: {detalhes}")
+
+
 class Produto(models.Model):
     STATUS_CHOICES = [
         ('A', 'Ativo'),
@@ -111,6 +200,8 @@ class Produto(models.Model):
         ('R', 'Refrigerado'),
         ('C', 'Congelado'),
     ]
+    # Campos da busca por trecho (core.busca)
+    CAMPOS_BUSCA = ('nome', 'marca', 'descricao')
 
     nome = models.CharField(max_length=100, verbose_name=_('Nome'))
     marca = models.CharField(max_length=100, verbose_name=_('Marca'), null=True, blank=True)
@@ -129,14 +220,275 @@ class Produto(models.Model):
     criado_em = models.DateTimeField(auto_now_add=True, verbose_name=_('Criado em'))
     atualizado_em = models.DateTimeField(auto_now=True, verbose_name=_('Atualizado em'))
 
+    objects = ProdutoQuerySet.as_manager()
+
     class Meta:
         verbose_name = _('Produto')
         verbose_name_plural = _('Produtos')
         ordering = ['nome']
+        indexes = [
+            models.Index(fields=['data_validade'], name='produto_validade_idx'),
+            models.Index(fields=['nome'], name='produto_nome_idx'),
+        ]
 
     def __str__(self):
         return f"{self.categoria} - {self.nome}"
 
+    def save(self, *args, **kwargs):
+        # A quantidade informada no cadastro entra no histórico como saldo inicial, para que
+        # o saldo continue podendo ser refeito a partir das movimentações
+        inicial = self.quantidade_atual if self._state.adding else 0
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            # Depois do cadastro a quantidade só muda pelas movimentações: um save completo com a
+            # instância desatualizada sobrescreveria o que foi lançado nesse meio tempo
+            kwargs['update_fields'] = [campo.name for campo in self._meta.concrete_fields
+                                       if not campo.primary_key and campo.name != 'quantidade_atual']
+        with transaction.atomic():
+            if inicial:
+                self.quantidade_atual = 0
+            super().save(*args, **kwargs)
+            if inicial:
+                MovimentacaoEstoque(produto=self, tipo='I', quantidade=inicial,
+                                    data_validade=self.data_validade).save()
+
+
+class ConversaoUnidadeQuerySet(models.QuerySet):
+    def tabela(self):
+        # Lida do cache: a tabela muda pouco e é montada a cada planejamento de compras
+        from core.cache import consulta_em_cache
+
+        return consulta_em_cache(
+            self.values_list('produto_id', 'unidade_origem', 'unidade_destino', 'fator'),
+            lambda linhas: {(produto_id, origem, destino): fator for produto_id, origem, destino, fator in linhas})
+
+
+class ConversaoUnidade(models.Model):
+    # 1 unidade_origem = fator unidade_destino; sem produto, a conversão vale para todos
+    produto = models.ForeignKey(Produto, on_delete=models.CASCADE, blank=True, null=True,
+                                related_name='conversoes', verbose_name=_('Produto'))
+    unidade_origem = models.CharField(max_length=3, choices=UNIDADE_CHOICES, verbose_name=_('Unidade de Origem'))
+    unidade_destino = models.CharField(max_length=3, choices=UNIDADE_CHOICES, verbose_name=_('Unidade de Destino'))
+    fator = models.DecimalField(max_digits=14, decimal_places=6, validators=[MinValueValidator(Decimal('0.000001'))],
+                                verbose_name=_('Fator'))
+
+    objects = ConversaoUnidadeQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = _('Conversão de Unidade')
+        verbose_name_plural = _('Conversões de Unidade')
+        constraints = [
+            models.UniqueConstraint(fields=['produto', 'unidade_origem', 'unidade_destino'],
+                                    name='conversao_produto_uniq'),
+            models.UniqueConstraint(fields=['unidade_origem', 'unidade_destino'], condition=Q(produto__isnull=True),
+                                    name='conversao_geral_uniq'),
+        ]
+
+    def __str__(self):
+        return f"1 {self.unidade_origem} = {self.fator} {self.unidade_destino}"
+
+    @staticmethod
+    def fator_entre(tabela, origem, destino, produto_id=None):
+        # Procura a conversão do produto e depois a geral, direta ou inversa; se não houver,
+        # tenta passar por uma unidade intermediária (ex.: DZ -> UN -> CX)
+        if origem == destino:
+            return Decimal(1)
+
+        def direto(de, para):
+            for chave_produto in (produto_id, None):
+                if (chave_produto, de, para) in tabela:
+                    return tabela[chave_produto, de, para]
+                if (chave_produto, para, de) in tabela:
+                    return 1 / tabela[chave_produto, para, de]
+            return None
+
+        fator = direto(origem, destino)
+        if fator is not None:
+            return fator
+        intermediarias = {unidade for chave_produto, de, para in tabela if chave_produto in (produto_id, None)
+                          for unidade in (de, para)} - {origem, destino}
+        for unidade in sorted(intermediarias):
+            ida = direto(origem, unidade)
+            volta = ida and direto(unidade, destino)
+            if volta:
+                return ida * volta
+        return None
+
+
+class SaldoEstoqueQuerySet(models.QuerySet):
+    def movimentar_lote(self, deltas):
+        # Aplica deltas por ({(produto_id, local_id): delta}) com um INSERT que apenas garante
+        # a existência das linhas e um único UPDATE incremental. Não há trava de saldo
+        # negativo por local: movimentações antigas não registravam o local de origem.
+        deltas = {chave: delta for chave, delta in deltas.items() if delta and chave[1]}
+        if not deltas:
+            return
+        self.bulk_create(
+            [SaldoEstoque(produto_id=produto_id, local_id=local_id) for produto_id, local_id in deltas],
+            ignore_conflicts=True,
+        )
+        campo = self.model._meta.get_field('quantidade')
+        filtro = Q()
+        casos = []
+        for (produto_id, local_id), delta in deltas.items():
+            filtro |= Q(produto_id=produto_id, local_id=local_id)
+            casos.append(When(produto_id=produto_id, local_id=local_id, then=Value(delta)))
+        self.filter(filtro).update(
+            quantidade=F('quantidade') + Case(
+                *casos,
+                default=Value(Decimal(0)),
+                output_field=DecimalField(max_digits=campo.max_digits, decimal_places=campo.decimal_places),
+            ),
+            atualizado_em=timezone.now(),
+        )
+
+
+class SaldoEstoque(models.Model):
+    produto = models.ForeignKey(Produto, on_delete=models.CASCADE, related_name='saldos', verbose_name=_('Produto'))
+    local = models.ForeignKey(LocalEstoque, on_delete=models.CASCADE, related_name='saldos', verbose_name=_('Local'))
+    quantidade = models.DecimalField(max_digits=10, decimal_places=3, default=0, verbose_name=_('Quantidade'))
+    atualizado_em = models.DateTimeField(auto_now=True, verbose_name=_('Atualizado em'))
+
+    objects = SaldoEstoqueQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = _('Saldo por Local')
+        verbose_name_plural = _('Saldos por Local')
+        constraints = [
+            models.UniqueConstraint(fields=['produto', 'local'], name='saldo_estoque_produto_local_uniq'),
+        ]
+        indexes = [
+            # Cobre as consultas por depósito sem precisar ir à tabela
+            models.Index(fields=['local', 'produto', 'quantidade'], name='saldo_estoque_local_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.produto} - {self.local}: {self.quantidade}"
+
+
+class LoteQuerySet(models.QuerySet):
+    def vencendo(self, dias=7):
+        # Lotes com saldo que vencem nos próximos `dias` (inclui os já vencidos)
+        limite = timezone.localdate() + timedelta(days=dias)
+        return self.filter(quantidade__gt=0, data_validade__lte=limite).order_by(
+            'data_validade').select_related('produto', 'local')
+
+    def aplicar_movimentacoes(self, movimentos, pereciveis):
+        # Reflete as movimentações de produtos perecíveis nos lotes: entradas e sobras criam
+        # um lote, saídas e faltas consomem primeiro os lotes que vencem antes (FEFO) e
+        # transferências levam as quantidades consumidas para lotes iguais no destino.
+        movimentos = [movimento for movimento in movimentos if movimento.produto_id in pereciveis]
+        if not movimentos:
+            return
+        consumidores = {movimento.produto_id for movimento in movimentos if movimento.consome_lotes}
+        lotes = defaultdict(list)
+        for lote in self.select_for_update().filter(produto_id__in=consumidores, quantidade__gt=0):
+            lotes[lote.produto_id].append(lote)
+        novos = []
+        alterados = {}
+
+        def incluir(lote):
+            novos.append(lote)
+            lotes[lote.produto_id].append(lote)
+
+        for movimento in movimentos:
+            lotes[movimento.produto_id].sort(key=Lote.chave_fefo)
+            retirados = []
+            if movimento.consome_lotes:
+                restante = movimento.quantidade
+                for lote in lotes[movimento.produto_id]:
+                    if restante <= 0:
+                        break
+                    if lote.quantidade <= 0 or (movimento.local_origem_id and lote.local_id != movimento.local_origem_id):
+                        continue
+                    retirado = min(lote.quantidade, restante)
+                    lote.quantidade -= retirado
+                    restante -= retirado
+                    retirados.append((lote, retirado))
+                    if lote.pk:
+                        alterados[lote.pk] = lote
+            if movimento.delta > 0:
+                movimento.lote = Lote(produto_id=movimento.produto_id, local_id=movimento.local_destino_id,
+                                      data_validade=movimento.data_validade, quantidade=movimento.quantidade)
+                incluir(movimento.lote)
+            elif movimento.nova_localizacao_id:
+                for lote, retirado in retirados:
+                    incluir(Lote(produto_id=lote.produto_id, local_id=movimento.local_destino_id,
+                                 codigo=lote.codigo, data_validade=lote.data_validade, quantidade=retirado))
+        self.bulk_create(novos)
+        self.bulk_update(alterados.values(), ['quantidade'])
+
+
+class Lote(models.Model):
+    produto = models.ForeignKey(Produto, on_delete=models.CASCADE, related_name='lotes', verbose_name=_('Produto'))
+    local = models.ForeignKey(LocalEstoque, on_delete=models.SET_NULL, blank=True, null=True, related_name='lotes', verbose_name=_('Local'))
+    codigo = models.CharField(max_length=50, blank=True, null=True, verbose_name=_('Código'))
+    data_validade = models.DateField(blank=True, null=True, verbose_name=_('Validade'))
+    quantidade = models.DecimalField(max_digits=10, decimal_places=3, default=0, verbose_name=_('Quantidade'))
+    criado_em = models.DateTimeField(auto_now_add=True, verbose_name=_('Criado em'))
+
+    objects = LoteQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = _('Lote')
+        verbose_name_plural = _('Lotes')
+        ordering = ['data_validade']
+        indexes = [
+            # Só lotes com saldo interessam para o FEFO e para a consulta de vencimentos
+            models.Index(fields=['data_validade', 'produto'], condition=Q(quantidade__gt=0), name='lote_validade_idx'),
+            models.Index(fields=['produto', 'data_validade'], condition=Q(quantidade__gt=0), name='lote_produto_validade_idx'),
+        ]
+
+    def __str__(self):
+        validade = f"{self.data_validade:%d/%m/%Y}" if self.data_validade else 'sem validade'
+        return f"{self.produto} - {self.quantidade} ({validade})"
+
+    @staticmethod
+    def chave_fefo(lote):
+        return (lote.data_validade is None, lote.data_validade or date.max, lote.pk or 0)
+
+
+class MovimentacaoEstoqueQuerySet(models.QuerySet):
+    def lancar_lote(self, movimentos):
+        # Lança uma lista de movimentações (ainda não salvas) em uma única transação:
+        # os saldos são atualizados com um UPDATE agrupado por produto e as linhas
+        # gravadas com bulk_create, sem passar por MovimentacaoEstoque.save.
+        movimentos = list(movimentos)
+        tipos = dict(MovimentacaoEstoque.TIPO_CHOICES)
+        deltas = defaultdict(Decimal)
+        deltas_locais = defaultdict(Decimal)
+        localizacoes = {}
+        pereciveis = set()
+        for produto_id, localizacao_id, perecivel in Produto.objects.using(self.db).filter(
+                pk__in={movimento.produto_id for movimento in movimentos}).values_list(
+                'id', 'localizacao_id', 'perecivel'):
+            localizacoes[produto_id] = localizacao_id
+            if perecivel != 'N':
+                pereciveis.add(produto_id)
+        for movimento in movimentos:
+            if movimento.pk:
+                raise ValueError(f"A movimentação {movimento.pk} já foi lançada.")
+            if movimento.tipo not in tipos:
+                raise ValueError(f"Tipo de movimentação inválido: {movimento.tipo!r}")
+            if movimento.quantidade is None or movimento.quantidade <= 0:
+                raise ValueError(f"Quantidade inválida para {movimento.produto_id}: {movimento.quantidade}")
+            if movimento.tipo == 'T' and not movimento.local_destino_id:
+                raise ValueError("Transferências precisam de um local de destino.")
+            movimento.preencher_locais(localizacoes.get(movimento.produto_id))
+            deltas[movimento.produto_id] += movimento.delta
+            for local_id, delta in movimento.deltas_por_local():
+                deltas_locais[movimento.produto_id, local_id] += delta
+            if movimento.nova_localizacao_id:
+                localizacoes[movimento.produto_id] = movimento.nova_localizacao_id
+        novas_localizacoes = {
+            movimento.produto_id: localizacoes[movimento.produto_id]
+            for movimento in movimentos if movimento.nova_localizacao_id
+        }
+        with transaction.atomic(using=self.db):
+            Produto.objects.using(self.db).movimentar_lote(deltas, novas_localizacoes)
+            SaldoEstoque.objects.using(self.db).movimentar_lote(deltas_locais)
+            Lote.objects.using(self.db).aplicar_movimentacoes(movimentos, pereciveis)
+            return self.bulk_create(movimentos)
+
 
 class MovimentacaoEstoque(models.Model):
     TIPO_CHOICES = [
@@ -144,6 +496,9 @@ class MovimentacaoEstoque(models.Model):
         ('S', 'Saída'),
         ('A', 'Ajuste'),
         ('T', 'Transferência'),
+        ('O', 'Sobra'),
+        ('F', 'Falta'),
+        ('I', 'Saldo Inicial'),
     ]
 
     produto = models.ForeignKey(Produto, on_delete=models.CASCADE, verbose_name=_('Produto'))
@@ -152,53 +507,221 @@ class MovimentacaoEstoque(models.Model):
     local_origem = models.ForeignKey(LocalEstoque, on_delete=models.CASCADE, related_name='movimentacoes_origem', blank=True, null=True, verbose_name=_('Local de Origem'))
     local_destino = models.ForeignKey(LocalEstoque, on_delete=models.CASCADE, related_name='movimentacoes_destino', blank=True, null=True, verbose_name=_('Local de Destino'))
     observacoes = models.TextField(blank=True, null=True, verbose_name=_('Observações'))
+    data_validade = models.DateField(blank=True, null=True, verbose_name=_('Validade do Lote'))
+    lote = models.ForeignKey('Lote', on_delete=models.SET_NULL, blank=True, null=True, editable=False,
+                             related_name='movimentacoes', verbose_name=_('Lote'))
     usuario = models.ForeignKey('auth.User', on_delete=models.SET_NULL, blank=True, null=True, verbose_name=_('Usuário'))
     data_movimentacao = models.DateTimeField(auto_now_add=True, verbose_name=_('Data da Movimentação'))
     data_atualizacao = models.DateTimeField(auto_now=True, verbose_name=_('Data de Atualização'))
 
+    objects = MovimentacaoEstoqueQuerySet.as_manager()
+
     class Meta:
         verbose_name = _('Movimentação de Estoque')
         verbose_name_plural = _('Movimentações de Estoque')
         ordering = ['-data_movimentacao']
+        indexes = [
+            models.Index(fields=['data_movimentacao', 'produto'], name='mov_estoque_data_produto_idx'),
+            # Filtro por tipo no admin, percorrido na ordem da chave primária
+            models.Index(fields=['tipo', 'id'], name='mov_estoque_tipo_idx'),
+        ]
 
     def __str__(self):
         return f"{self.get_tipo_display()} - {self.produto} ({self.quantidade})"
 
+    @staticmethod
+    def calcular_delta(tipo, quantidade, local_origem_id=None, local_destino_id=None):
+        # Efeito da movimentação sobre Produto.quantidade_atual. Ajustes e transferências só
+        # mudam o produto de local; sobras e faltas (inventário) alteram a quantidade.
+        if tipo in ('E', 'O', 'I'):
+            return quantidade
+        if tipo in ('S', 'F'):
+            return -quantidade
+        return Decimal(0)
+
+    @property
+    def delta(self):
+        return self.calcular_delta(self.tipo, self.quantidade, self.local_origem_id, self.local_destino_id)
+
+    @property
+    def consome_lotes(self):
+        return self.tipo in ('S', 'F') or (self.tipo in ('A', 'T') and bool(self.local_origem_id))
+
+    @property
+    def nova_localizacao_id(self):
+        # Ajustes e transferências levam o produto para o local de destino
+        if self.tipo in ('A', 'T'):
+            return self.local_destino_id
+        return None
+
+    @staticmethod
+    def expressao_delta():
+        # Mesma regra de calcular_delta, para somar os deltas no banco
+        return Case(
+            When(tipo__in=('E', 'O', 'I'), then=F('quantidade')),
+            When(tipo__in=('S', 'F'), then=-F('quantidade')),
+            default=Value(Decimal(0)),
+            output_field=DecimalField(max_digits=10, decimal_places=3),
+        )
+
+    @staticmethod
+    def calcular_deltas_por_local(tipo, quantidade, local_origem_id, local_destino_id):
+        # Efeito da movimentação sobre SaldoEstoque, como pares (local_id, delta)
+        deltas = []
+        if tipo in ('S', 'A', 'T', 'F') and local_origem_id:
+            deltas.append((local_origem_id, -quantidade))
+        if tipo in ('E', 'A', 'T', 'O', 'I') and local_destino_id:
+            deltas.append((local_destino_id, quantidade))
+        return deltas
+
+    def deltas_por_local(self):
+        return self.calcular_deltas_por_local(self.tipo, self.quantidade,
+                                              self.local_origem_id, self.local_destino_id)
+
+    def preencher_locais(self, localizacao_id):
+        # Registra o local efetivamente movimentado quando ele não foi informado,
+        # usando a localização atual do produto
+        if not localizacao_id:
+            return
+        if self.tipo in ('E', 'O', 'I') and not self.local_destino_id:
+            self.local_destino_id = localizacao_id
+        elif self.tipo in ('S', 'A', 'T', 'F') and not self.local_origem_id:
+            self.local_origem_id = localizacao_id
+
+    def clean(self):
+        # O UPDATE condicional do save() continua sendo a garantia; aqui a falta de saldo vira
+        # um erro do formulário em vez de uma exceção ao salvar
+        if not self.produto_id or self.quantidade is None or self.tipo not in dict(self.TIPO_CHOICES):
+            return
+        delta = self.delta
+        if self.id:
+            anterior = MovimentacaoEstoque.objects.filter(id=self.id, produto_id=self.produto_id).values(
+                'tipo', 'quantidade', 'local_origem_id', 'local_destino_id').first()
+            if anterior:
+                delta -= self.calcular_delta(**anterior)
+        if delta >= 0:
+            return
+        disponivel = Produto.objects.filter(pk=self.produto_id).values_list('quantidade_atual', flat=True).first()
+        if disponivel is not None and disponivel + delta < 0:
+            raise ValidationError({'quantidade': _('Quantidade insuficiente em estoque. Disponível: %(disponivel)s')
+                                   % {'disponivel': disponivel}})
+
     def save(self, *args, **kwargs):
-        # Atualiza o estoque do produto quando uma movimentação é salva
-        if not self.id:
-            if self.tipo == 'E':
-                self.produto.quantidade_atual += self.quantidade
-            elif self.tipo == 'S':
-                self.produto.quantidade_atual -= self.quantidade
-            elif self.tipo == 'A':
-                self.produto.localizacao = self.local_destino
-            elif self.tipo == 'T':
-                self.produto.localizacao = self.local_destino
-        else:
-            old_instance = MovimentacaoEstoque.objects.get(id=self.id)
-            if old_instance.quantidade != self.quantidade:
-                if self.tipo == 'E':
-                    self.produto.quantidade_atual -= old_instance.quantidade
-                    self.produto.quantidade_atual += self.quantidade
-                elif self.tipo == 'S':
-                    self.produto.quantidade_atual += old_instance.quantidade
-                    self.produto.quantidade_atual -= self.quantidade
-                elif self.tipo == 'A':
-                    self.produto.localizacao = self.local_destino
-                elif self.tipo == 'T':
-                    self.produto.localizacao = self.local_destino
+        # Atualiza o estoque do produto quando uma movimentação é salva, aplicando
+        # apenas a diferença em relação à versão anterior da movimentação
+        with transaction.atomic():
+            if not self.id:
+                self.preencher_locais(self.produto.localizacao_id)
+            delta = self.delta
+            deltas_locais = defaultdict(Decimal)
+            for local_id, delta_local in self.deltas_por_local():
+                deltas_locais[self.produto_id, local_id] += delta_local
+            if self.id:
+                # A linha fica travada até o fim da transação para que duas edições simultâneas
+                # não apliquem a diferença sobre a mesma versão anterior
+                anterior = MovimentacaoEstoque.objects.select_for_update().filter(id=self.id).values(
+                    'produto_id', 'tipo', 'quantidade', 'local_origem_id', 'local_destino_id',
+                    'data_movimentacao').first()
+                if anterior:
+                    # Fechamentos posteriores à movimentação alterada deixam de valer
+                    FechamentoEstoque.objects.filter(data_referencia__gt=anterior['data_movimentacao']).delete()
+                    delta_anterior = self.calcular_delta(anterior['tipo'], anterior['quantidade'],
+                                                         anterior['local_origem_id'], anterior['local_destino_id'])
+                    if anterior['produto_id'] != self.produto_id:
+                        if delta_anterior:
+                            Produto.objects.movimentar(anterior['produto_id'], -delta_anterior)
+                    else:
+                        delta -= delta_anterior
+                    for local_id, delta_local in self.calcular_deltas_por_local(
+                            anterior['tipo'], anterior['quantidade'],
+                            anterior['local_origem_id'], anterior['local_destino_id']):
+                        deltas_locais[anterior['produto_id'], local_id] -= delta_local
+                    # Na edição os lotes só acompanham a quantidade das entradas
+                    if self.lote_id and self.quantidade != anterior['quantidade']:
+                        Lote.objects.filter(pk=self.lote_id).update(
+                            quantidade=F('quantidade') + self.quantidade - anterior['quantidade'])
             else:
-                if self.tipo == 'A':
-                    self.produto.localizacao = self.local_destino
-                elif self.tipo == 'T':
-                    self.produto.localizacao = self.local_destino
-        if self.tipo == 'S' and self.quantidade > self.produto.quantidade_atual:
-            raise ValueError(
-                f"Quantidade insuficiente em estoque. Disponível: {self.produto.quantidade_atual}"
+                Lote.objects.aplicar_movimentacoes(
+                    [self], {self.produto_id} if self.produto.perecivel != 'N' else set())
+            localizacao_id = self.nova_localizacao_id
+            if delta or localizacao_id:
+                self.produto.quantidade_atual = Produto.objects.movimentar(
+                    self.produto_id, delta, localizacao_id)
+                if localizacao_id:
+                    self.produto.localizacao_id = localizacao_id
+            # Produto antes dos saldos por local, como no lançamento em lote e no recalcular_estoque
+            SaldoEstoque.objects.movimentar_lote(deltas_locais)
+            super().save(*args, **kwargs)
+
+
+class FechamentoEstoqueQuerySet(models.QuerySet):
+    def anterior_a(self, data):
+        return self.filter(data_referencia__lte=data).order_by('-data_referencia').first()
+
+    def gerar(self, data_referencia=None):
+        # Grava os saldos de todos os produtos em data_referencia, partindo do fechamento
+        # anterior e somando apenas as movimentações entre os dois
+        data_referencia = data_referencia or timezone.now()
+        with transaction.atomic(using=self.db):
+            saldos = self.saldos_em(data_referencia)
+            fechamento = self.create(data_referencia=data_referencia)
+            SaldoFechamento.objects.using(self.db).bulk_create(
+                [SaldoFechamento(fechamento=fechamento, produto_id=produto_id, quantidade=quantidade)
+                 for produto_id, quantidade in saldos.items() if quantidade],
+                batch_size=2000,
             )
-        self.produto.save()
-        super().save(*args, **kwargs)
+        return fechamento
+
+    def saldos_em(self, data, produtos=None):
+        # Saldo de cada produto em `data` ({produto_id: quantidade}): saldos do fechamento mais
+        # próximo anterior à data mais as movimentações feitas entre o fechamento e a data
+        saldos = defaultdict(Decimal)
+        movimentacoes = MovimentacaoEstoque.objects.using(self.db).filter(data_movimentacao__lt=data)
+        fechamento = self.anterior_a(data)
+        if fechamento:
+            itens = fechamento.saldos.all()
+            if produtos is not None:
+                itens = itens.filter(produto__in=produtos)
+            saldos.update(itens.values_list('produto_id', 'quantidade'))
+            movimentacoes = movimentacoes.filter(data_movimentacao__gte=fechamento.data_referencia)
+        if produtos is not None:
+            movimentacoes = movimentacoes.filter(produto__in=produtos)
+        deltas = movimentacoes.order_by().values('produto_id').annotate(
+            delta=models.Sum(MovimentacaoEstoque.expressao_delta())).values_list('produto_id', 'delta')
+        for produto_id, delta in deltas:
+            saldos[produto_id] += delta
+        return dict(saldos)
+
+
+class FechamentoEstoque(models.Model):
+    data_referencia = models.DateTimeField(unique=True, verbose_name=_('Data de Referência'))
+    criado_em = models.DateTimeField(auto_now_add=True, verbose_name=_('Criado em'))
+
+    objects = FechamentoEstoqueQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = _('Fechamento de Estoque')
+        verbose_name_plural = _('Fechamentos de Estoque')
+        ordering = ['-data_referencia']
+
+    def __str__(self):
+        return f"Fechamento {self.data_referencia:%d/%m/%Y %H:%M}"
+
+
+class SaldoFechamento(models.Model):
+    fechamento = models.ForeignKey(FechamentoEstoque, on_delete=models.CASCADE, related_name='saldos', verbose_name=_('Fechamento'))
+    produto = models.ForeignKey(Produto, on_delete=models.CASCADE, verbose_name=_('Produto'))
+    quantidade = models.DecimalField(max_digits=10, decimal_places=3, verbose_name=_('Quantidade'))
+
+    class Meta:
+        verbose_name = _('Saldo do Fechamento')
+        verbose_name_plural = _('Saldos do Fechamento')
+        constraints = [
+            models.UniqueConstraint(fields=['fechamento', 'produto'], name='saldo_fechamento_produto_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.produto} - {self.quantidade}"
 
 
 class Inventario(models.Model):
@@ -225,6 +748,29 @@ class Inventario(models.Model):
     def __str__(self):
         return f"Inventário {self.local} - {self.data_inicio.date()}"
 
+    def finalizar(self, usuario=None):
+        # Lança as diferenças contadas como sobras e faltas no local do inventário, todas em uma transação
+        with transaction.atomic():
+            inventario = Inventario.objects.select_for_update().get(pk=self.pk)
+            if inventario.status != 'A':
+                raise ValueError(f"O inventário já está {inventario.get_status_display().lower()}.")
+            ajustes = []
+            itens = self.itens.exclude(quantidade_fisica=F('quantidade_sistema')).values_list(
+                'produto_id', 'quantidade_sistema', 'quantidade_fisica')
+            for produto_id, quantidade_sistema, quantidade_fisica in itens.iterator(chunk_size=2000):
+                diferenca = quantidade_fisica - quantidade_sistema
+                ajustes.append(MovimentacaoEstoque(
+                    produto_id=produto_id, tipo='O' if diferenca > 0 else 'F', quantidade=abs(diferenca), usuario=usuario,
+                    local_destino_id=self.local_id if diferenca > 0 else None,
+                    local_origem_id=self.local_id if diferenca < 0 else None,
+                    observacoes=f"Ajuste do inventário {self.pk}",
+                ))
+            MovimentacaoEstoque.objects.lancar_lote(ajustes)
+            self.status = 'F'
+            self.data_fim = timezone.now()
+            self.save(update_fields=['status', 'data_fim', 'atualizado_em'])
+        return ajustes
+
 
 class ItemInventario(models.Model):
     inventario = models.ForeignKey(Inventario, on_delete=models.CASCADE, related_name='itens', verbose_name=_('Inventário'))
@@ -240,6 +786,10 @@ class ItemInventario(models.Model):
         verbose_name = _('Item de Inventário')
         verbose_name_plural = _('Itens de Inventário')
         unique_together = ['inventario', 'produto']
+        indexes = [
+            models.Index(fields=['conferido', 'id'], name='item_inv_conferido_idx'),
+            models.Index(fields=['data_conferencia'], name='item_inv_data_conferencia_idx'),
+        ]
 
     def __str__(self):
         return f"{self.produto} - Sistema: {self.quantidade_sistema} | Físico: {self.quantidade_fisica}"
@@ -1,3 +1,395 @@
+import io
+from datetime import date, timedelta
+from unittest import mock
+
+from django.contrib import admin
+from django.core.management import call_command
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from core.busca import buscar
+from core.tests import ConsultasChangelistMixin
+from .importacao import importar_contagem, ler_csv, ler_jsonl
+from .models import (Categoria, ConversaoUnidade, EstoqueInsuficiente, FechamentoEstoque, Fornecedor, Inventario,
+                     ItemInventario, LocalEstoque, Lote, MovimentacaoEstoque, Produto, SaldoEstoque)
+
+
+class ChangelistEstoqueTests(ConsultasChangelistMixin, TestCase):
+    def local(self, numero):
+        return LocalEstoque.objects.create(nome=f"Depósito {numero}")
+
+    def produto(self, numero, **campos):
+        return Produto.objects.create(
+            nome=f"Produto {numero}", categoria=Categoria.objects.create(nome=f"Categoria {numero}", tipo='AL'),
+            fornecedor=Fornecedor.objects.create(nome=f"Fornecedor {numero}", tipo='J', cpf_cnpj=str(numero)),
+            localizacao=self.local(numero), **campos)
+
+    def test_produto(self):
+        self.assertChangelistConsultas(Produto, self.produto, 5)
+
+    def test_movimentacao(self):
+        def criar(numero):
+            produto = self.produto(numero)
+            MovimentacaoEstoque.objects.create(produto=produto, tipo='T', quantidade=0,
+                                               local_origem=produto.localizacao, local_destino=self.local(numero))
+        self.assertChangelistConsultas(MovimentacaoEstoque, criar, 5)
+
+    def test_saldo(self):
+        def criar(numero):
+            produto = self.produto(numero)
+            SaldoEstoque.objects.create(produto=produto, local=produto.localizacao, quantidade=1)
+        self.assertChangelistConsultas(SaldoEstoque, criar, 6)
+
+    def test_lote(self):
+        def criar(numero):
+            produto = self.produto(numero)
+            Lote.objects.create(produto=produto, local=produto.localizacao, quantidade=1,
+                                data_validade=date.today() + timedelta(days=numero))
+        self.assertChangelistConsultas(Lote, criar, 8)
+
+    def test_item_inventario(self):
+        def criar(numero):
+            produto = self.produto(numero)
+            inventario = Inventario.objects.create(local=produto.localizacao, data_inicio=timezone.now())
+            ItemInventario.objects.create(inventario=inventario, produto=produto, quantidade_sistema=0, quantidade_fisica=0)
+        self.assertChangelistConsultas(ItemInventario, criar, 3)
+
+    def test_formulario_lote(self):
+        self.assertFormularioConsultas(Lote, self.produto, 3)
+
+    def test_formulario_conversao(self):
+        self.assertFormularioConsultas(ConversaoUnidade, self.produto, 2)
+
+
+class MovimentacaoEstoqueTests(TestCase):
+    def test_saldo_acompanha_movimentacoes(self):
+        produto = Produto.objects.create(nome="Arroz")
+        entrada = MovimentacaoEstoque(produto=produto, tipo='E', quantidade=10)
+        # Sem reler o produto: o UPDATE devolve o saldo novo
+        with self.assertNumQueries(4):
+            entrada.save()
+        self.assertEqual(produto.quantidade_atual, 10)
+        MovimentacaoEstoque.objects.create(produto=produto, tipo='S', quantidade=3)
+        produto.refresh_from_db()
+        self.assertEqual(produto.quantidade_atual, 7)
+
+        entrada.quantidade = 12
+        entrada.save()
+        produto.refresh_from_db()
+        self.assertEqual(produto.quantidade_atual, 9)
+
+    def test_saida_sem_saldo_nao_e_gravada(self):
+        produto = Produto.objects.create(nome="Arroz", quantidade_atual=2)
+        with self.assertRaises(EstoqueInsuficiente):
+            MovimentacaoEstoque.objects.create(produto=produto, tipo='S', quantidade=3)
+        produto.refresh_from_db()
+        self.assertEqual(produto.quantidade_atual, 2)
+        self.assertEqual(list(MovimentacaoEstoque.objects.values_list('tipo', flat=True)), ['I'])
+
+    def test_transferencia_muda_o_local(self):
+        deposito = LocalEstoque.objects.create(nome="Depósito")
+        produto = Produto.objects.create(nome="Arroz", quantidade_atual=5)
+        MovimentacaoEstoque.objects.create(produto=produto, tipo='T', quantidade=5, local_destino=deposito)
+        produto.refresh_from_db()
+        self.assertEqual((produto.quantidade_atual, produto.localizacao), (5, deposito))
+
+    def test_save_do_produto_nao_sobrescreve_a_quantidade(self):
+        produto = Produto.objects.create(nome="Arroz", quantidade_atual=5)
+        desatualizado = Produto.objects.get(pk=produto.pk)
+        MovimentacaoEstoque.objects.create(produto=produto, tipo='E', quantidade=3)
+        desatualizado.marca = "Tio João"
+        desatualizado.save()
+        produto.refresh_from_db()
+        self.assertEqual((produto.quantidade_atual, produto.marca), (8, "Tio João"))
+
+
+class AdminEstoqueTests(ConsultasChangelistMixin, TestCase):
+    def test_formulario_do_produto_nao_altera_a_quantidade(self):
+        produto = Produto.objects.create(nome="Arroz", quantidade_atual=5)
+        MovimentacaoEstoque.objects.create(produto=produto, tipo='E', quantidade=3)
+        resposta = self.client.post(reverse('admin:estoque_produto_change', args=[produto.pk]), {
+            'nome': "Arroz Agulhinha", 'unidade_medida': 'KG', 'quantidade_atual': '5', 'perecivel': 'N',
+            'status': 'A'})
+        self.assertEqual(resposta.status_code, 302)
+        produto.refresh_from_db()
+        self.assertEqual((produto.nome, produto.quantidade_atual), ("Arroz Agulhinha", 8))
+
+    def test_saida_sem_saldo_vira_erro_do_formulario(self):
+        produto = Produto.objects.create(nome="Arroz", quantidade_atual=2)
+        saida = MovimentacaoEstoque.objects.create(produto=produto, tipo='S', quantidade=1)
+        url = reverse('admin:estoque_movimentacaoestoque_add')
+        resposta = self.client.post(url, {'produto': produto.pk, 'tipo': 'S', 'quantidade': '3'})
+        self.assertContains(resposta, "Quantidade insuficiente em estoque. Disponível: 1")
+        # Na edição, a quantidade da própria saída volta a estar disponível
+        url = reverse('admin:estoque_movimentacaoestoque_change', args=[saida.pk])
+        self.assertEqual(self.client.post(url, {'produto': produto.pk, 'tipo': 'S', 'quantidade': '2'}).status_code,
+                         302)
+        self.assertContains(self.client.post(url, {'produto': produto.pk, 'tipo': 'S', 'quantidade': '3'}),
+                            "Disponível: 0")
+        produto.refresh_from_db()
+        self.assertEqual(produto.quantidade_atual, 0)
+
+
+class LancamentoLoteTests(TestCase):
+    def test_lote_em_uma_transacao(self):
+        deposito = LocalEstoque.objects.create(nome="Depósito")
+        arroz = Produto.objects.create(nome="Arroz", quantidade_atual=5)
+        feijao = Produto.objects.create(nome="Feijão", quantidade_atual=1)
+        movimentacoes = [MovimentacaoEstoque(produto=arroz, tipo='E', quantidade=i) for i in range(1, 301)]
+        movimentacoes += [MovimentacaoEstoque(produto=feijao, tipo='S', quantidade=1),
+                          MovimentacaoEstoque(produto=feijao, tipo='T', quantidade=1, local_destino=deposito)]
+        MovimentacaoEstoque.objects.lancar_lote(movimentacoes)
+        arroz.refresh_from_db()
+        feijao.refresh_from_db()
+        self.assertEqual(arroz.quantidade_atual, 5 + 300 * 301 // 2)
+        self.assertEqual((feijao.quantidade_atual, feijao.localizacao), (0, deposito))
+        self.assertEqual(MovimentacaoEstoque.objects.count(), 304)
+
+    def test_falta_de_saldo_cancela_o_lote(self):
+        arroz = Produto.objects.create(nome="Arroz")
+        feijao = Produto.objects.create(nome="Feijão")
+        with self.assertRaisesMessage(EstoqueInsuficiente, "Feijão (disponível: 0"):
+            MovimentacaoEstoque.objects.lancar_lote([MovimentacaoEstoque(produto=arroz, tipo='E', quantidade=1),
+                                                     MovimentacaoEstoque(produto=feijao, tipo='S', quantidade=1)])
+        arroz.refresh_from_db()
+        self.assertEqual(arroz.quantidade_atual, 0)
+        self.assertFalse(MovimentacaoEstoque.objects.exists())
+
+
+class SaldoEstoqueTests(TestCase):
+    def test_saldo_por_local(self):
+        cozinha = LocalEstoque.objects.create(nome="Cozinha")
+        deposito = LocalEstoque.objects.create(nome="Depósito")
+        produto = Produto.objects.create(nome="Arroz", localizacao=cozinha)
+        saldos = lambda: dict(SaldoEstoque.objects.values_list('local__nome', 'quantidade'))
+        MovimentacaoEstoque.objects.create(produto=produto, tipo='E', quantidade=10)
+        MovimentacaoEstoque.objects.create(produto=produto, tipo='T', quantidade=4, local_destino=deposito)
+        self.assertEqual(saldos(), {"Cozinha": 6, "Depósito": 4})
+
+        # A saída sai do local atual do produto, e a edição aplica só a diferença
+        saida = MovimentacaoEstoque.objects.create(produto=produto, tipo='S', quantidade=1)
+        saida.quantidade = 2
+        saida.save()
+        MovimentacaoEstoque.objects.lancar_lote([
+            MovimentacaoEstoque(produto=produto, tipo='E', quantidade=5, local_destino=cozinha),
+            MovimentacaoEstoque(produto=produto, tipo='S', quantidade=1),
+        ])
+        self.assertEqual(saldos(), {"Cozinha": 11, "Depósito": 1})
+        produto.refresh_from_db()
+        self.assertEqual(produto.quantidade_atual, 12)
+
+
+class LoteTests(TestCase):
+    def test_saidas_consomem_o_que_vence_antes(self):
+        cozinha = LocalEstoque.objects.create(nome="Cozinha")
+        deposito = LocalEstoque.objects.create(nome="Depósito")
+        leite = Produto.objects.create(nome="Leite", perecivel='R', localizacao=cozinha)
+        hoje = timezone.localdate()
+        lotes = lambda: sorted(((lote.data_validade - hoje).days, lote.local.nome, lote.quantidade)
+                               for lote in Lote.objects.filter(quantidade__gt=0))
+        entrada = MovimentacaoEstoque.objects.create(produto=leite, tipo='E', quantidade=5,
+                                                     data_validade=hoje + timedelta(days=10))
+        MovimentacaoEstoque.objects.create(produto=leite, tipo='E', quantidade=5,
+                                           data_validade=hoje + timedelta(days=2))
+        MovimentacaoEstoque.objects.lancar_lote([
+            MovimentacaoEstoque(produto=leite, tipo='E', quantidade=3, data_validade=hoje + timedelta(days=1)),
+            MovimentacaoEstoque(produto=leite, tipo='S', quantidade=4),
+        ])
+        MovimentacaoEstoque.objects.create(produto=leite, tipo='S', quantidade=2)
+        self.assertEqual(lotes(), [(2, "Cozinha", 2), (10, "Cozinha", 5)])
+
+        # A transferência leva os lotes consumidos, com a mesma validade, para o destino
+        MovimentacaoEstoque.objects.create(produto=leite, tipo='T', quantidade=4, local_destino=deposito)
+        self.assertEqual(lotes(), [(2, "Depósito", 2), (10, "Cozinha", 3), (10, "Depósito", 2)])
+        self.assertEqual([lote.quantidade for lote in Lote.objects.vencendo(3)], [2])
+
+        entrada.quantidade = 6
+        entrada.save()
+        self.assertEqual(Lote.objects.get(pk=entrada.lote_id).quantidade, 4)
+        leite.refresh_from_db()
+        self.assertEqual(leite.quantidade_atual, 8)
+
+    def test_produto_nao_perecivel_nao_gera_lotes(self):
+        produto = Produto.objects.create(nome="Arroz")
+        MovimentacaoEstoque.objects.create(produto=produto, tipo='E', quantidade=5,
+                                           data_validade=timezone.localdate())
+        self.assertFalse(Lote.objects.exists())
+
+
+class RecalcularEstoqueTests(TestCase):
+    def recalcular(self, *args):
+        call_command('recalcular_estoque', *args, stdout=io.StringIO())
+
+    def test_saldo_do_cadastro_entra_no_historico(self):
+        local = LocalEstoque.objects.create(nome="Depósito")
+        produto = Produto.objects.create(nome="Arroz", quantidade_atual=50, localizacao=local)
+        MovimentacaoEstoque.objects.create(produto=produto, tipo='E', quantidade=10)
+        self.recalcular('--aplicar')
+        produto.refresh_from_db()
+        self.assertEqual(produto.quantidade_atual, 60)
+        self.assertEqual(SaldoEstoque.objects.get(produto=produto, local=local).quantidade, 60)
+
+    def test_corrige_saldos_divergentes(self):
+        cozinha = LocalEstoque.objects.create(nome="Cozinha")
+        deposito = LocalEstoque.objects.create(nome="Depósito")
+        produto = Produto.objects.create(nome="Arroz", localizacao=cozinha)
+        MovimentacaoEstoque.objects.create(produto=produto, tipo='E', quantidade=10)
+        MovimentacaoEstoque.objects.create(produto=produto, tipo='T', quantidade=4, local_destino=deposito)
+        MovimentacaoEstoque.objects.create(produto=produto, tipo='S', quantidade=1)
+        Produto.objects.filter(pk=produto.pk).update(quantidade_atual=50)
+        SaldoEstoque.objects.all().delete()
+
+        self.recalcular()
+        produto.refresh_from_db()
+        self.assertEqual(produto.quantidade_atual, 50)
+        self.recalcular('--aplicar')
+        produto.refresh_from_db()
+        self.assertEqual(produto.quantidade_atual, 9)
+        self.assertEqual(dict(SaldoEstoque.objects.values_list('local', 'quantidade')), {cozinha.pk: 6, deposito.pk: 3})
+
+
+class FechamentoEstoqueTests(TestCase):
+    def movimentar(self, produto, tipo, quantidade, dias):
+        movimentacao = MovimentacaoEstoque.objects.create(produto=produto, tipo=tipo, quantidade=quantidade)
+        MovimentacaoEstoque.objects.filter(pk=movimentacao.pk).update(
+            data_movimentacao=timezone.now() - timedelta(days=dias))
+        return movimentacao
+
+    def test_saldos_partem_do_fechamento_anterior(self):
+        produto = Produto.objects.create(nome="Arroz")
+        entrada = self.movimentar(produto, 'E', 10, dias=3)
+        self.movimentar(produto, 'S', 2, dias=1)
+        call_command('gerar_fechamento_estoque', '--data', str(timezone.localdate() - timedelta(days=2)),
+                     stdout=io.StringIO())
+        MovimentacaoEstoque.objects.create(produto=produto, tipo='E', quantidade=1)
+
+        self.assertEqual(FechamentoEstoque.objects.saldos_em(timezone.now() - timedelta(days=2)), {produto.pk: 10})
+        with self.assertNumQueries(3):
+            self.assertEqual(FechamentoEstoque.objects.saldos_em(timezone.now()), {produto.pk: 9})
+        self.assertEqual(FechamentoEstoque.objects.saldos_em(timezone.now() - timedelta(days=5)), {})
+        fechamento = FechamentoEstoque.objects.gerar()
+        self.assertEqual(dict(fechamento.saldos.values_list('produto', 'quantidade')), {produto.pk: 9})
+
+        # Alterar uma movimentação invalida os fechamentos posteriores a ela
+        entrada.quantidade = 20
+        entrada.save()
+        self.assertFalse(FechamentoEstoque.objects.exists())
+        self.assertEqual(FechamentoEstoque.objects.saldos_em(timezone.now()), {produto.pk: 19})
+
+    def test_fechamento_inclui_saldo_inicial(self):
+        produto = Produto.objects.create(nome="Arroz", quantidade_atual=50)
+        MovimentacaoEstoque.objects.create(produto=produto, tipo='E', quantidade=10)
+        fechamento = FechamentoEstoque.objects.gerar()
+        self.assertEqual(dict(fechamento.saldos.values_list('produto', 'quantidade')), {produto.pk: 60})
+
+
+class InventarioTests(TestCase):
+    def test_finalizar_lanca_sobras_e_faltas(self):
+        local = LocalEstoque.objects.create(nome="Depósito")
+        arroz = Produto.objects.create(nome="Arroz", localizacao=local)
+        feijao = Produto.objects.create(nome="Feijão", localizacao=local)
+        MovimentacaoEstoque.objects.create(produto=arroz, tipo='E', quantidade=10)
+        MovimentacaoEstoque.objects.create(produto=feijao, tipo='E', quantidade=5)
+        inventario = Inventario.objects.create(local=local)
+        importar_contagem(inventario, ler_csv(io.StringIO(f"produto,quantidade\n{arroz.pk},12\n{feijao.pk},4\n")),
+                          tamanho_lote=1)
+        importar_contagem(inventario, ler_jsonl(io.StringIO(f'{{"produto": {feijao.pk}, "quantidade": "3"}}\n')))
+        self.assertEqual(inventario.itens.count(), 2)
+
+        ajustes = inventario.finalizar()
+        self.assertEqual(sorted(ajuste.tipo for ajuste in ajustes), ['F', 'O'])
+        arroz.refresh_from_db()
+        feijao.refresh_from_db()
+        self.assertEqual((arroz.quantidade_atual, feijao.quantidade_atual), (12, 3))
+        self.assertEqual(dict(SaldoEstoque.objects.values_list('produto', 'quantidade')), {arroz.pk: 12, feijao.pk: 3})
+        with self.assertRaises(ValueError):
+            inventario.finalizar()
+
+    def test_ajuste_com_destino_realoca_sem_alterar_quantidade(self):
+        cozinha = LocalEstoque.objects.create(nome="Cozinha")
+        deposito = LocalEstoque.objects.create(nome="Depósito")
+        produto = Produto.objects.create(nome="Arroz", localizacao=cozinha)
+        MovimentacaoEstoque.objects.create(produto=produto, tipo='E', quantidade=10)
+        MovimentacaoEstoque.objects.create(produto=produto, tipo='A', quantidade=10, local_destino=deposito)
+        produto.refresh_from_db()
+        self.assertEqual((produto.quantidade_atual, produto.localizacao), (10, deposito))
+        self.assertEqual(dict(SaldoEstoque.objects.values_list('local', 'quantidade')), {cozinha.pk: 0, deposito.pk: 10})
+
+
+class PaginacaoCursorTests(ConsultasChangelistMixin, TestCase):
+    def test_paginas_seguem_pela_chave(self):
+        produto = Produto.objects.create(nome="Arroz", categoria=Categoria.objects.create(nome="Grãos", tipo='AL'))
+        movimentacoes = [MovimentacaoEstoque.objects.create(produto=produto, tipo='E', quantidade=1) for _ in range(3)]
+        url = reverse('admin:estoque_movimentacaoestoque_changelist')
+        with mock.patch.object(admin.site._registry[MovimentacaoEstoque], 'list_per_page', 2):
+            resposta = self.client.get(url)
+            cl = resposta.context['cl']
+            self.assertEqual([m.pk for m in cl.result_list], [movimentacoes[2].pk, movimentacoes[1].pk])
+            self.assertIsNone(cl.primeira_pagina_url)
+            self.assertContains(resposta, 'Anteriores &raquo;')
+            # Sem contagem: só a sessão, o usuário e a página com uma linha a mais
+            with self.assertNumQueries(3):
+                cl = self.client.get(url + cl.proxima_pagina_url).context['cl']
+        self.assertEqual([m.pk for m in cl.result_list], [movimentacoes[0].pk])
+        self.assertIsNone(cl.proxima_pagina_url)
+        self.assertEqual(cl.primeira_pagina_url, '?')
+        # Ordenando por uma coluna a paginação volta a ser numerada
+        cl = self.client.get(url, {'o': '3', 'apos': movimentacoes[1].pk}).context['cl']
+        self.assertFalse(cl.por_cursor)
+        self.assertEqual(cl.result_count, 3)
+        # Filtros e busca levam o cursor adiante, mas os links montados a partir deles recomeçam
+        cl = self.client.get(url, {'tipo__exact': 'E', 'q': 'arroz', 'apos': movimentacoes[2].pk}).context['cl']
+        self.assertEqual(len(cl.result_list), 2)
+        self.assertNotIn('apos', cl.get_query_string({'o': '1'}))
+        self.assertRedirects(self.client.get(url, {'apos': 'x'}), url + '?e=1', fetch_redirect_response=False)
+
+    def test_filtro_de_data_com_cursor(self):
+        produto = Produto.objects.create(nome="Arroz")
+        movimentacoes = [MovimentacaoEstoque.objects.create(produto=produto, tipo='E', quantidade=1)
+                         for _ in range(4)]
+        MovimentacaoEstoque.objects.filter(pk=movimentacoes[3].pk).update(
+            data_movimentacao=timezone.now() - timedelta(days=30))
+        url = reverse('admin:estoque_movimentacaoestoque_changelist')
+        hoje = {'data_movimentacao__gte': str(timezone.localdate()),
+                'data_movimentacao__lt': str(timezone.localdate() + timedelta(days=1))}
+        with mock.patch.object(admin.site._registry[MovimentacaoEstoque], 'list_per_page', 2):
+            cl = self.client.get(url, hoje).context['cl']
+            self.assertEqual([m.pk for m in cl.result_list], [movimentacoes[2].pk, movimentacoes[1].pk])
+            self.assertIn('data_movimentacao__gte', cl.proxima_pagina_url)
+            cl = self.client.get(url + cl.proxima_pagina_url).context['cl']
+        self.assertEqual([m.pk for m in cl.result_list], [movimentacoes[0].pk])
+        self.assertIsNone(cl.proxima_pagina_url)
+
+
+class BuscaProdutoTests(TestCase):
+    def test_busca_por_trechos(self):
+        arroz = Produto.objects.create(nome="Arroz Agulhinha", marca="Tio João", descricao="Tipo 1")
+        feijao = Produto.objects.create(nome="Feijão Carioca", marca="Kicaldo")
+        encontrados = lambda termo: set(buscar(Produto.objects.all(), termo))
+
+        self.assertEqual(encontrados("gulh"), {arroz})
+        self.assertEqual(encontrados("joão arroz"), {arroz})
+        self.assertEqual(encontrados("CARIOCA ki"), {feijao})
+        self.assertEqual(encontrados("arroz kicaldo"), set())
+
+        feijao.marca = "Camil"
+        feijao.save()
+        self.assertEqual(encontrados("kicaldo"), set())
+        self.assertEqual(encontrados("camil"), {feijao})
+        arroz.delete()
+        self.assertEqual(encontrados("arroz"), set())
+
 
-# Create your tests here.
+class AutocompleteProdutoTests(ConsultasChangelistMixin, TestCase):
+    def test_consultas_nao_crescem_com_os_resultados(self):
+        for numero in range(ConsultasChangelistMixin.linhas):
+            Produto.objects.create(nome=f"Arroz {numero}",
+                                   categoria=Categoria.objects.create(nome=f"Categoria {numero}", tipo='AL'))
+        parametros = {'term': 'arroz', 'app_label': 'estoque', 'model_name': 'movimentacaoestoque',
+                      'field_name': 'produto'}
+        # A primeira busca da conexão consulta se a tabela FTS5 existe
+        self.client.get(reverse('admin:autocomplete'), parametros)
+        with self.assertNumQueries(4):
+            resposta = self.client.get(reverse('admin:autocomplete'), parametros)
+        self.assertEqual(len(resposta.json()['results']), ConsultasChangelistMixin.linhas)
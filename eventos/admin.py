@@ -1,8 +1,11 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 from .models import (TipoEvento, Cardapio,
                      ItemCompraCardapio, Evento,
                      AlocacaoFuncionario, ConsumoEvento,
                      EnderecoEvento)
+from core.cache import FiltroReferencia, ReferenciasEmCacheMixin
+from .custos import rentabilidade
+from .planejamento import atualizar_custos_cardapios
 
 
 class TipoEventoAdmin(admin.ModelAdmin):
@@ -15,10 +18,20 @@ class TipoEventoAdmin(admin.ModelAdmin):
             return "Nao"
 
 
-class CardapioAdmin(admin.ModelAdmin):
-    readonly_fields = ('criado_em','atualizado_em',)
-    list_display = ('nome', 'tipo_evento', 'preco_base',
+class CardapioAdmin(ReferenciasEmCacheMixin, admin.ModelAdmin):
+    readonly_fields = ('custo_por_convidado', 'criado_em','atualizado_em',)
+    list_display = ('nome', 'tipo_evento', 'preco_base', 'custo_por_convidado',
                     'esta_ativo', 'data_criacao', 'ultima_atualizacao')
+    list_select_related = ('tipo_evento',)
+    actions = ['recalcular_custos']
+
+    @admin.action(description='Recalcular custo por convidado')
+    def recalcular_custos(self, request, queryset):
+        pendentes = atualizar_custos_cardapios(list(queryset.values_list('id', flat=True)))
+        self.message_user(request, f"Custo recalculado para {queryset.count()} cardápios.")
+        for cardapio_id, itens in pendentes.items():
+            self.message_user(request, f"Cardápio {cardapio_id}: sem produto, preço ou conversão para "
+                                       f"{', '.join(itens)}.", messages.WARNING)
 
     def esta_ativo(self, obj):
         if obj.ativo:
@@ -34,31 +47,67 @@ class CardapioAdmin(admin.ModelAdmin):
 
 
 class ItemCompraCardapioAdmin(admin.ModelAdmin):
-    list_display = ('nome', 'cardapio', 'quantidade',
+    list_display = ('nome', 'cardapio', 'produto', 'quantidade',
                     'unidade')
+    list_select_related = ('cardapio', 'produto__categoria')
+    autocomplete_fields = ('produto',)
 
 
-class EventoAdmin(admin.ModelAdmin):
+class EventoAdmin(ReferenciasEmCacheMixin, admin.ModelAdmin):
     readonly_fields = ('valor_total','valor_custo',
                        'criado_em','atualizado_em',)
     list_display = ('nome_evento', 'tipo_evento', 'cliente',
                     'data_inicio', 'data_fim', 'numero_convidados',
-                    'valor_total', 'valor_custo', 'lucro_estimado', 'status')
+                    'receita', 'custo', 'lucro', 'margem', 'status')
+    list_select_related = ('tipo_evento', 'cliente')
+    list_filter = ('status', ('tipo_evento', FiltroReferencia))
+    search_fields = ('nome_evento', 'cliente__nome')
+    autocomplete_fields = ('cliente',)
+
+    def get_queryset(self, request):
+        # Receita, custo e lucro vêm dos lançamentos, alocações e consumos na mesma consulta. Só a
+        # listagem mostra essas colunas: formulário, exclusão e autocomplete dispensam as subconsultas.
+        queryset = super().get_queryset(request)
+        listagem = f'{self.opts.app_label}_{self.opts.model_name}_changelist'
+        if request.resolver_match and request.resolver_match.url_name == listagem:
+            queryset = rentabilidade(queryset)
+        return queryset
+
+    @admin.display(description='Receita', ordering='receita')
+    def receita(self, obj):
+        return obj.receita
+
+    @admin.display(description='Custo', ordering='custo')
+    def custo(self, obj):
+        return obj.custo
+
+    @admin.display(description='Lucro', ordering='lucro')
+    def lucro(self, obj):
+        return obj.lucro
+
+    @admin.display(description='Margem (%)', ordering='margem')
+    def margem(self, obj):
+        return obj.margem
 
 
 class AlocacaoFuncionarioAdmin(admin.ModelAdmin):
     list_display = ('funcionario', 'evento', 'valor')
+    list_select_related = ('funcionario', 'evento')
+    autocomplete_fields = ('evento', 'funcionario')
 
 
 class ConsumoEventoAdmin(admin.ModelAdmin):
     list_display = ('produto', 'evento', 'quantidade',
                     'valor_unitario')
+    list_select_related = ('produto__categoria', 'evento')
+    autocomplete_fields = ('evento', 'produto')
 
 
 class EnderecoEventoAdmin(admin.ModelAdmin):
     list_display = ('evento', 'logadouro', 'numero',
                     'complemento', 'bairro', 'cidade',
                     'cep')
+    list_select_related = ('evento',)
 
 
 admin.site.register(TipoEvento, TipoEventoAdmin)
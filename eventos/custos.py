@@ -0,0 +1,111 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db.models import Case, DecimalField, ExpressionWrapper, F, FloatField, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Cast, Coalesce, NullIf, Round
+from django.utils import timezone
+
+from financas.models import LancamentoFinanceiro
+from .models import AlocacaoFuncionario, ConsumoEvento, Evento
+
+CENTAVOS = Decimal('0.01')
+
+
+def _somar_por_evento(deltas):
+    return {evento_id: Decimal(delta).quantize(CENTAVOS) for evento_id, delta in deltas.items()
+            if evento_id and delta}
+
+
+def _incremento(deltas):
+    return Case(
+        *[When(pk=evento_id, then=Value(delta)) for evento_id, delta in deltas.items()],
+        default=Value(Decimal(0)),
+        output_field=DecimalField(max_digits=12, decimal_places=2),
+    )
+
+
+def aplicar(custos=None, receitas=None):
+    # Soma os deltas ({evento_id: delta}) em valor_custo e valor_total com um único UPDATE,
+    # sem ler nem regravar a linha inteira do evento
+    custos = _somar_por_evento(custos or {})
+    receitas = _somar_por_evento(receitas or {})
+    if not custos and not receitas:
+        return
+    valores = {'atualizado_em': timezone.now()}
+    if custos:
+        valores['valor_custo'] = F('valor_custo') + _incremento(custos)
+    if receitas:
+        valores['valor_total'] = F('valor_total') + _incremento(receitas)
+    Evento.objects.filter(pk__in=set(custos) | set(receitas)).update(**valores)
+
+
+def deltas_lancamentos(efeitos):
+    # Converte efeitos de lançamentos financeiros (evento_id, tipo da categoria, status, valor, sinal)
+    # em deltas de custo (despesas) e receita; lançamentos cancelados não contam
+    custos = defaultdict(Decimal)
+    receitas = defaultdict(Decimal)
+    for evento_id, tipo, status, valor, sinal in efeitos:
+        if evento_id and status != 'CA':
+            (custos if tipo == 'DE' else receitas)[evento_id] += sinal * valor
+    return custos, receitas
+
+
+def _total(queryset, evento, expressao):
+    return Coalesce(
+        Subquery(queryset.order_by().values(evento).annotate(total=Sum(expressao)).values('total')),
+        Value(Decimal(0)),
+        output_field=DecimalField(max_digits=14, decimal_places=2),
+    )
+
+
+def _mao_de_obra():
+    return _total(AlocacaoFuncionario.objects.filter(evento=OuterRef('pk')), 'evento', F('valor'))
+
+
+def _consumo():
+    return _total(ConsumoEvento.objects.filter(evento=OuterRef('pk')), 'evento', F('quantidade') * F('valor_unitario'))
+
+
+def _lancamentos(tipo):
+    lancamentos = LancamentoFinanceiro.objects.filter(
+        contrato__evento=OuterRef('pk'), categoria__tipo=tipo).exclude(status='CA')
+    return _total(lancamentos, 'contrato__evento', F('valor'))
+
+
+def expressao_custo():
+    # valor_custo calculado a partir dos filhos: alocações, consumos e despesas dos contratos
+    return _mao_de_obra() + _consumo() + _lancamentos('DE')
+
+
+def rentabilidade(eventos=None, inicio=None, fim=None, tipos=None, clientes=None):
+    # Receita, custos e lucro de cada evento calculados a partir dos filhos com subconsultas
+    # em uma única consulta, sem depender de valor_total/valor_custo. `inicio` e `fim`
+    # (datetimes) filtram por data_inicio.
+    eventos = Evento.objects.all() if eventos is None else eventos
+    if inicio:
+        eventos = eventos.filter(data_inicio__gte=inicio)
+    if fim:
+        eventos = eventos.filter(data_inicio__lt=fim)
+    if tipos:
+        eventos = eventos.filter(tipo_evento__in=tipos)
+    if clientes:
+        eventos = eventos.filter(cliente__in=clientes)
+    valor = DecimalField(max_digits=14, decimal_places=2)
+    return (eventos
+            .annotate(receita=_lancamentos('RE'), mao_de_obra=_mao_de_obra(), consumo=_consumo(),
+                      outras_despesas=_lancamentos('DE'))
+            .annotate(custo=ExpressionWrapper(F('mao_de_obra') + F('consumo') + F('outras_despesas'),
+                                              output_field=valor))
+            .annotate(lucro=ExpressionWrapper(F('receita') - F('custo'), output_field=valor),
+                      margem=Round(Cast(F('receita') - F('custo'), FloatField()) * 100 / NullIf(F('receita'), Value(0)),
+                                   2, output_field=DecimalField(max_digits=8, decimal_places=2))))
+
+
+def recalcular(eventos=None, tamanho_lote=500):
+    # Recalcula valor_custo a partir dos filhos com um UPDATE por lote de eventos
+    ids = list((Evento.objects.all() if eventos is None else Evento.objects.filter(pk__in=eventos))
+               .order_by('pk').values_list('pk', flat=True))
+    for inicio in range(0, len(ids), tamanho_lote):
+        Evento.objects.filter(pk__in=ids[inicio:inicio + tamanho_lote]).update(
+            valor_custo=expressao_custo(), atualizado_em=timezone.now())
+    return len(ids)
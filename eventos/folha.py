@@ -0,0 +1,88 @@
+import csv
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import models, transaction
+from django.db.models import Case, Value, When
+from django.utils import timezone
+
+from core.models import DadosBancariosFunc, Funcionario
+from financas.models import LancamentoFinanceiro, ResumoFinanceiroMensal
+from .models import AlocacaoFuncionario
+
+
+def alocacoes_a_pagar(inicio, fim, funcionarios=None):
+    # Alocações ainda não pagas dos eventos que começam entre `inicio` e `fim` (datetimes)
+    alocacoes = AlocacaoFuncionario.objects.filter(
+        pago=False, evento__data_inicio__gte=inicio, evento__data_inicio__lt=fim)
+    if funcionarios:
+        alocacoes = alocacoes.filter(funcionario__in=funcionarios)
+    return alocacoes
+
+
+def fechar_folha(alocacoes, categoria, data_pagamento=None, liquidar=True, descricao='Folha'):
+    # Agrupa as alocações não pagas por colaborador, cria um lançamento de despesa por pessoa
+    # (sem contrato: o custo já está nos eventos pelas alocações) e marca todas as alocações
+    # como pagas com um único UPDATE. Com `liquidar`, os lançamentos já saem pagos do caixa.
+    if categoria.tipo != 'DE':
+        raise ValueError("A folha deve ser lançada em uma categoria de despesa.")
+    data_pagamento = data_pagamento or timezone.localdate()
+    with transaction.atomic():
+        linhas = list(alocacoes.filter(pago=False).select_for_update(of=('self',))
+                      .values_list('id', 'funcionario_id', 'valor'))
+        if not linhas:
+            return []
+        por_funcionario = defaultdict(lambda: {'alocacoes': [], 'total': Decimal(0)})
+        for alocacao_id, funcionario_id, valor in linhas:
+            por_funcionario[funcionario_id]['alocacoes'].append(alocacao_id)
+            por_funcionario[funcionario_id]['total'] += valor
+        funcionarios = {funcionario_id: (nome, cpf) for funcionario_id, nome, cpf in
+                        Funcionario.objects.filter(pk__in=por_funcionario).values_list('id', 'nome', 'cpf')}
+
+        lancamentos = LancamentoFinanceiro.objects.bulk_create([
+            LancamentoFinanceiro(
+                categoria=categoria, valor=pagamento['total'], data_vencimento=data_pagamento,
+                observacoes=f"{descricao}: {funcionarios[funcionario_id][0]} ({len(pagamento['alocacoes'])} alocações)")
+            for funcionario_id, pagamento in por_funcionario.items()
+        ])
+        ResumoFinanceiroMensal.objects.aplicar([lancamento.efeito_resumo() for lancamento in lancamentos])
+        for pagamento, lancamento in zip(por_funcionario.values(), lancamentos):
+            pagamento['lancamento'] = lancamento
+
+        ids = [alocacao_id for alocacao_id, *_ in linhas]
+        AlocacaoFuncionario.objects.filter(pk__in=ids).update(
+            pago=True, data_pagamento=data_pagamento,
+            lancamento=Case(
+                *[When(funcionario_id=funcionario_id, then=Value(pagamento['lancamento'].pk))
+                  for funcionario_id, pagamento in por_funcionario.items()],
+                output_field=models.BigIntegerField(),
+            ))
+        if liquidar:
+            LancamentoFinanceiro.objects.filter(pk__in=[lancamento.pk for lancamento in lancamentos]).liquidar(
+                data_pagamento)
+    return [{'funcionario_id': funcionario_id, 'nome': funcionarios[funcionario_id][0],
+             'cpf': funcionarios[funcionario_id][1], **pagamento}
+            for funcionario_id, pagamento in por_funcionario.items()]
+
+
+def exportar_pagamentos(folha, arquivo):
+    # Arquivo de remessa em CSV (um pagamento por linha) com a chave PIX ou a conta bancária
+    # do colaborador; quando há mais de um cadastro, vale o primeiro. Devolve os nomes de quem
+    # não tem dados bancários.
+    contas = {}
+    for conta in (DadosBancariosFunc.objects.filter(funcionario__in=[linha['funcionario_id'] for linha in folha])
+                  .order_by('funcionario_id', 'id')):
+        contas.setdefault(conta.funcionario_id, conta)
+    escritor = csv.writer(arquivo, delimiter=';')
+    escritor.writerow(['nome', 'cpf', 'valor', 'chave_pix', 'banco', 'agencia', 'conta', 'lancamento'])
+    sem_dados = []
+    for linha in folha:
+        conta = contas.get(linha['funcionario_id'])
+        if conta:
+            bancarios = [conta.pix or '', conta.nr_bco or '', conta.agencia, conta.conta]
+        else:
+            sem_dados.append(linha['nome'])
+            bancarios = ['', '', '', '']
+        escritor.writerow([linha['nome'], linha['cpf'] or '', f"{linha['total']:.2f}", *bancarios,
+                           linha['lancamento'].pk])
+    return sem_dados
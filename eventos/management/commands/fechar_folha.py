@@ -0,0 +1,53 @@
+from datetime import datetime, time, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from eventos.folha import alocacoes_a_pagar, exportar_pagamentos, fechar_folha
+from financas.models import CategoriaFinanceira
+
+
+class Command(BaseCommand):
+    help = ('Fecha a folha dos colaboradores alocados nos eventos de um período: um lançamento por '
+            'pessoa, alocações marcadas como pagas e arquivo de pagamentos (PIX/conta) em CSV.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('inicio', help='Primeiro dia do período (AAAA-MM-DD).')
+        parser.add_argument('fim', help='Último dia do período (AAAA-MM-DD).')
+        parser.add_argument('--categoria', type=int, required=True,
+                            help='Id da categoria de despesa em que a folha é lançada.')
+        parser.add_argument('--data-pagamento', help='Data do pagamento (AAAA-MM-DD). Padrão: hoje.')
+        parser.add_argument('--pendente', action='store_true',
+                            help='Cria os lançamentos pendentes, sem baixar do caixa.')
+        parser.add_argument('--arquivo', help='Grava o arquivo de pagamentos neste caminho.')
+
+    def _dia(self, texto):
+        try:
+            return datetime.strptime(texto, '%Y-%m-%d').date()
+        except ValueError:
+            raise CommandError("Datas inválidas, use o formato AAAA-MM-DD.")
+
+    def handle(self, *args, **options):
+        inicio = self._dia(options['inicio'])
+        fim = self._dia(options['fim'])
+        data_pagamento = self._dia(options['data_pagamento']) if options['data_pagamento'] else None
+        try:
+            categoria = CategoriaFinanceira.objects.get(pk=options['categoria'])
+        except CategoriaFinanceira.DoesNotExist:
+            raise CommandError(f"Categoria {options['categoria']} não encontrada.")
+        alocacoes = alocacoes_a_pagar(timezone.make_aware(datetime.combine(inicio, time.min)),
+                                      timezone.make_aware(datetime.combine(fim + timedelta(days=1), time.min)))
+        try:
+            folha = fechar_folha(alocacoes, categoria, data_pagamento, liquidar=not options['pendente'],
+                                 descricao=f"Folha {inicio:%d/%m/%Y} a {fim:%d/%m/%Y}")
+        except ValueError as erro:
+            raise CommandError(str(erro))
+        if options['arquivo']:
+            with open(options['arquivo'], 'w', newline='', encoding='utf-8') as arquivo:
+                sem_dados = exportar_pagamentos(folha, arquivo)
+        else:
+            sem_dados = exportar_pagamentos(folha, self.stdout)
+        for nome in sem_dados:
+            self.stderr.write(f"{nome} não tem dados bancários cadastrados.")
+        total = sum(linha['total'] for linha in folha)
+        self.stderr.write(self.style.SUCCESS(f"Folha fechada: {len(folha)} colaboradores, R${total}."))
@@ -0,0 +1,38 @@
+import csv
+from datetime import datetime, time, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from eventos.models import Evento
+from eventos.planejamento import lista_compras
+
+
+class Command(BaseCommand):
+    help = ('Gera a lista de compras consolidada dos cardápios dos eventos de um período, '
+            'já descontando o estoque atual.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('inicio', help='Primeiro dia do período (AAAA-MM-DD).')
+        parser.add_argument('fim', help='Último dia do período (AAAA-MM-DD).')
+        parser.add_argument('--status', nargs='+', default=['CO'],
+                            choices=[codigo for codigo, _ in Evento.STATUS_CHOICES],
+                            help='Status dos eventos considerados (padrão: CO).')
+        parser.add_argument('--todos', action='store_true',
+                            help='Inclui também os itens que não precisam ser comprados.')
+
+    def handle(self, *args, **options):
+        try:
+            inicio = datetime.strptime(options['inicio'], '%Y-%m-%d').date()
+            fim = datetime.strptime(options['fim'], '%Y-%m-%d').date()
+        except ValueError:
+            raise CommandError("Datas inválidas, use o formato AAAA-MM-DD.")
+        lista = lista_compras(timezone.make_aware(datetime.combine(inicio, time.min)),
+                              timezone.make_aware(datetime.combine(fim + timedelta(days=1), time.min)),
+                              options['status'])
+        escritor = csv.writer(self.stdout)
+        escritor.writerow(['item', 'unidade', 'necessario', 'em_estoque', 'comprar', 'eventos'])
+        for item in lista:
+            if item['comprar'] or options['todos']:
+                escritor.writerow([item['nome'], item['unidade'], item['necessario'],
+                                   item['em_estoque'], item['comprar'], item['eventos']])
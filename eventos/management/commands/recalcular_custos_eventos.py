@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from eventos.custos import recalcular
+
+
+class Command(BaseCommand):
+    help = ('Recalcula Evento.valor_custo a partir das alocações de funcionários, consumos e despesas '
+            'dos contratos, com um UPDATE por lote de eventos.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--evento', type=int, action='append', dest='eventos',
+                            help='Limita o recálculo ao evento informado (pode ser repetido).')
+        parser.add_argument('--tamanho-lote', type=int, default=500,
+                            help='Quantidade de eventos atualizados por UPDATE (padrão: 500).')
+
+    def handle(self, *args, **options):
+        total = recalcular(options['eventos'], options['tamanho_lote'])
+        self.stdout.write(self.style.SUCCESS(f"{total} eventos recalculados."))
@@ -0,0 +1,41 @@
+import csv
+from datetime import datetime, time, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from eventos.custos import rentabilidade
+
+
+class Command(BaseCommand):
+    help = ('Relatório de rentabilidade por evento: receita, mão de obra, consumo, outras despesas, '
+            'lucro e margem, calculados a partir dos lançamentos, alocações e consumos.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--inicio', help='Eventos que começam a partir deste dia (AAAA-MM-DD).')
+        parser.add_argument('--fim', help='Eventos que começam até este dia (AAAA-MM-DD).')
+        parser.add_argument('--tipo', type=int, action='append', dest='tipos',
+                            help='Id do tipo de evento (pode ser repetido).')
+        parser.add_argument('--cliente', type=int, action='append', dest='clientes',
+                            help='Id do cliente (pode ser repetido).')
+
+    def _dia(self, texto, dias=0):
+        if not texto:
+            return None
+        try:
+            dia = datetime.strptime(texto, '%Y-%m-%d').date()
+        except ValueError:
+            raise CommandError("Datas inválidas, use o formato AAAA-MM-DD.")
+        return timezone.make_aware(datetime.combine(dia + timedelta(days=dias), time.min))
+
+    def handle(self, *args, **options):
+        eventos = rentabilidade(inicio=self._dia(options['inicio']), fim=self._dia(options['fim'], 1),
+                                tipos=options['tipos'], clientes=options['clientes'])
+        escritor = csv.writer(self.stdout)
+        escritor.writerow(['evento', 'cliente', 'data_inicio', 'receita', 'mao_de_obra', 'consumo',
+                           'outras_despesas', 'lucro', 'margem'])
+        for evento in eventos.select_related('cliente').order_by('data_inicio', 'id'):
+            escritor.writerow([evento.nome_evento, evento.cliente.nome,
+                               evento.data_inicio.date().isoformat() if evento.data_inicio else '',
+                               evento.receita, evento.mao_de_obra, evento.consumo, evento.outras_despesas,
+                               evento.lucro, evento.margem if evento.margem is not None else ''])
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.2 on 2026-10-18 17:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def registrar_consumos(apps, schema_editor):
+    # Consumos antigos já baixaram o estoque direto no produto; aqui só criamos as saídas
+    # correspondentes no livro de movimentações, sem alterar saldos.
+    ConsumoEvento = apps.get_model('eventos', 'ConsumoEvento')
+    MovimentacaoEstoque = apps.get_model('estoque', 'MovimentacaoEstoque')
+    consumos = list(ConsumoEvento.objects.filter(movimentacao__isnull=True).select_related('evento', 'produto'))
+    movimentacoes = MovimentacaoEstoque.objects.bulk_create(
+        [MovimentacaoEstoque(produto_id=consumo.produto_id, tipo='S', quantidade=consumo.quantidade,
+                             local_origem_id=consumo.produto.localizacao_id,
+                             observacoes=f"Consumo do evento {consumo.evento.nome_evento}")
+         for consumo in consumos],
+        batch_size=500,
+    )
+    por_data = {}
+    for consumo, movimentacao in zip(consumos, movimentacoes):
+        consumo.movimentacao_id = movimentacao.id
+        if consumo.evento.data_inicio:
+            por_data.setdefault(consumo.evento.data_inicio, []).append(movimentacao.id)
+    ConsumoEvento.objects.bulk_update(consumos, ['movimentacao'], batch_size=500)
+    for data, ids in por_data.items():
+        MovimentacaoEstoque.objects.filter(id__in=ids).update(data_movimentacao=data)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('estoque', '0007_saldoestoque'),
+        ('eventos', '0006_alocacaofuncionario_data_pagamento'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='consumoevento',
+            name='movimentacao',
+            field=models.OneToOneField(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='consumo', to='estoque.movimentacaoestoque', verbose_name='Movimentação de Estoque'),
+        ),
+        migrations.RunPython(registrar_consumos, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.2 on 2026-10-18 17:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('estoque', '0010_conversaounidade'),
+        ('eventos', '0007_consumoevento_movimentacao'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cardapio',
+            name='custo_por_convidado',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=10, null=True, verbose_name='Custo por Convidado'),
+        ),
+        migrations.AddField(
+            model_name='itemcompracardapio',
+            name='produto',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='itens_cardapio', to='estoque.produto', verbose_name='Produto'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.2 on 2026-10-18 17:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('eventos', '0008_itemcompracardapio_produto_custo'),
+        ('financas', '0007_agendamentofinanceiro'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='alocacaofuncionario',
+            name='lancamento',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='alocacoes', to='financas.lancamentofinanceiro'),
+        ),
+    ]
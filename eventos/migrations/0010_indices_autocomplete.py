@@ -0,0 +1,18 @@
+# Generated by Django 5.2.2 on 2026-10-18 17:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_indices_autocomplete'),
+        ('eventos', '0009_alocacaofuncionario_lancamento'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='evento',
+            index=models.Index(fields=['data_inicio'], name='evento_data_inicio_idx'),
+        ),
+    ]
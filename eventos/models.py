@@ -1,6 +1,9 @@
-from django.db import models
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import models, transaction
 from django.utils.translation import gettext_lazy as _
-from estoque.models import UNIDADE_CHOICES
+from estoque.models import UNIDADE_CHOICES, MovimentacaoEstoque
 
 
 class TipoEvento(models.Model):
@@ -21,6 +24,8 @@ class Cardapio(models.Model):
     descricao = models.TextField()
     tipo_evento = models.ForeignKey(TipoEvento, on_delete=models.SET_NULL, null=True, blank=True)
     preco_base = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    custo_por_convidado = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, editable=False,
+                                              verbose_name=_('Custo por Convidado'))
     ativo = models.BooleanField(default=True)
     criado_em = models.DateTimeField(auto_now_add=True)
     atualizado_em = models.DateTimeField(auto_now=True)
@@ -35,6 +40,8 @@ class Cardapio(models.Model):
 
 class ItemCompraCardapio(models.Model):
     nome = models.CharField(max_length=100)
+    produto = models.ForeignKey("estoque.Produto", on_delete=models.SET_NULL, null=True, blank=True,
+                                related_name='itens_cardapio', verbose_name=_('Produto'))
     unidade = models.CharField(max_length=3, choices=UNIDADE_CHOICES, default='UN')
     cardapio = models.ForeignKey(Cardapio, on_delete=models.CASCADE, related_name='itens')
     quantidade = models.DecimalField(max_digits=10, decimal_places=3)
@@ -75,6 +82,9 @@ class Evento(models.Model):
         verbose_name = _('Evento')
         verbose_name_plural = _('Eventos')
         ordering = ['-data_inicio']
+        indexes = [
+            models.Index(fields=['data_inicio'], name='evento_data_inicio_idx'),
+        ]
 
     def __str__(self):
         return f"{self.nome_evento}"
@@ -93,6 +103,9 @@ class AlocacaoFuncionario(models.Model):
     data_pagamento = models.DateField(null=True, blank=True)
     observacoes = models.TextField(blank=True, null=True)
     pago = models.BooleanField(default=False)
+    # Lançamento da folha em que a alocação foi paga
+    lancamento = models.ForeignKey("financas.LancamentoFinanceiro", on_delete=models.SET_NULL, null=True, blank=True,
+                                   editable=False, related_name='alocacoes')
 
     class Meta:
         verbose_name = _('Alocação de Funcionário')
@@ -102,15 +115,17 @@ class AlocacaoFuncionario(models.Model):
         return f"{self.funcionario} - {self.evento}"
 
     def save(self, *args, **kwargs):
-        if not self.id:
-            self.evento.valor_custo += self.valor
-        else:
-            old_instance = AlocacaoFuncionario.objects.get(id=self.evento.id)
-            if old_instance.valor != self.valor:
-                self.evento.valor_custo -= old_instance.valor
-                self.evento.valor_custo += self.valor
-        self.evento.save()
-        super().save(*args, **kwargs)
+        from .custos import aplicar
+
+        with transaction.atomic():
+            custos = defaultdict(Decimal)
+            custos[self.evento_id] += self.valor
+            if self.id:
+                anterior = AlocacaoFuncionario.objects.filter(id=self.id).values('evento_id', 'valor').first()
+                if anterior:
+                    custos[anterior['evento_id']] -= anterior['valor']
+            super().save(*args, **kwargs)
+            aplicar(custos=custos)
 
 
 class ConsumoEvento(models.Model):
@@ -119,6 +134,8 @@ class ConsumoEvento(models.Model):
     quantidade = models.DecimalField(max_digits=10, decimal_places=3)
     valor_unitario = models.DecimalField(max_digits=10, decimal_places=2)
     observacoes = models.TextField(blank=True, null=True)
+    movimentacao = models.OneToOneField("estoque.MovimentacaoEstoque", on_delete=models.SET_NULL, null=True, blank=True,
+                                        editable=False, related_name='consumo', verbose_name=_('Movimentação de Estoque'))
 
     class Meta:
         verbose_name = _('Consumo do Evento - Estoque')
@@ -127,20 +144,38 @@ class ConsumoEvento(models.Model):
     def __str__(self):
         return f"{self.produto} - {self.quantidade}"
 
+    @property
+    def custo(self):
+        return self.quantidade * self.valor_unitario
+
+    def clean(self):
+        # A baixa é uma saída do estoque: a falta de saldo aparece no formulário, não ao salvar
+        if self.produto_id and self.quantidade is not None:
+            MovimentacaoEstoque(id=self.movimentacao_id, produto_id=self.produto_id, tipo='S',
+                                quantidade=self.quantidade).clean()
+
     def save(self, *args, **kwargs):
-        if not self.id:
-            self.evento.valor_custo += self.produto.preco_custo
-            self.produto.quantidade_atual -= self.quantidade
-        else:
-            old_instance = ConsumoEvento.objects.get(id=self.id)
-            if old_instance.valor_unitario != self.valor_unitario or old_instance.quantidade != self.quantidade:
-                self.evento.valor_custo -= old_instance.produto.preco_custo
-                self.produto.quantidade_atual += old_instance.quantidade
-                self.evento.valor_custo += self.produto.preco_custo
-                self.produto.quantidade_atual -= self.quantidade
-        self.evento.save()
-        self.produto.save()
-        super().save(*args, **kwargs)
+        from .custos import aplicar
+
+        with transaction.atomic():
+            custos = defaultdict(Decimal)
+            custos[self.evento_id] += self.custo
+            if self.id:
+                anterior = ConsumoEvento.objects.filter(id=self.id).values(
+                    'evento_id', 'quantidade', 'valor_unitario').first()
+                if anterior:
+                    custos[anterior['evento_id']] -= anterior['quantidade'] * anterior['valor_unitario']
+            # A baixa no estoque é registrada como uma saída no livro de movimentações
+            if self.movimentacao_id:
+                self.movimentacao.produto = self.produto
+                self.movimentacao.quantidade = self.quantidade
+                self.movimentacao.save()
+            else:
+                self.movimentacao = MovimentacaoEstoque.objects.create(
+                    produto=self.produto, tipo='S', quantidade=self.quantidade,
+                    observacoes=f"Consumo do evento {self.evento}")
+            super().save(*args, **kwargs)
+            aplicar(custos=custos)
 
 
 class EnderecoEvento(models.Model):
@@ -0,0 +1,117 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Q, Sum
+
+from estoque.models import ConversaoUnidade, Produto
+from .models import Cardapio, ItemCompraCardapio
+
+
+def _itens_periodo(inicio, fim, status):
+    return ItemCompraCardapio.objects.filter(cardapio__evento__status__in=status,
+                                             cardapio__evento__data_inicio__gte=inicio,
+                                             cardapio__evento__data_inicio__lt=fim)
+
+
+def necessidades_compra(inicio, fim, status=('CO',)):
+    # Soma os itens dos cardápios dos eventos entre `inicio` e `fim` (datetimes), multiplicados
+    # pelo número de convidados de cada evento, agrupando por item e unidade em uma consulta
+    quantidade = ExpressionWrapper(F('quantidade') * F('cardapio__evento__numero_convidados'),
+                                   output_field=DecimalField(max_digits=14, decimal_places=3))
+    return (_itens_periodo(inicio, fim, status)
+            .values('nome', 'unidade', 'produto_id')
+            .annotate(necessario=Sum(quantidade), eventos=Count('cardapio__evento', distinct=True))
+            .order_by('nome', 'unidade'))
+
+
+def lista_compras(inicio, fim, status=('CO',)):
+    # Necessidades do período descontado o que já há em estoque. Itens ligados a um produto são
+    # convertidos para a unidade do produto; os demais são comparados pelo nome (sem diferenciar
+    # maiúsculas, pelo próprio banco) e pela unidade.
+    necessidades = list(necessidades_compra(inicio, fim, status))
+    ids = {item['produto_id'] for item in necessidades if item['produto_id']}
+    produtos = {produto['id']: produto for produto in
+                Produto.objects.filter(pk__in=ids).values('id', 'nome', 'unidade_medida', 'quantidade_atual')}
+    conversoes = ConversaoUnidade.objects.tabela() if ids else {}
+
+    por_produto = {}
+    convertidas = defaultdict(set)
+    por_nome = []
+    for item in necessidades:
+        produto = produtos.get(item['produto_id'])
+        fator = produto and ConversaoUnidade.fator_entre(conversoes, item['unidade'], produto['unidade_medida'],
+                                                          produto['id'])
+        if not fator:
+            por_nome.append(item)
+            continue
+        linha = por_produto.setdefault(produto['id'], {
+            'nome': produto['nome'], 'unidade': produto['unidade_medida'], 'produto_id': produto['id'],
+            'necessario': Decimal(0), 'eventos': 0, 'em_estoque': produto['quantidade_atual'],
+        })
+        linha['necessario'] += item['necessario'] * fator
+        convertidas[produto['id']].add(item['unidade'])
+
+    if por_produto:
+        # Um evento pode pedir o mesmo produto em mais de um item: os eventos são contados por produto
+        filtro = Q()
+        for produto_id, unidades in convertidas.items():
+            filtro |= Q(produto_id=produto_id, unidade__in=unidades)
+        eventos = (_itens_periodo(inicio, fim, status).filter(filtro).values('produto_id')
+                   .annotate(eventos=Count('cardapio__evento', distinct=True)).order_by())
+        for linha in eventos:
+            por_produto[linha['produto_id']]['eventos'] = linha['eventos']
+
+    if por_nome:
+        # Uma soma filtrada por item: nome e unidade são comparados pelo banco dos dois lados
+        chaves = list({(item['nome'], item['unidade']) for item in por_nome})
+        condicoes = [Q(nome__iexact=nome, unidade_medida=unidade) for nome, unidade in chaves]
+        algum = Q()
+        for condicao in condicoes:
+            algum |= condicao
+        totais = Produto.objects.filter(algum, status='A').aggregate(**{
+            f'item_{posicao}': Sum('quantidade_atual', filter=condicao, default=Decimal(0))
+            for posicao, condicao in enumerate(condicoes)
+        })
+        estoque = {chave: totais[f'item_{posicao}'] for posicao, chave in enumerate(chaves)}
+        for item in por_nome:
+            item['em_estoque'] = estoque[item['nome'], item['unidade']]
+
+    lista = sorted([*por_produto.values(), *por_nome], key=lambda item: (item['nome'].lower(), item['unidade']))
+    for item in lista:
+        item['necessario'] = item['necessario'].quantize(Decimal('0.001'))
+        item['comprar'] = max(item['necessario'] - item['em_estoque'], Decimal(0))
+    return lista
+
+
+def custos_por_convidado(cardapios=None):
+    # Custo por convidado de cada cardápio ({cardapio_id: custo}) a partir do preço de custo dos
+    # produtos ligados aos itens, convertendo as unidades. Itens sem produto, preço ou conversão
+    # são ignorados e devolvidos em `pendentes` ({cardapio_id: [nomes]}).
+    itens = ItemCompraCardapio.objects.values_list(
+        'cardapio_id', 'nome', 'quantidade', 'unidade', 'produto_id',
+        'produto__unidade_medida', 'produto__preco_custo')
+    if cardapios is not None:
+        itens = itens.filter(cardapio__in=cardapios)
+    conversoes = ConversaoUnidade.objects.tabela()
+    custos = defaultdict(Decimal)
+    pendentes = defaultdict(list)
+    for cardapio_id, nome, quantidade, unidade, produto_id, unidade_produto, preco_custo in itens.iterator():
+        fator = produto_id and ConversaoUnidade.fator_entre(conversoes, unidade, unidade_produto, produto_id)
+        if not fator or preco_custo is None:
+            pendentes[cardapio_id].append(nome)
+            continue
+        custos[cardapio_id] += quantidade * fator * preco_custo
+    return dict(custos), dict(pendentes)
+
+
+def atualizar_custos_cardapios(cardapios=None):
+    # Recalcula Cardapio.custo_por_convidado de todos (ou dos informados) em um único lote de escrita
+    custos, pendentes = custos_por_convidado(cardapios)
+    selecionados = Cardapio.objects.all() if cardapios is None else Cardapio.objects.filter(pk__in=cardapios)
+    atualizados = []
+    for cardapio in selecionados.only('id'):
+        custo = custos.get(cardapio.id)
+        cardapio.custo_por_convidado = custo.quantize(Decimal('0.01')) if custo is not None else None
+        atualizados.append(cardapio)
+    Cardapio.objects.bulk_update(atualizados, ['custo_por_convidado'], batch_size=500)
+    return pendentes
@@ -0,0 +1,31 @@
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from estoque.models import LocalEstoque, MovimentacaoEstoque, Produto
+from .custos import aplicar
+from .models import AlocacaoFuncionario, ConsumoEvento
+
+
+# Exclusões (inclusive em lote pelo admin) estornam o custo do evento
+@receiver(post_delete, sender=AlocacaoFuncionario)
+def estornar_alocacao(sender, instance, **kwargs):
+    aplicar(custos={instance.evento_id: -instance.valor})
+
+
+@receiver(post_delete, sender=ConsumoEvento)
+def estornar_consumo(sender, instance, using, origin=None, **kwargs):
+    aplicar(custos={instance.evento_id: -instance.custo})
+    # Excluir o produto, o local ou a própria saída apaga em cascata as linhas do estoque:
+    # não há o que estornar
+    origem = origin.model if isinstance(origin, QuerySet) else type(origin)
+    if issubclass(origem, (Produto, LocalEstoque, MovimentacaoEstoque)):
+        return
+    # A saída do estoque fica no livro e é estornada por uma entrada no local de onde saiu
+    saida = MovimentacaoEstoque.objects.using(using).filter(pk=instance.movimentacao_id, tipo='S').values(
+        'produto_id', 'quantidade', 'local_origem_id').first()
+    if saida:
+        MovimentacaoEstoque.objects.using(using).create(
+            produto_id=saida['produto_id'], tipo='E', quantidade=saida['quantidade'],
+            local_destino_id=saida['local_origem_id'],
+            observacoes=f"Estorno do consumo {instance.pk} do evento {instance.evento_id}")
@@ -1,3 +1,284 @@
+import io
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Sum
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from core.models import Cliente, DadosBancariosFunc, Empresa, Funcao, Funcionario
+from core.tests import ConsultasChangelistMixin
+from estoque.models import Categoria, ConversaoUnidade, LocalEstoque, MovimentacaoEstoque, Produto, SaldoEstoque
+from financas.models import Caixa, CategoriaFinanceira, Contrato, LancamentoFinanceiro
+from .custos import recalcular, rentabilidade
+from .folha import alocacoes_a_pagar, exportar_pagamentos, fechar_folha
+from .models import AlocacaoFuncionario, Cardapio, ConsumoEvento, Evento, ItemCompraCardapio, TipoEvento
+from .planejamento import atualizar_custos_cardapios, lista_compras
+
+
+class ChangelistEventosTests(ConsultasChangelistMixin, TestCase):
+    def evento(self, numero):
+        return Evento.objects.create(
+            nome_evento=f"Evento {numero}", numero_convidados=10, valor_total=0,
+            cliente=Cliente.objects.create(nome=f"Cliente {numero}", tipo='PF', cpf_cnpj=str(numero)),
+            tipo_evento=TipoEvento.objects.create(nome=f"Tipo {numero}"))
+
+    def test_evento(self):
+        self.assertChangelistConsultas(Evento, self.evento, 6)
+
+    def test_alocacao(self):
+        def criar(numero):
+            funcao = Funcao.objects.create(nome=f"Função {numero}", valor_hora=10)
+            funcionario = Funcionario.objects.create(nome=f"Colaborador {numero}", funcao=funcao,
+                                                     data_admissao=date.today())
+            AlocacaoFuncionario.objects.create(evento=self.evento(numero), funcionario=funcionario, valor=100)
+        self.assertChangelistConsultas(AlocacaoFuncionario, criar, 5)
+
+    def test_consumo(self):
+        def criar(numero):
+            produto = Produto.objects.create(nome=f"Produto {numero}",
+                                             categoria=Categoria.objects.create(nome=f"Categoria {numero}", tipo='AL'),
+                                             quantidade_atual=1)
+            ConsumoEvento.objects.create(evento=self.evento(numero), produto=produto, quantidade=1, valor_unitario=5)
+        self.assertChangelistConsultas(ConsumoEvento, criar, 5)
+
+    def test_formulario_item_compra(self):
+        def criar(numero):
+            Produto.objects.create(nome=f"Produto {numero}",
+                                   categoria=Categoria.objects.create(nome=f"Categoria {numero}", tipo='AL'))
+        self.assertFormularioConsultas(ItemCompraCardapio, criar, 3)
+
+
+class CustosEventoTests(TestCase):
+    def setUp(self):
+        self.evento = Evento.objects.create(nome_evento="Casamento", numero_convidados=10, valor_total=0,
+                                            cliente=Cliente.objects.create(nome="Cliente", tipo='PF', cpf_cnpj="1"))
+
+    def custo(self):
+        self.evento.refresh_from_db()
+        return self.evento.valor_custo
+
+    def test_custos_e_receitas_por_deltas(self):
+        funcionario = Funcionario.objects.create(nome="Garçom", data_admissao=date.today())
+        alocacao = AlocacaoFuncionario.objects.create(evento=self.evento, funcionario=funcionario, valor=100)
+        alocacao.valor = 150
+        alocacao.save()
+        produto = Produto.objects.create(nome="Refrigerante", quantidade_atual=10, preco_custo=5)
+        consumo = ConsumoEvento.objects.create(evento=self.evento, produto=produto, quantidade=2, valor_unitario=3)
+        caixa = Caixa.objects.create(empresa=Empresa.objects.create(nome_fantasia="Buffet", cnpj="1"),
+                                     banco="Banco", agencia=1, conta=1, saldo=0)
+        receita = CategoriaFinanceira.objects.create(nome="Eventos", caixa=caixa, tipo='RE')
+        contrato = Contrato.objects.create(evento=self.evento)
+        despesa = LancamentoFinanceiro.objects.create(
+            contrato=contrato, categoria=CategoriaFinanceira.objects.create(nome="Compras", caixa=caixa, tipo='DE'),
+            valor=40)
+        LancamentoFinanceiro.objects.create(contrato=contrato, categoria=receita, valor=1000)
+        LancamentoFinanceiro.objects.create(categoria=receita, valor=1)
+        self.assertEqual(self.custo(), 196)
+        self.assertEqual(self.evento.valor_total, 1000)
+
+        despesa.status = 'CA'
+        despesa.save()
+        consumo.delete()
+        self.assertEqual(self.custo(), 150)
+        alocacao.delete()
+        self.assertEqual(self.custo(), 0)
+        AlocacaoFuncionario.objects.create(evento=self.evento, funcionario=funcionario, valor=7)
+        Evento.objects.filter(pk=self.evento.pk).update(valor_custo=999)
+        recalcular()
+        self.assertEqual(self.custo(), 7)
+
+    def test_exclusao_do_consumo_devolve_o_estoque(self):
+        local = LocalEstoque.objects.create(nome="Depósito")
+        produto = Produto.objects.create(nome="Refrigerante", quantidade_atual=10, localizacao=local)
+        consumo = ConsumoEvento.objects.create(evento=self.evento, produto=produto, quantidade=4, valor_unitario=3)
+        produto.refresh_from_db()
+        self.assertEqual(produto.quantidade_atual, 6)
+        consumo.delete()
+        produto.refresh_from_db()
+        self.assertEqual(produto.quantidade_atual, 10)
+        self.assertEqual(SaldoEstoque.objects.get(produto=produto, local=local).quantidade, 10)
+        self.assertEqual(list(MovimentacaoEstoque.objects.order_by('pk').values_list('tipo', flat=True)),
+                         ['I', 'S', 'E'])
+
+    def test_consumo_sem_saldo_vira_erro_do_formulario(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@exemplo.com', 'senha'))
+        produto = Produto.objects.create(nome="Refrigerante", quantidade_atual=2)
+        dados = {'evento': self.evento.pk, 'produto': produto.pk, 'quantidade': '3', 'valor_unitario': '1'}
+        resposta = self.client.post(reverse('admin:eventos_consumoevento_add'), dados)
+        self.assertContains(resposta, "Quantidade insuficiente em estoque. Disponível: 2")
+        consumo = ConsumoEvento.objects.create(evento=self.evento, produto=produto, quantidade=2, valor_unitario=1)
+        url = reverse('admin:eventos_consumoevento_change', args=[consumo.pk])
+        self.assertContains(self.client.post(url, dados), "Disponível: 0")
+        self.assertEqual(self.client.post(url, {**dados, 'quantidade': '1'}).status_code, 302)
+        produto.refresh_from_db()
+        self.assertEqual(produto.quantidade_atual, 1)
+
+    def test_exclusao_do_produto_com_consumos(self):
+        local = LocalEstoque.objects.create(nome="Depósito")
+        for modelo in (Produto, LocalEstoque):
+            produto = Produto.objects.create(nome="Refrigerante", quantidade_atual=10, localizacao=local)
+            ConsumoEvento.objects.create(evento=self.evento, produto=produto, quantidade=4, valor_unitario=3)
+            (produto if modelo is Produto else local).delete()
+            # As chaves estrangeiras só são conferidas no commit
+            connection.check_constraints()
+            self.assertFalse(MovimentacaoEstoque.objects.exists())
+            self.assertEqual(self.custo(), 0)
+
+
+class RentabilidadeTests(ConsultasChangelistMixin, TestCase):
+    def test_rentabilidade_em_uma_consulta(self):
+        cliente = Cliente.objects.create(nome="Cliente", tipo='PF', cpf_cnpj="1")
+        tipo = TipoEvento.objects.create(nome="Casamento")
+        evento = Evento.objects.create(cliente=cliente, tipo_evento=tipo, nome_evento="Casamento", numero_convidados=10,
+                                       valor_total=0, data_inicio=timezone.now())
+        vazio = Evento.objects.create(cliente=cliente, nome_evento="Sem lançamentos", numero_convidados=10,
+                                      valor_total=0)
+        funcionario = Funcionario.objects.create(nome="Garçom", data_admissao=date.today())
+        AlocacaoFuncionario.objects.create(evento=evento, funcionario=funcionario, valor=100)
+        AlocacaoFuncionario.objects.create(evento=evento, funcionario=funcionario, valor=50)
+        produto = Produto.objects.create(nome="Refrigerante", quantidade_atual=10, preco_custo=5)
+        ConsumoEvento.objects.create(evento=evento, produto=produto, quantidade=2, valor_unitario=3)
+        caixa = Caixa.objects.create(empresa=Empresa.objects.create(nome_fantasia="Buffet", cnpj="1"),
+                                     banco="Banco", agencia=1, conta=1, saldo=0)
+        despesa = CategoriaFinanceira.objects.create(nome="Compras", caixa=caixa, tipo='DE')
+        receita = CategoriaFinanceira.objects.create(nome="Eventos", caixa=caixa, tipo='RE')
+        contrato = Contrato.objects.create(evento=evento)
+        LancamentoFinanceiro.objects.create(contrato=contrato, categoria=despesa, valor=40)
+        LancamentoFinanceiro.objects.create(contrato=contrato, categoria=receita, valor=1000)
+        LancamentoFinanceiro.objects.create(contrato=contrato, categoria=receita, valor=1000, status='CA')
+        # Os totais gravados no evento não entram no relatório
+        Evento.objects.filter(pk=evento.pk).update(valor_total=1, valor_custo=1)
+
+        with self.assertNumQueries(1):
+            linhas = {linha.pk: linha for linha in rentabilidade()}
+        self.assertEqual((linhas[evento.pk].receita, linhas[evento.pk].custo, linhas[evento.pk].lucro),
+                         (1000, 196, Decimal('804')))
+        self.assertIsNone(linhas[vazio.pk].margem)
+        self.assertEqual([linha.pk for linha in rentabilidade(tipos=[tipo], inicio=timezone.now() - timedelta(days=1))],
+                         [evento.pk])
+        call_command('rentabilidade_eventos', '--inicio', '2020-01-01', stdout=io.StringIO())
+
+    def test_so_a_listagem_calcula_a_rentabilidade(self):
+        evento = Evento.objects.create(nome_evento="Casamento", numero_convidados=10, valor_total=0,
+                                       cliente=Cliente.objects.create(nome="Cliente", tipo='PF', cpf_cnpj="1"))
+        self.assertEqual(self.client.get(reverse('admin:eventos_evento_changelist'), {'o': '9'}).status_code, 200)
+        for url, parametros in ((reverse('admin:eventos_evento_change', args=[evento.pk]), {}),
+                                (reverse('admin:autocomplete'), {'term': 'casa', 'app_label': 'eventos',
+                                                                 'model_name': 'alocacaofuncionario',
+                                                                 'field_name': 'evento'})):
+            with CaptureQueriesContext(connection) as consultas:
+                self.assertEqual(self.client.get(url, parametros).status_code, 200)
+            self.assertFalse([consulta for consulta in consultas if '"lucro"' in consulta['sql']])
+
+
+class CustosCardapioTests(TestCase):
+    def test_custo_por_convidado_convertendo_unidades(self):
+        arroz = Produto.objects.create(nome="Arroz", unidade_medida='KG', preco_custo=5)
+        ovos = Produto.objects.create(nome="Ovos", unidade_medida='CX', preco_custo=30)
+        # Sem a conversão direta DZ -> CX, o fator passa pela unidade: DZ -> UN (geral) -> CX (do produto)
+        ConversaoUnidade.objects.create(produto=ovos, unidade_origem='CX', unidade_destino='UN', fator=30)
+        festa = Cardapio.objects.create(nome="Festa", descricao="")
+        vazio = Cardapio.objects.create(nome="Vazio", descricao="")
+        ItemCompraCardapio.objects.create(cardapio=festa, nome="Arroz", produto=arroz, unidade='GR', quantidade='200')
+        ItemCompraCardapio.objects.create(cardapio=festa, nome="Ovo", produto=ovos, unidade='DZ', quantidade='0.5')
+        ItemCompraCardapio.objects.create(cardapio=festa, nome="Sal", unidade='GR', quantidade='1')
+
+        self.assertEqual(atualizar_custos_cardapios(), {festa.pk: ["Sal"]})
+        festa.refresh_from_db()
+        vazio.refresh_from_db()
+        self.assertEqual((festa.custo_por_convidado, vazio.custo_por_convidado), (Decimal('7.00'), None))
+
+        Evento.objects.create(cliente=Cliente.objects.create(nome="Cliente", tipo='PF', cpf_cnpj="1"),
+                              nome_evento="Festa", numero_convidados=100, valor_total=0, cardapio=festa,
+                              status='CO', data_inicio=timezone.now() + timedelta(days=1))
+        lista = {item['nome']: item['necessario']
+                 for item in lista_compras(timezone.now(), timezone.now() + timedelta(days=3))}
+        self.assertEqual(lista, {"Arroz": 20, "Ovos": 20, "Sal": 100})
+
+
+class FolhaTests(TestCase):
+    def test_folha_agrupa_alocacoes_por_colaborador(self):
+        empresa = Empresa.objects.create(nome_fantasia="Buffet", cnpj="1")
+        caixa = Caixa.objects.create(empresa=empresa, banco="Banco", agencia=1, conta=1, saldo=1000)
+        folha_categoria = CategoriaFinanceira.objects.create(nome="Folha", caixa=caixa, tipo='DE')
+        cliente = Cliente.objects.create(nome="Cliente", tipo='PF', cpf_cnpj="1")
+        agora = timezone.now()
+        eventos = [Evento.objects.create(cliente=cliente, nome_evento=f"Evento {numero}", numero_convidados=1,
+                                         valor_total=0, data_inicio=agora) for numero in range(3)]
+        garcom = Funcionario.objects.create(nome="Garçom", cpf="1", data_admissao=date.today())
+        cozinheira = Funcionario.objects.create(nome="Cozinheira", cpf="2", data_admissao=date.today())
+        DadosBancariosFunc.objects.create(nome_banco="Banco", nr_bco="001", agencia=1, conta=2, pix="chave",
+                                          funcionario=garcom)
+        for evento in eventos:
+            for funcionario in (garcom, cozinheira):
+                AlocacaoFuncionario.objects.create(evento=evento, funcionario=funcionario, valor=10)
+        custo = Evento.objects.aggregate(total=Sum('valor_custo'))['total']
+
+        folha = fechar_folha(alocacoes_a_pagar(agora - timedelta(days=1), agora + timedelta(days=1)),
+                             folha_categoria, date(2026, 1, 1))
+        self.assertEqual(sorted((linha['nome'], linha['total']) for linha in folha),
+                         [("Cozinheira", 30), ("Garçom", 30)])
+        # O custo já estava nos eventos pelas alocações
+        self.assertEqual(Evento.objects.aggregate(total=Sum('valor_custo'))['total'], custo)
+        caixa.refresh_from_db()
+        self.assertEqual(caixa.saldo, 940)
+        alocacao = AlocacaoFuncionario.objects.filter(funcionario=garcom).first()
+        self.assertEqual((alocacao.pago, alocacao.lancamento.valor, alocacao.lancamento.status), (True, 30, 'PA'))
+
+        arquivo = io.StringIO()
+        self.assertEqual(exportar_pagamentos(folha, arquivo), ["Cozinheira"])
+        self.assertIn(f"Garçom;1;30.00;chave;001;1;2;{alocacao.lancamento_id}", arquivo.getvalue())
+        self.assertEqual(fechar_folha(AlocacaoFuncionario.objects.all(), folha_categoria), [])
+        with self.assertRaises(ValueError):
+            fechar_folha(AlocacaoFuncionario.objects.all(),
+                         CategoriaFinanceira.objects.create(nome="Eventos", caixa=caixa, tipo='RE'))
+
+
+class ListaComprasTests(TestCase):
+    def setUp(self):
+        self.cliente = Cliente.objects.create(nome="Cliente", tipo='PF', cpf_cnpj="1")
+        self.data = timezone.now() + timedelta(days=1)
+
+    def evento(self, cardapio, convidados, status='CO'):
+        return Evento.objects.create(cliente=self.cliente, nome_evento="Festa", numero_convidados=convidados,
+                                     valor_total=0, cardapio=cardapio, status=status, data_inicio=self.data)
+
+    def lista(self):
+        return {item['nome']: item for item in lista_compras(timezone.now(), timezone.now() + timedelta(days=3))}
+
+    def test_itens_sem_produto_comparados_pelo_nome(self):
+        cardapio = Cardapio.objects.create(nome="Festa", descricao="")
+        ItemCompraCardapio.objects.create(cardapio=cardapio, nome="Arroz", unidade='KG', quantidade='0.2')
+        ItemCompraCardapio.objects.create(cardapio=cardapio, nome="AÇÚCAR", unidade='KG', quantidade='0.1')
+        ItemCompraCardapio.objects.create(cardapio=cardapio, nome="Refrigerante", unidade='LT', quantidade='1')
+        self.evento(cardapio, 100)
+        self.evento(cardapio, 50)
+        self.evento(cardapio, 999, status='PE')
+        Produto.objects.create(nome="arroz", unidade_medida='KG', quantidade_atual=10)
+        Produto.objects.create(nome="AÇÚCAR", unidade_medida='KG', quantidade_atual=4)
+
+        lista = self.lista()
+        self.assertEqual((lista["Arroz"]['necessario'], lista["Arroz"]['em_estoque'], lista["Arroz"]['comprar']),
+                         (30, 10, 20))
+        self.assertEqual((lista["AÇÚCAR"]['em_estoque'], lista["AÇÚCAR"]['comprar']), (4, 11))
+        self.assertEqual((lista["Refrigerante"]['comprar'], lista["Refrigerante"]['eventos']), (150, 2))
+        call_command('lista_compras', str(timezone.localdate()), str(timezone.localdate() + timedelta(days=3)),
+                     stdout=io.StringIO())
 
-# Create your tests here.
+    def test_eventos_contados_por_produto(self):
+        arroz = Produto.objects.create(nome="Arroz 5kg", unidade_medida='KG', quantidade_atual=0)
+        almoco = Cardapio.objects.create(nome="Almoço", descricao="")
+        jantar = Cardapio.objects.create(nome="Jantar", descricao="")
+        ItemCompraCardapio.objects.create(cardapio=almoco, nome="Arroz", produto=arroz, unidade='KG', quantidade='0.1')
+        ItemCompraCardapio.objects.create(cardapio=jantar, nome="Arroz branco", produto=arroz, unidade='KG',
+                                          quantidade='0.2')
+        self.evento(almoco, 10)
+        self.evento(jantar, 10)
+        linha = self.lista()["Arroz 5kg"]
+        self.assertEqual((linha['necessario'], linha['eventos']), (3, 2))
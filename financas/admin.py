@@ -1,15 +1,30 @@
-from django.contrib import admin
-from .models import (Caixa, CategoriaFinanceira,
-                     LancamentoFinanceiro, Contrato)
+from django.contrib import admin, messages
+from django.core.exceptions import PermissionDenied
+from django.template.response import TemplateResponse
+from django.utils import timezone
+from core.cache import ReferenciasEmCacheMixin
+from core.paginacao import PaginacaoCursorMixin
+from .models import (AgendamentoFinanceiro, Caixa, CategoriaFinanceira,
+                     LancamentoFinanceiro, Contrato, MovimentoCaixa,
+                     ResumoFinanceiroMensal, SaldoReceberCliente, TransacaoBancaria)
+from .conciliacao import conciliar
 
 
 class CaixaAdmin(admin.ModelAdmin):
     list_display = ('banco', 'empresa', 'agencia',
                     'conta', 'saldo')
+    list_select_related = ('empresa',)
+
+    def get_readonly_fields(self, request, obj=None):
+        # Depois da abertura o saldo só muda pelos movimentos do diário
+        if obj:
+            return ('saldo',)
+        return ()
 
 
 class CategoriaFinanceiraAdmin(admin.ModelAdmin):
     list_display = ('nome', 'tipo', 'caixa', 'esta_ativo')
+    list_select_related = ('caixa__empresa',)
 
     def esta_ativo(self, obj):
         if obj.ativo:
@@ -21,6 +36,14 @@ class ContratoAdmin(admin.ModelAdmin):
     readonly_fields = ('criado_em', 'atualizado_em')
     list_display = ('evento', 'tem_arquivo', 'status',
                     'data_criacao', 'ultima_atualizacao')
+    list_select_related = ('evento',)
+    search_fields = ('evento__nome_evento', 'responsavel')
+    autocomplete_fields = ('evento',)
+    ordering = ('-id',)
+
+    def get_queryset(self, request):
+        # Contratos no autocomplete dos lançamentos aparecem com o nome do evento
+        return super().get_queryset(request).select_related(*self.list_select_related)
 
     def tem_arquivo(self, obj):
         if obj.arquivo:
@@ -35,14 +58,151 @@ class ContratoAdmin(admin.ModelAdmin):
         return obj.atualizado_em.strftime('%d/%m/%Y')
 
 
-class LancamentoFinanceiroAdmin(admin.ModelAdmin):
+class LancamentoFinanceiroAdmin(PaginacaoCursorMixin, ReferenciasEmCacheMixin, admin.ModelAdmin):
     readonly_fields = ('criado_em', 'atualizado_em')
     list_display = ('valor', 'categoria', 'contrato',
                     'status', 'data_vencimento', 'data_pagamento')
+    list_select_related = ('categoria__caixa__empresa', 'contrato__evento')
+    autocomplete_fields = ('contrato',)
+    list_filter = ('status', 'data_vencimento', 'categoria__tipo')
+    search_fields = ('observacoes', 'categoria__nome')
+    actions = ['liquidar']
+
+    @admin.action(description='Marcar lançamentos pendentes selecionados como pagos hoje')
+    def liquidar(self, request, queryset):
+        liquidados = queryset.liquidar()
+        ignorados = queryset.count() - liquidados
+        self.message_user(request, f"{liquidados} lançamentos marcados como pagos.")
+        if ignorados:
+            self.message_user(request, f"{ignorados} lançamentos ignorados por não estarem pendentes.",
+                              messages.WARNING)
+
+
+class MovimentoCaixaAdmin(admin.ModelAdmin):
+    list_display = ('criado_em', 'caixa', 'valor', 'categoria', 'historico')
+    list_filter = ('caixa',)
+    list_select_related = ('caixa__empresa', 'categoria')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+class ResumoFinanceiroMensalAdmin(admin.ModelAdmin):
+    list_display = ('mes', 'categoria', 'status', 'quantidade', 'total')
+    list_filter = ('competencia', 'status', 'categoria__tipo', 'categoria__caixa')
+    list_select_related = ('categoria',)
+
+    def mes(self, obj):
+        return obj.competencia.strftime('%m/%Y')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+class SaldoReceberClienteAdmin(admin.ModelAdmin):
+    # A listagem mostra o aging por cliente em vez das linhas da tabela
+    FAIXAS = ('a_vencer', 'dias_1_30', 'dias_31_60', 'dias_61_90', 'acima_90', 'em_aberto')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
 
+    def has_delete_permission(self, request, obj=None):
+        return False
 
+    def changelist_view(self, request, extra_context=None):
+        if not self.has_view_or_change_permission(request):
+            raise PermissionDenied
+        hoje = timezone.localdate()
+        linhas = list(SaldoReceberCliente.objects.aging(hoje))
+        totais = {faixa: sum(linha[faixa] for linha in linhas) for faixa in self.FAIXAS}
+        contexto = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Contas a receber por cliente',
+            'hoje': hoje,
+            'linhas': linhas,
+            'totais': totais,
+            **(extra_context or {}),
+        }
+        return TemplateResponse(request, 'admin/financas/aging.html', contexto)
+
+
+class TransacaoBancariaAdmin(admin.ModelAdmin):
+    list_display = ('data', 'caixa', 'valor', 'descricao', 'referencia', 'status', 'lancamento')
+    list_filter = ('status', 'caixa')
+    list_select_related = ('caixa__empresa', 'lancamento__categoria')
+    readonly_fields = ('caixa', 'identificador', 'data', 'valor', 'descricao', 'referencia', 'importado_em')
+    raw_id_fields = ('lancamento',)
+    actions = ['conciliar', 'ignorar']
+
+    def save_model(self, request, obj, form, change):
+        # Conciliação manual: o lançamento escolhido (validado em TransacaoBancaria.clean) é
+        # liquidado na data da transação, que só é conciliada se a liquidação aconteceu
+        if obj.lancamento_id and obj.status == 'PE':
+            liquidados = LancamentoFinanceiro.objects.filter(
+                pk=obj.lancamento_id, categoria__caixa=obj.caixa_id).liquidar(obj.data)
+            if liquidados:
+                obj.status = 'CO'
+            else:
+                obj.lancamento = None
+                self.message_user(request, "A transação não foi conciliada: o lançamento deixou de estar "
+                                           "pendente antes de ser liquidado.", messages.ERROR)
+        super().save_model(request, obj, form, change)
+
+    @admin.action(description='Conciliar automaticamente os caixas das transações selecionadas')
+    def conciliar(self, request, queryset):
+        for caixa in Caixa.objects.filter(transacoes__in=queryset).distinct():
+            conciliadas, pendentes = conciliar(caixa)
+            self.message_user(request, f"{caixa}: {conciliadas} conciliadas, {pendentes} pendentes.")
+
+    @admin.action(description='Ignorar transações selecionadas')
+    def ignorar(self, request, queryset):
+        ignoradas = queryset.filter(status='PE').update(status='IG')
+        self.message_user(request, f"{ignoradas} transações ignoradas.", messages.SUCCESS)
+
+
+class AgendamentoFinanceiroAdmin(ReferenciasEmCacheMixin, admin.ModelAdmin):
+    readonly_fields = ('parcelas_geradas', 'criado_em', 'atualizado_em')
+    list_display = ('descricao', 'modalidade', 'categoria', 'contrato', 'valor',
+                    'data_inicio', 'numero_parcelas', 'parcelas_geradas', 'esta_ativo')
+    list_filter = ('modalidade', 'ativo')
+    list_select_related = ('categoria', 'contrato__evento')
+    autocomplete_fields = ('contrato',)
+    actions = ['gerar_proximos']
+
+    @admin.action(description='Completar 12 lançamentos a vencer')
+    def gerar_proximos(self, request, queryset):
+        lancamentos = queryset.gerar(12)
+        self.message_user(request, f"{len(lancamentos)} lançamentos gerados.")
+
+    def esta_ativo(self, obj):
+        if obj.ativo:
+            return "Sim"
+        else:
+            return "Não"
+
+
+admin.site.register(AgendamentoFinanceiro, AgendamentoFinanceiroAdmin)
 admin.site.register(Caixa, CaixaAdmin)
 admin.site.register(CategoriaFinanceira, CategoriaFinanceiraAdmin)
 admin.site.register(Contrato, ContratoAdmin)
 admin.site.register(LancamentoFinanceiro, LancamentoFinanceiroAdmin)
-
+admin.site.register(MovimentoCaixa, MovimentoCaixaAdmin)
+admin.site.register(ResumoFinanceiroMensal, ResumoFinanceiroMensalAdmin)
+admin.site.register(TransacaoBancaria, TransacaoBancariaAdmin)
+admin.site.register(SaldoReceberCliente, SaldoReceberClienteAdmin)
@@ -0,0 +1,171 @@
+import csv
+import hashlib
+import re
+from bisect import bisect_left, bisect_right
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.db import transaction
+
+from .models import LancamentoFinanceiro, TransacaoBancaria
+
+TAG_OFX = re.compile(r'<(/?)([A-Za-z0-9.]+)>([^<]*)')
+
+
+def _data(texto, formatos):
+    for formato in formatos:
+        try:
+            return datetime.strptime(texto, formato).date()
+        except ValueError:
+            pass
+    raise ValueError(f"Data inválida: {texto!r}")
+
+
+def _valor(texto):
+    texto = texto.strip().replace(' ', '')
+    if ',' in texto:
+        texto = texto.replace('.', '').replace(',', '.')
+    try:
+        return Decimal(texto)
+    except InvalidOperation:
+        raise ValueError(f"Valor inválido: {texto!r}")
+
+
+def _transacao_ofx(campos):
+    try:
+        return {
+            'identificador': campos['FITID'],
+            'data': _data(campos['DTPOSTED'][:8], ['%Y%m%d']),
+            'valor': _valor(campos['TRNAMT']),
+            'descricao': (campos.get('MEMO') or campos.get('NAME') or '')[:255],
+            'referencia': (campos.get('CHECKNUM') or campos.get('REFNUM') or '')[:100],
+        }
+    except KeyError as erro:
+        raise ValueError(f"Transação do OFX sem o campo {erro.args[0]}.")
+
+
+def ler_ofx(arquivo):
+    # Lê as transações (<STMTTRN>) linha a linha, tanto no formato SGML quanto no XML
+    campos = None
+    for linha in arquivo:
+        for fechamento, tag, valor in TAG_OFX.findall(linha):
+            tag = tag.upper()
+            if tag == 'STMTTRN':
+                if fechamento and campos is not None:
+                    yield _transacao_ofx(campos)
+                campos = None if fechamento else {}
+            elif campos is not None and not fechamento and valor.strip():
+                campos[tag] = valor.strip()
+
+
+def ler_csv(arquivo):
+    # Colunas esperadas: data, valor (negativo para saídas), descricao e, opcionalmente,
+    # identificador e referencia. Sem identificador, ele é gerado a partir da própria linha.
+    repetidas = Counter()
+    for numero, linha in enumerate(csv.DictReader(arquivo), start=2):
+        try:
+            data = _data(linha['data'].strip(), ['%Y-%m-%d', '%d/%m/%Y'])
+            valor = _valor(linha['valor'])
+        except (KeyError, AttributeError, ValueError):
+            raise ValueError(f"Linha {numero}: informe 'data' e 'valor' válidos.")
+        descricao = (linha.get('descricao') or '').strip()
+        identificador = (linha.get('identificador') or '').strip()
+        if not identificador:
+            chave = f"{data.isoformat()}|{valor}|{descricao}"
+            repetidas[chave] += 1
+            identificador = hashlib.sha1(f"{chave}|{repetidas[chave]}".encode()).hexdigest()
+        yield {'identificador': identificador, 'data': data, 'valor': valor, 'descricao': descricao[:255],
+               'referencia': (linha.get('referencia') or '').strip()[:100]}
+
+
+def importar_extrato(caixa, transacoes, tamanho_lote=1000):
+    # Grava as transações em blocos e devolve quantas eram novas; as que já foram importadas
+    # antes (ou se repetem no arquivo) são ignoradas
+    transacoes = iter(transacoes)
+    total = 0
+    with transaction.atomic():
+        while lote := list(islice(transacoes, tamanho_lote)):
+            existentes = set(TransacaoBancaria.objects.filter(
+                caixa=caixa, identificador__in=[campos['identificador'] for campos in lote]
+            ).values_list('identificador', flat=True))
+            novas = []
+            for campos in lote:
+                if campos['identificador'] not in existentes:
+                    existentes.add(campos['identificador'])
+                    novas.append(TransacaoBancaria(caixa=caixa, **campos))
+            TransacaoBancaria.objects.bulk_create(novas, ignore_conflicts=True)
+            total += len(novas)
+    return total
+
+
+def _escolher(candidatos, referencias, usados, transacao, janela):
+    # candidatos: (datas, linhas) com as linhas (data_vencimento, id) ainda livres, ordenadas por
+    # data e todas com o mesmo valor; referencias: {id ou palavra das observações: [ids]}
+    if transacao.referencia:
+        pela_referencia = [lancamento_id for lancamento_id in referencias.get(transacao.referencia, ())
+                           if lancamento_id not in usados]
+        if len(pela_referencia) == 1:
+            return pela_referencia[0]
+    datas, linhas = candidatos
+    inicio = bisect_left(datas, transacao.data - janela)
+    fim = bisect_right(datas, transacao.data + janela)
+    if fim - inicio == 1:
+        return linhas[inicio][1]
+    return None
+
+
+def conciliar(caixa, janela_dias=3):
+    # Casa as transações pendentes do caixa com lançamentos pendentes de mesmo valor (receitas
+    # positivas, despesas negativas) pela referência ou, na falta dela, por ser o único candidato
+    # com vencimento a até `janela_dias` da data da transação. Os casamentos são liquidados em
+    # lote na data da transação; as transações sem casamento seguro continuam pendentes.
+    janela = timedelta(days=janela_dias)
+    with transaction.atomic():
+        transacoes = list(TransacaoBancaria.objects.select_for_update()
+                          .filter(caixa=caixa, status='PE').order_by('data', 'id'))
+        if not transacoes:
+            return 0, 0
+        lancamentos = (LancamentoFinanceiro.objects
+                       .filter(categoria__caixa=caixa, status='PE', data_vencimento__isnull=False,
+                               data_vencimento__gte=transacoes[0].data - janela,
+                               data_vencimento__lte=transacoes[-1].data + janela)
+                       .values_list('id', 'valor', 'categoria__tipo', 'data_vencimento', 'observacoes'))
+        # Índice montado uma vez por valor; os lançamentos casados saem dele
+        indice = defaultdict(lambda: ([], []))
+        referencias = defaultdict(lambda: defaultdict(list))
+        vencimentos = {}
+        for lancamento_id, valor, tipo, vencimento, observacoes in lancamentos.iterator():
+            chave = valor if tipo == 'RE' else -valor
+            indice[chave][1].append((vencimento, lancamento_id))
+            vencimentos[lancamento_id] = vencimento
+            for palavra in {str(lancamento_id), *(observacoes or '').split()}:
+                referencias[chave][palavra].append(lancamento_id)
+        for datas, linhas in indice.values():
+            linhas.sort()
+            datas.extend(vencimento for vencimento, lancamento_id in linhas)
+
+        usados = set()
+        por_data = defaultdict(list)
+        conciliadas = []
+        for transacao in transacoes:
+            if transacao.valor not in indice:
+                continue
+            datas, linhas = candidatos = indice[transacao.valor]
+            lancamento_id = _escolher(candidatos, referencias[transacao.valor], usados, transacao, janela)
+            if lancamento_id is None:
+                continue
+            usados.add(lancamento_id)
+            posicao = bisect_left(linhas, (vencimentos[lancamento_id], lancamento_id))
+            del datas[posicao]
+            del linhas[posicao]
+            por_data[transacao.data].append(lancamento_id)
+            transacao.lancamento_id = lancamento_id
+            transacao.status = 'CO'
+            conciliadas.append(transacao)
+
+        for data, ids in por_data.items():
+            LancamentoFinanceiro.objects.filter(pk__in=ids).liquidar(data)
+        TransacaoBancaria.objects.bulk_update(conciliadas, ['lancamento', 'status'], batch_size=500)
+    return len(conciliadas), len(transacoes) - len(conciliadas)
@@ -0,0 +1,27 @@
+import csv
+
+from django.core.management.base import BaseCommand
+
+from financas.projecao import PERIODOS, projetar_fluxo
+
+
+class Command(BaseCommand):
+    help = ('Projeta o saldo de cada caixa para os próximos meses a partir do saldo atual e dos '
+            'lançamentos pendentes, agrupados por dia ou semana de vencimento.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--meses', type=int, default=3, help='Horizonte da projeção em meses (padrão: 3).')
+        parser.add_argument('--periodo', choices=list(PERIODOS), default='dia',
+                            help='Agrupamento dos vencimentos (padrão: dia).')
+        parser.add_argument('--caixa', type=int, action='append', dest='caixas',
+                            help='Limita a projeção ao caixa informado (pode ser repetido).')
+
+    def handle(self, *args, **options):
+        projecao = projetar_fluxo(options['meses'], options['periodo'], options['caixas'])
+        escritor = csv.writer(self.stdout)
+        escritor.writerow(['caixa', 'periodo', 'receitas', 'despesas', 'saldo'])
+        for caixa, linhas in projecao.items():
+            escritor.writerow([caixa, 'atual', '', '', caixa.saldo])
+            for linha in linhas:
+                escritor.writerow([caixa, linha['periodo'].isoformat(), linha['receitas'],
+                                   linha['despesas'], linha['saldo']])
@@ -0,0 +1,35 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from financas.models import AgendamentoFinanceiro
+
+
+class Command(BaseCommand):
+    help = ('Gera em lote os lançamentos que faltam nos agendamentos ativos (recorrências e '
+            'parcelamentos) para cobrir o horizonte pedido. Pensado para rodar periodicamente '
+            '(cron/scheduler): uma execução repetida não gera nada.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--quantidade', type=int,
+                            help='Lançamentos pendentes a vencer que cada agendamento deve ter '
+                                 '(padrão: 12 quando --ate não é informado).')
+        parser.add_argument('--ate', help='Gera os lançamentos que vencem até este dia (AAAA-MM-DD).')
+        parser.add_argument('--agendamento', type=int, action='append', dest='agendamentos',
+                            help='Limita a geração ao agendamento informado (pode ser repetido).')
+
+    def handle(self, *args, **options):
+        ate = None
+        if options['ate']:
+            try:
+                ate = datetime.strptime(options['ate'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError("Data inválida, use o formato AAAA-MM-DD.")
+        quantidade = options['quantidade']
+        if quantidade is None and ate is None:
+            quantidade = 12
+        agendamentos = AgendamentoFinanceiro.objects.all()
+        if options['agendamentos']:
+            agendamentos = agendamentos.filter(pk__in=options['agendamentos'])
+        lancamentos = agendamentos.gerar(quantidade, ate)
+        self.stdout.write(self.style.SUCCESS(f"{len(lancamentos)} lançamentos gerados."))
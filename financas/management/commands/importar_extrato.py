@@ -0,0 +1,43 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from financas.conciliacao import conciliar, importar_extrato, ler_csv, ler_ofx
+from financas.models import Caixa
+
+
+class Command(BaseCommand):
+    help = ('Importa um extrato bancário (OFX ou CSV) para um caixa e concilia as transações com os '
+            'lançamentos pendentes, liquidando os casamentos seguros.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('caixa', type=int, help='Id do caixa ao qual o extrato pertence.')
+        parser.add_argument('arquivo', help='Caminho do arquivo .ofx ou .csv.')
+        parser.add_argument('--formato', choices=['ofx', 'csv'],
+                            help='Formato do arquivo (padrão: pela extensão).')
+        parser.add_argument('--janela', type=int, default=3,
+                            help='Dias de tolerância entre vencimento e data da transação (padrão: 3).')
+        parser.add_argument('--sem-conciliar', action='store_true', help='Apenas importa as transações.')
+
+    def handle(self, *args, **options):
+        try:
+            caixa = Caixa.objects.get(pk=options['caixa'])
+        except Caixa.DoesNotExist:
+            raise CommandError(f"Caixa {options['caixa']} não encontrado.")
+        caminho = Path(options['arquivo'])
+        formato = options['formato'] or caminho.suffix.lower().lstrip('.')
+        if formato not in ('ofx', 'csv'):
+            raise CommandError("Informe --formato ofx ou csv.")
+        leitor = ler_ofx if formato == 'ofx' else ler_csv
+        # OFX antigos costumam vir em latin-1
+        codificacao = 'latin-1' if formato == 'ofx' else 'utf-8-sig'
+        try:
+            with caminho.open(encoding=codificacao, newline='') as arquivo:
+                total = importar_extrato(caixa, leitor(arquivo))
+        except (OSError, ValueError) as erro:
+            raise CommandError(str(erro))
+        self.stdout.write(f"{total} transações novas importadas.")
+        if not options['sem_conciliar']:
+            conciliadas, pendentes = conciliar(caixa, options['janela'])
+            self.stdout.write(self.style.SUCCESS(
+                f"{conciliadas} transações conciliadas e {pendentes} pendentes de conciliação manual."))
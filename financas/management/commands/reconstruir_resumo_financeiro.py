@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from financas.models import ResumoFinanceiroMensal, SaldoReceberCliente
+
+
+class Command(BaseCommand):
+    help = ('Recalcula os resumos financeiros mensais e os saldos a receber por cliente a partir de '
+            'todos os lançamentos. Use após cargas de dados ou correções feitas direto no banco.')
+
+    def handle(self, *args, **options):
+        resumos = ResumoFinanceiroMensal.objects.reconstruir()
+        saldos = SaldoReceberCliente.objects.reconstruir()
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(resumos)} resumos mensais e {len(saldos)} saldos a receber gravados."))
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.2 on 2026-10-18 17:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def abrir_diario(apps, schema_editor):
+    # O saldo atual de cada caixa vira o movimento de abertura do diário
+    Caixa = apps.get_model('financas', 'Caixa')
+    MovimentoCaixa = apps.get_model('financas', 'MovimentoCaixa')
+    MovimentoCaixa.objects.bulk_create(
+        (MovimentoCaixa(caixa_id=caixa_id, valor=saldo, historico="Saldo de abertura")
+         for caixa_id, saldo in Caixa.objects.exclude(saldo=0).values_list('id', 'saldo').iterator(chunk_size=2000)),
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('financas', '0002_remove_categoriafinanceira_arquivo_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MovimentoCaixa',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('valor', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('historico', models.CharField(max_length=255, verbose_name='Histórico')),
+                ('criado_em', models.DateTimeField(auto_now_add=True)),
+                ('caixa', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='movimentos', to='financas.caixa', verbose_name='Caixa')),
+                ('categoria', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, to='financas.categoriafinanceira', verbose_name='Contrapartida')),
+                ('lancamento', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='movimentos', to='financas.lancamentofinanceiro', verbose_name='Lançamento')),
+            ],
+            options={
+                'verbose_name': 'Movimento de Caixa',
+                'verbose_name_plural': 'Movimentos de Caixa',
+                'ordering': ['-criado_em', '-id'],
+                'indexes': [models.Index(fields=['caixa', 'criado_em'], name='movimento_caixa_data_idx')],
+            },
+        ),
+        migrations.RunPython(abrir_diario, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.2 on 2026-10-18 17:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('financas', '0003_movimentocaixa'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='lancamentofinanceiro',
+            index=models.Index(fields=['status', 'data_vencimento'], name='lancamento_status_venc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lancamentofinanceiro',
+            index=models.Index(condition=models.Q(('status', 'PE')), fields=['data_vencimento', 'categoria', 'valor'], name='lancamento_pendente_venc_idx'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.2 on 2026-10-18 17:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import Coalesce, TruncDate, TruncMonth
+
+
+def popular_resumos(apps, schema_editor):
+    LancamentoFinanceiro = apps.get_model('financas', 'LancamentoFinanceiro')
+    ResumoFinanceiroMensal = apps.get_model('financas', 'ResumoFinanceiroMensal')
+    data = Coalesce('data_vencimento', 'data_pagamento', TruncDate('criado_em'))
+    linhas = (LancamentoFinanceiro.objects
+              .annotate(competencia=TruncMonth(data, output_field=models.DateField()))
+              .values('competencia', 'categoria_id', 'status')
+              .annotate(quantidade=Count('id'), total=Sum('valor'))
+              .order_by())
+    ResumoFinanceiroMensal.objects.bulk_create(
+        (ResumoFinanceiroMensal(**linha) for linha in linhas.iterator()), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('financas', '0004_lancamento_indices'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumoFinanceiroMensal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('competencia', models.DateField(verbose_name='Competência')),
+                ('status', models.CharField(choices=[('PE', 'Pendente'), ('PA', 'Pago'), ('CA', 'Cancelado')], max_length=2)),
+                ('quantidade', models.IntegerField(default=0)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('categoria', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumos', to='financas.categoriafinanceira', verbose_name='Categoria')),
+            ],
+            options={
+                'verbose_name': 'Resumo Financeiro Mensal',
+                'verbose_name_plural': 'Resumos Financeiros Mensais',
+                'ordering': ['-competencia', 'categoria'],
+                'constraints': [models.UniqueConstraint(fields=('competencia', 'categoria', 'status'), name='resumo_financeiro_mensal_uniq')],
+            },
+        ),
+        migrations.RunPython(popular_resumos, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.2 on 2026-10-18 17:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('financas', '0005_resumofinanceiromensal'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TransacaoBancaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('identificador', models.CharField(max_length=255, verbose_name='Identificador no Banco')),
+                ('data', models.DateField()),
+                ('valor', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('descricao', models.CharField(blank=True, max_length=255, verbose_name='Descrição')),
+                ('referencia', models.CharField(blank=True, max_length=100, verbose_name='Referência')),
+                ('status', models.CharField(choices=[('PE', 'Pendente'), ('CO', 'Conciliada'), ('IG', 'Ignorada')], default='PE', max_length=2)),
+                ('importado_em', models.DateTimeField(auto_now_add=True)),
+                ('caixa', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='transacoes', to='financas.caixa', verbose_name='Caixa')),
+                ('lancamento', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='transacoes', to='financas.lancamentofinanceiro', verbose_name='Lançamento')),
+            ],
+            options={
+                'verbose_name': 'Transação Bancária',
+                'verbose_name_plural': 'Transações Bancárias',
+                'ordering': ['-data', '-id'],
+                'indexes': [models.Index(fields=['caixa', 'status', 'data'], name='transacao_bancaria_status_idx')],
+                'constraints': [models.UniqueConstraint(fields=('caixa', 'identificador'), name='transacao_bancaria_uniq')],
+            },
+        ),
+    ]
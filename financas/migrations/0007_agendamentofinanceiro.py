@@ -0,0 +1,51 @@
+# Generated by Django 5.2.2 on 2026-10-18 17:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('financas', '0006_transacaobancaria'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lancamentofinanceiro',
+            name='parcela',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.CreateModel(
+            name='AgendamentoFinanceiro',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('modalidade', models.CharField(choices=[('RC', 'Recorrente'), ('PC', 'Parcelado')], default='RC', max_length=2)),
+                ('descricao', models.CharField(max_length=100, verbose_name='Descrição')),
+                ('valor', models.DecimalField(decimal_places=2, help_text='Valor de cada lançamento; no parcelamento, o valor total.', max_digits=12)),
+                ('data_inicio', models.DateField(verbose_name='Primeiro Vencimento')),
+                ('intervalo_meses', models.PositiveSmallIntegerField(default=1, verbose_name='Intervalo (meses)')),
+                ('numero_parcelas', models.PositiveIntegerField(blank=True, help_text='Obrigatório no parcelamento; na recorrência, vazio para não ter fim.', null=True, verbose_name='Número de Parcelas')),
+                ('data_fim', models.DateField(blank=True, null=True, verbose_name='Último Vencimento')),
+                ('parcelas_geradas', models.PositiveIntegerField(default=0, editable=False)),
+                ('ativo', models.BooleanField(default=True)),
+                ('criado_em', models.DateTimeField(auto_now_add=True)),
+                ('atualizado_em', models.DateTimeField(auto_now=True)),
+                ('categoria', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='agendamentos', to='financas.categoriafinanceira')),
+                ('contrato', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='agendamentos', to='financas.contrato')),
+            ],
+            options={
+                'verbose_name': 'Agendamento Financeiro',
+                'verbose_name_plural': 'Agendamentos Financeiros',
+            },
+        ),
+        migrations.AddField(
+            model_name='lancamentofinanceiro',
+            name='agendamento',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='lancamentos', to='financas.agendamentofinanceiro'),
+        ),
+        migrations.AddConstraint(
+            model_name='lancamentofinanceiro',
+            constraint=models.UniqueConstraint(fields=('agendamento', 'parcela'), name='lancamento_agendamento_parcela_uniq'),
+        ),
+    ]
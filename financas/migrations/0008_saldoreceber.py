@@ -0,0 +1,50 @@
+# Generated by Django 5.2.2 on 2026-10-18 17:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import Coalesce, TruncDate
+
+
+def popular_saldos(apps, schema_editor):
+    LancamentoFinanceiro = apps.get_model('financas', 'LancamentoFinanceiro')
+    SaldoReceberCliente = apps.get_model('financas', 'SaldoReceberCliente')
+    linhas = (LancamentoFinanceiro.objects
+              .filter(status='PE', categoria__tipo='RE', contrato__evento__cliente__isnull=False)
+              .annotate(vencimento=Coalesce('data_vencimento', TruncDate('criado_em')))
+              .values('contrato__evento__cliente_id', 'vencimento')
+              .annotate(quantidade=Count('id'), total=Sum('valor'))
+              .order_by())
+    SaldoReceberCliente.objects.bulk_create(
+        (SaldoReceberCliente(cliente_id=linha['contrato__evento__cliente_id'], data_vencimento=linha['vencimento'],
+                             quantidade=linha['quantidade'], total=linha['total'])
+         for linha in linhas.iterator()),
+        batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_alter_contatocliente_options'),
+        ('financas', '0007_agendamentofinanceiro'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SaldoReceberCliente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data_vencimento', models.DateField(verbose_name='Vencimento')),
+                ('quantidade', models.IntegerField(default=0)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('cliente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='saldos_receber', to='core.cliente', verbose_name='Cliente')),
+            ],
+            options={
+                'verbose_name': 'Saldo a Receber',
+                'verbose_name_plural': 'Saldos a Receber',
+                'indexes': [models.Index(condition=models.Q(('quantidade__gt', 0)), fields=['cliente', 'data_vencimento', 'total'], name='saldo_receber_aberto_idx')],
+                'constraints': [models.UniqueConstraint(fields=('cliente', 'data_vencimento'), name='saldo_receber_cliente_uniq')],
+            },
+        ),
+        migrations.RunPython(popular_saldos, migrations.RunPython.noop),
+    ]
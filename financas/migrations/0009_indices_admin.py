@@ -0,0 +1,21 @@
+# Generated by Django 5.2.2 on 2026-10-18 17:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('financas', '0008_saldoreceber'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='lancamentofinanceiro',
+            index=models.Index(fields=['status', 'id'], name='lancamento_status_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lancamentofinanceiro',
+            index=models.Index(fields=['data_vencimento', 'id'], name='lancamento_venc_id_idx'),
+        ),
+    ]
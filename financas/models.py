@@ -1,4 +1,12 @@
-from django.db import models
+from collections import defaultdict
+from datetime import timedelta
+from decimal import ROUND_DOWN, Decimal
+
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+from django.db.models import Case, Count, DecimalField, F, IntegerField, Q, Sum, Value, When
+from django.db.models.functions import Coalesce, TruncDate, TruncMonth
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 
@@ -12,6 +20,19 @@ class Caixa(models.Model):
     def __str__(self):
         return f"{self.empresa} - {self.banco}"
 
+    def save(self, *args, **kwargs):
+        # O saldo informado na abertura entra no diário; depois disso só muda por movimentos
+        novo = self._state.adding
+        if not novo and kwargs.get('update_fields') is None:
+            # Um save completo com a instância desatualizada sobrescreveria os movimentos
+            kwargs['update_fields'] = [campo.name for campo in self._meta.concrete_fields
+                                       if not campo.primary_key and campo.name != 'saldo']
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if novo and self.saldo:
+                MovimentoCaixa.objects.bulk_create([MovimentoCaixa(caixa=self, valor=self.saldo,
+                                                                   historico="Saldo de abertura")])
+
 
 class CategoriaFinanceira(models.Model):
     TIPO_CATEGORIA = [
@@ -54,6 +75,144 @@ class Contrato(models.Model):
         return f"{self.evento} - {self.get_status_display()}"
 
 
+class AgendamentoFinanceiroQuerySet(models.QuerySet):
+    def gerar(self, quantidade=12, ate=None, hoje=None):
+        # Completa cada agendamento ativo até ele ter `quantidade` lançamentos pendentes a vencer
+        # (e/ou todos os que vencem até `ate`), com um INSERT em lote: rodar de novo não gera nada
+        # enquanto o horizonte estiver coberto. Custos dos eventos e resumos mensais são
+        # atualizados uma única vez para o lote todo.
+        from eventos.custos import aplicar, deltas_lancamentos
+        from .projecao import somar_meses
+
+        if quantidade is None and ate is None:
+            raise ValueError("Informe a quantidade de lançamentos ou a data limite.")
+        hoje = hoje or timezone.localdate()
+        with transaction.atomic():
+            agendamentos = list(self.filter(ativo=True).select_for_update(of=('self',))
+                                .select_related('contrato__evento', 'categoria'))
+            a_vencer = dict(LancamentoFinanceiro.objects.filter(
+                agendamento__in=agendamentos, status='PE', data_vencimento__gte=hoje).order_by().values(
+                'agendamento').annotate(total=Count('id')).values_list('agendamento', 'total'))
+            lancamentos = []
+            for agendamento in agendamentos:
+                parcela = agendamento.parcelas_geradas
+                futuros = a_vencer.get(agendamento.id, 0)
+                while quantidade is None or futuros < quantidade:
+                    if agendamento.numero_parcelas and parcela >= agendamento.numero_parcelas:
+                        break
+                    vencimento = somar_meses(agendamento.data_inicio, parcela * agendamento.intervalo_meses)
+                    if (agendamento.data_fim and vencimento > agendamento.data_fim) or (ate and vencimento > ate):
+                        break
+                    parcela += 1
+                    if vencimento >= hoje:
+                        futuros += 1
+                    lancamentos.append(LancamentoFinanceiro(
+                        agendamento=agendamento, parcela=parcela, contrato=agendamento.contrato,
+                        categoria=agendamento.categoria, valor=agendamento.valor_parcela(parcela),
+                        data_vencimento=vencimento, observacoes=agendamento.descricao_parcela(parcela)))
+                agendamento.parcelas_geradas = parcela
+            if not lancamentos:
+                return []
+            LancamentoFinanceiro.objects.bulk_create(lancamentos, batch_size=500)
+            AgendamentoFinanceiro.objects.bulk_update(agendamentos, ['parcelas_geradas'], batch_size=500)
+            custos, receitas = deltas_lancamentos(
+                [(lancamento.evento_id, lancamento.categoria.tipo, lancamento.status, lancamento.valor, 1)
+                 for lancamento in lancamentos])
+            aplicar(custos, receitas)
+            ResumoFinanceiroMensal.objects.aplicar([lancamento.efeito_resumo() for lancamento in lancamentos])
+            SaldoReceberCliente.objects.aplicar([lancamento.efeito_receber() for lancamento in lancamentos])
+        return lancamentos
+
+
+class AgendamentoFinanceiro(models.Model):
+    # Recorrência (o mesmo valor todo período) ou parcelamento (um total dividido em parcelas)
+    MODALIDADE_CHOICES = [
+        ('RC', 'Recorrente'),
+        ('PC', 'Parcelado'),
+    ]
+
+    modalidade = models.CharField(max_length=2, choices=MODALIDADE_CHOICES, default='RC')
+    contrato = models.ForeignKey(Contrato, on_delete=models.CASCADE, null=True, blank=True,
+                                 related_name='agendamentos')
+    categoria = models.ForeignKey(CategoriaFinanceira, on_delete=models.PROTECT, related_name='agendamentos')
+    descricao = models.CharField(max_length=100, verbose_name=_('Descrição'))
+    valor = models.DecimalField(max_digits=12, decimal_places=2,
+                                help_text=_('Valor de cada lançamento; no parcelamento, o valor total.'))
+    data_inicio = models.DateField(verbose_name=_('Primeiro Vencimento'))
+    intervalo_meses = models.PositiveSmallIntegerField(default=1, verbose_name=_('Intervalo (meses)'))
+    numero_parcelas = models.PositiveIntegerField(null=True, blank=True, verbose_name=_('Número de Parcelas'),
+                                                  help_text=_('Obrigatório no parcelamento; na recorrência, '
+                                                              'vazio para não ter fim.'))
+    data_fim = models.DateField(null=True, blank=True, verbose_name=_('Último Vencimento'))
+    parcelas_geradas = models.PositiveIntegerField(default=0, editable=False)
+    ativo = models.BooleanField(default=True)
+    criado_em = models.DateTimeField(auto_now_add=True)
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    objects = AgendamentoFinanceiroQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = _('Agendamento Financeiro')
+        verbose_name_plural = _('Agendamentos Financeiros')
+
+    def __str__(self):
+        return f"{self.descricao} ({self.get_modalidade_display()})"
+
+    def clean(self):
+        if self.modalidade == 'PC' and not self.numero_parcelas:
+            raise ValidationError({'numero_parcelas': _('Informe o número de parcelas.')})
+
+    def valor_parcela(self, parcela):
+        if self.modalidade != 'PC':
+            return self.valor
+        # O resto da divisão em centavos fica na última parcela
+        base = (self.valor / self.numero_parcelas).quantize(Decimal('0.01'), rounding=ROUND_DOWN)
+        if parcela == self.numero_parcelas:
+            return self.valor - base * (self.numero_parcelas - 1)
+        return base
+
+    def descricao_parcela(self, parcela):
+        if self.numero_parcelas:
+            return f"{self.descricao} - {parcela}/{self.numero_parcelas}"
+        return f"{self.descricao} - {parcela}"
+
+
+class LancamentoFinanceiroQuerySet(models.QuerySet):
+    def liquidar(self, data_pagamento=None):
+        # Marca os lançamentos pendentes do queryset como pagos com um único UPDATE e lança
+        # os movimentos de caixa de uma vez. Lançamentos que não estão pendentes são ignorados.
+        data_pagamento = data_pagamento or timezone.localdate()
+        with transaction.atomic():
+            pendentes = list(self.filter(status='PE').select_for_update(of=('self',)).values_list(
+                'id', 'valor', 'categoria_id', 'categoria__caixa_id', 'categoria__tipo', 'categoria__nome',
+                'data_vencimento', 'data_pagamento', 'criado_em', 'contrato__evento__cliente_id'))
+            if not pendentes:
+                return 0
+            ids = [pendente[0] for pendente in pendentes]
+            LancamentoFinanceiro.objects.filter(pk__in=ids, status='PE').update(
+                status='PA', data_pagamento=data_pagamento, atualizado_em=timezone.now())
+            MovimentoCaixa.objects.lancar([
+                MovimentoCaixa(caixa_id=caixa_id, categoria_id=categoria_id, lancamento_id=lancamento_id,
+                               valor=valor if tipo == 'RE' else -valor,
+                               historico=f"Liquidação de {nome} - R${valor} em {data_pagamento:%d/%m/%Y}")
+                for lancamento_id, valor, categoria_id, caixa_id, tipo, nome, *datas in pendentes
+            ])
+            efeitos = []
+            recebidos = []
+            for (lancamento_id, valor, categoria_id, caixa_id, tipo, nome,
+                 vencimento, pagamento, criado_em, cliente_id) in pendentes:
+                efeitos.append((LancamentoFinanceiro.calcular_competencia(vencimento, pagamento, criado_em),
+                                categoria_id, 'PE', valor, -1))
+                efeitos.append((LancamentoFinanceiro.calcular_competencia(vencimento, data_pagamento, criado_em),
+                                categoria_id, 'PA', valor, 1))
+                if tipo == 'RE' and cliente_id:
+                    recebidos.append((cliente_id, LancamentoFinanceiro.calcular_vencimento(vencimento, criado_em),
+                                      valor, -1))
+            ResumoFinanceiroMensal.objects.aplicar(efeitos)
+            SaldoReceberCliente.objects.aplicar(recebidos)
+        return len(ids)
+
+
 class LancamentoFinanceiro(models.Model):
     STATUS_CHOICES = [
         ('PE', 'Pendente'),
@@ -63,6 +222,9 @@ class LancamentoFinanceiro(models.Model):
 
     contrato = models.ForeignKey(Contrato, on_delete=models.SET_NULL, null=True, blank=True)
     categoria = models.ForeignKey(CategoriaFinanceira, on_delete=models.PROTECT)
+    agendamento = models.ForeignKey(AgendamentoFinanceiro, on_delete=models.SET_NULL, null=True, blank=True,
+                                    editable=False, related_name='lancamentos')
+    parcela = models.PositiveIntegerField(null=True, blank=True, editable=False)
     valor = models.DecimalField(max_digits=12, decimal_places=2)
     data_vencimento = models.DateField(null=True, blank=True)
     data_pagamento = models.DateField(null=True, blank=True)
@@ -71,51 +233,361 @@ class LancamentoFinanceiro(models.Model):
     criado_em = models.DateTimeField(auto_now_add=True)
     atualizado_em = models.DateTimeField(auto_now=True)
 
+    objects = LancamentoFinanceiroQuerySet.as_manager()
+
     class Meta:
         verbose_name = _('Lançamento Financeiro')
         verbose_name_plural = _('Lançamentos Financeiros')
         ordering = ['-data_vencimento']
+        constraints = [
+            models.UniqueConstraint(fields=['agendamento', 'parcela'], name='lancamento_agendamento_parcela_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['status', 'data_vencimento'], name='lancamento_status_venc_idx'),
+            # Filtro por status e ordenação por vencimento no admin, percorridos na ordem da chave primária
+            models.Index(fields=['status', 'id'], name='lancamento_status_id_idx'),
+            models.Index(fields=['data_vencimento', 'id'], name='lancamento_venc_id_idx'),
+            # Projeção de caixa: só os pendentes, já com o que é somado por caixa
+            models.Index(fields=['data_vencimento', 'categoria', 'valor'], condition=models.Q(status='PE'),
+                         name='lancamento_pendente_venc_idx'),
+        ]
 
     def __str__(self):
         return f"{self.categoria} - R${self.valor} ({self.get_status_display()})"
 
+    @property
+    def evento_id(self):
+        return self.contrato.evento_id if self.contrato_id else None
+
+    @staticmethod
+    def calcular_competencia(data_vencimento, data_pagamento, criado_em):
+        # Mês em que o lançamento é apurado: vencimento, pagamento ou, na falta dos dois, cadastro
+        data = data_vencimento or data_pagamento or timezone.localdate(criado_em)
+        return data.replace(day=1)
+
+    def efeito_resumo(self, sinal=1):
+        competencia = self.calcular_competencia(self.data_vencimento, self.data_pagamento, self.criado_em)
+        return competencia, self.categoria_id, self.status, self.valor, sinal
+
+    @property
+    def cliente_id(self):
+        if self.contrato_id and self.contrato.evento_id:
+            return self.contrato.evento.cliente_id
+        return None
+
+    @staticmethod
+    def calcular_vencimento(data_vencimento, criado_em):
+        return data_vencimento or timezone.localdate(criado_em)
+
+    def efeito_receber(self, sinal=1):
+        # Só receitas pendentes de contratos com cliente ficam a receber
+        if self.categoria.tipo != 'RE' or self.status != 'PE' or not self.cliente_id:
+            return None
+        return self.cliente_id, self.calcular_vencimento(self.data_vencimento, self.criado_em), self.valor, sinal
+
+    @property
+    def efeito_caixa(self):
+        # Só lançamentos pagos movimentam o caixa: receitas entram e despesas saem
+        if self.status != 'PA':
+            return Decimal(0)
+        return self.valor if self.categoria.tipo == 'RE' else -self.valor
+
+    def movimento_caixa(self, lancamento=None, estorno=False):
+        valor = -self.efeito_caixa if estorno else self.efeito_caixa
+        return MovimentoCaixa(caixa_id=self.categoria.caixa_id, categoria_id=self.categoria_id,
+                              lancamento=lancamento, valor=valor,
+                              historico=f"{'Estorno de ' if estorno else ''}{self}"[:255])
+
+    def save(self, *args, **kwargs):
+        from eventos.custos import aplicar, deltas_lancamentos
+
+        with transaction.atomic():
+            # Custo e receita do evento são ajustados por deltas (novo valor menos o anterior)
+            efeitos = [(self.evento_id, self.categoria.tipo, self.status, self.valor, 1)]
+            movimentos = [self.movimento_caixa(self)]
+            resumo = []
+            receber = []
+            if self.id:
+                # A linha fica travada até o fim da transação para que dois pagamentos
+                # simultâneos do mesmo lançamento não sejam lançados duas vezes no caixa
+                anterior = (LancamentoFinanceiro.objects.select_for_update(of=('self',))
+                            .select_related('contrato__evento', 'categoria').get(id=self.id))
+                efeitos.append((anterior.evento_id, anterior.categoria.tipo, anterior.status, anterior.valor, -1))
+                resumo.append(anterior.efeito_resumo(-1))
+                receber.append(anterior.efeito_receber(-1))
+                if (anterior.categoria.caixa_id, anterior.categoria_id, anterior.efeito_caixa) == \
+                        (self.categoria.caixa_id, self.categoria_id, self.efeito_caixa):
+                    movimentos = []
+                else:
+                    movimentos.insert(0, anterior.movimento_caixa(self, estorno=True))
+            super().save(*args, **kwargs)
+            resumo.append(self.efeito_resumo())
+            receber.append(self.efeito_receber())
+            MovimentoCaixa.objects.lancar(movimentos)
+            ResumoFinanceiroMensal.objects.aplicar(resumo)
+            SaldoReceberCliente.objects.aplicar(receber)
+            custos, receitas = deltas_lancamentos(efeitos)
+            aplicar(custos, receitas)
+
+
+class MovimentoCaixaQuerySet(models.QuerySet):
+    def lancar(self, movimentos):
+        # Grava os movimentos no diário e soma os valores nos saldos dos caixas com um
+        # único UPDATE, na mesma transação
+        movimentos = [movimento for movimento in movimentos if movimento.valor]
+        if not movimentos:
+            return []
+        deltas = defaultdict(Decimal)
+        for movimento in movimentos:
+            deltas[movimento.caixa_id] += movimento.valor
+        campo = Caixa._meta.get_field('saldo')
+        soma = Case(
+            *[When(pk=caixa_id, then=Value(delta)) for caixa_id, delta in deltas.items()],
+            default=Value(Decimal(0)),
+            output_field=DecimalField(max_digits=campo.max_digits, decimal_places=campo.decimal_places),
+        )
+        with transaction.atomic():
+            Caixa.objects.filter(pk__in=deltas).update(saldo=F('saldo') + soma)
+            return self.bulk_create(movimentos)
+
+
+class MovimentoCaixa(models.Model):
+    # Diário do caixa: cada linha debita (valor positivo) ou credita (negativo) o caixa tendo a
+    # categoria como contrapartida. As linhas não são alteradas; correções entram como estorno.
+    caixa = models.ForeignKey(Caixa, on_delete=models.PROTECT, related_name='movimentos', verbose_name=_('Caixa'))
+    categoria = models.ForeignKey(CategoriaFinanceira, on_delete=models.PROTECT, null=True, blank=True,
+                                  verbose_name=_('Contrapartida'))
+    lancamento = models.ForeignKey(LancamentoFinanceiro, on_delete=models.SET_NULL, null=True, blank=True,
+                                   related_name='movimentos', verbose_name=_('Lançamento'))
+    valor = models.DecimalField(max_digits=12, decimal_places=2)
+    historico = models.CharField(max_length=255, verbose_name=_('Histórico'))
+    criado_em = models.DateTimeField(auto_now_add=True)
+
+    objects = MovimentoCaixaQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = _('Movimento de Caixa')
+        verbose_name_plural = _('Movimentos de Caixa')
+        ordering = ['-criado_em', '-id']
+        indexes = [
+            models.Index(fields=['caixa', 'criado_em'], name='movimento_caixa_data_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.caixa} - R${self.valor} ({self.historico})"
+
     def save(self, *args, **kwargs):
-        if not self.id:
-            if self.categoria.tipo == 'RE':
-                if self.contrato:
-                    self.contrato.evento.valor_total += self.valor
-            elif self.categoria.tipo == 'DE':
-                if self.contrato:
-                    self.contrato.evento.valor_custo += self.valor
-            self.contrato.evento.save()
-            if self.status == 'PA' and self.categoria.tipo == 'DE':
-                self.categoria.caixa.saldo -= self.valor
-            elif self.status == 'PA' and self.categoria.tipo == 'RE':
-                self.categoria.caixa.saldo += self.valor
-        else:
-            old_instance = LancamentoFinanceiro.objects.get(id=self.id)
-            if old_instance.valor != self.valor:
-                if self.categoria.tipo == 'RE':
-                    if self.contrato:
-                        self.contrato.evento.valor_total -= old_instance.valor
-                        self.contrato.evento.valor_total += self.valor
-                elif self.categoria.tipo == 'DE':
-                    if self.contrato:
-                        self.contrato.evento.valor_custo -= old_instance.valor
-                        self.contrato.evento.valor_custo += self.valor
-                if self.status == 'PA' and self.categoria.tipo == 'DE':
-                    self.categoria.caixa.saldo += old_instance.valor
-                    self.categoria.caixa.saldo -= self.valor
-                elif self.status == 'PA' and self.categoria.tipo == 'RE':
-                    self.categoria.caixa.saldo -= old_instance.valor
-                    self.categoria.caixa.saldo += self.valor
-            else:
-                if self.status == 'PA' and self.categoria.tipo == 'DE':
-                    self.categoria.caixa.saldo -= self.valor
-                elif self.status == 'PA' and self.categoria.tipo == 'RE':
-                    self.categoria.caixa.saldo += self.valor
-        self.categoria.caixa.save()
-        self.contrato.evento.save()
-        super().save(*args, **kwargs)
+        if self.pk:
+            raise ValueError("Movimentos de caixa não podem ser alterados; lance um estorno.")
+        MovimentoCaixa.objects.lancar([self])
+
+    def delete(self, *args, **kwargs):
+        raise ValueError("Movimentos de caixa não podem ser excluídos; lance um estorno.")
+
+
+def _somar_totais(queryset, campos, deltas):
+    # Soma deltas ({chave: [quantidade, total]}, com a chave formada pelos `campos`) com um INSERT
+    # que apenas garante a existência das linhas e um único UPDATE incremental
+    deltas = {chave: delta for chave, delta in deltas.items() if any(delta)}
+    if not deltas:
+        return
+    queryset.bulk_create([queryset.model(**dict(zip(campos, chave))) for chave in deltas], ignore_conflicts=True)
+    campo = queryset.model._meta.get_field('total')
+    filtro = Q()
+    quantidades = []
+    totais = []
+    for chave, (quantidade, total) in deltas.items():
+        condicao = Q(**dict(zip(campos, chave)))
+        filtro |= condicao
+        quantidades.append(When(condicao, then=Value(quantidade)))
+        totais.append(When(condicao, then=Value(total)))
+    queryset.filter(filtro).update(
+        quantidade=F('quantidade') + Case(*quantidades, default=Value(0), output_field=IntegerField()),
+        total=F('total') + Case(
+            *totais,
+            default=Value(Decimal(0)),
+            output_field=DecimalField(max_digits=campo.max_digits, decimal_places=campo.decimal_places),
+        ),
+    )
+
+
+class ResumoFinanceiroMensalQuerySet(models.QuerySet):
+    def aplicar(self, efeitos):
+        # Soma efeitos (competencia, categoria_id, status, valor, sinal) nos resumos
+        deltas = defaultdict(lambda: [0, Decimal(0)])
+        for competencia, categoria_id, status, valor, sinal in efeitos:
+            delta = deltas[competencia, categoria_id, status]
+            delta[0] += sinal
+            delta[1] += sinal * valor
+        _somar_totais(self, ['competencia', 'categoria_id', 'status'], deltas)
+
+    def resultado(self, por='categoria'):
+        # Receitas, despesas e resultado por mês e por categoria ou caixa (por='categoria__caixa'),
+        # sem os lançamentos cancelados
+        valor = DecimalField(max_digits=14, decimal_places=2)
+        receitas = Sum('total', filter=Q(categoria__tipo='RE'), default=Decimal(0), output_field=valor)
+        despesas = Sum('total', filter=Q(categoria__tipo='DE'), default=Decimal(0), output_field=valor)
+        return (self.exclude(status='CA')
+                .values('competencia', por)
+                .annotate(receitas=receitas, despesas=despesas)
+                .annotate(resultado=F('receitas') - F('despesas'))
+                .order_by('competencia', por))
+
+    def reconstruir(self):
+        # Apaga e recalcula todos os resumos a partir dos lançamentos, agrupando no banco
+        data = Coalesce('data_vencimento', 'data_pagamento', TruncDate('criado_em'))
+        linhas = (LancamentoFinanceiro.objects
+                  .annotate(competencia=TruncMonth(data, output_field=models.DateField()))
+                  .values('competencia', 'categoria_id', 'status')
+                  .annotate(quantidade=Count('id'), total=Sum('valor'))
+                  .order_by())
+        with transaction.atomic():
+            self.all().delete()
+            return self.bulk_create((ResumoFinanceiroMensal(**linha) for linha in linhas.iterator()),
+                                    batch_size=1000)
+
+
+class ResumoFinanceiroMensal(models.Model):
+    # Totais dos lançamentos por mês, categoria e status, mantidos a cada lançamento
+    competencia = models.DateField(verbose_name=_('Competência'))
+    categoria = models.ForeignKey(CategoriaFinanceira, on_delete=models.CASCADE, related_name='resumos',
+                                  verbose_name=_('Categoria'))
+    status = models.CharField(max_length=2, choices=LancamentoFinanceiro.STATUS_CHOICES)
+    quantidade = models.IntegerField(default=0)
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    objects = ResumoFinanceiroMensalQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = _('Resumo Financeiro Mensal')
+        verbose_name_plural = _('Resumos Financeiros Mensais')
+        ordering = ['-competencia', 'categoria']
+        constraints = [
+            models.UniqueConstraint(fields=['competencia', 'categoria', 'status'],
+                                    name='resumo_financeiro_mensal_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.competencia:%m/%Y} - {self.categoria} ({self.get_status_display()}): R${self.total}"
+
+
+class SaldoReceberClienteQuerySet(models.QuerySet):
+    def aplicar(self, efeitos):
+        # Soma efeitos (cliente_id, vencimento, valor, sinal) nos saldos a receber; None é ignorado
+        deltas = defaultdict(lambda: [0, Decimal(0)])
+        for efeito in efeitos:
+            if efeito is None:
+                continue
+            cliente_id, vencimento, valor, sinal = efeito
+            delta = deltas[cliente_id, vencimento]
+            delta[0] += sinal
+            delta[1] += sinal * valor
+        _somar_totais(self, ['cliente_id', 'data_vencimento'], deltas)
+
+    def aging(self, hoje=None):
+        # Quanto cada cliente deve, separado por faixa de atraso, em uma consulta sobre os saldos
+        hoje = hoje or timezone.localdate()
+        valor = DecimalField(max_digits=14, decimal_places=2)
 
+        def faixa(**filtro):
+            return Sum('total', filter=Q(**filtro), default=Decimal(0), output_field=valor)
+
+        return (self.filter(quantidade__gt=0)
+                .values('cliente', 'cliente__nome')
+                .annotate(a_vencer=faixa(data_vencimento__gte=hoje),
+                          dias_1_30=faixa(data_vencimento__lt=hoje, data_vencimento__gte=hoje - timedelta(days=30)),
+                          dias_31_60=faixa(data_vencimento__lt=hoje - timedelta(days=30),
+                                           data_vencimento__gte=hoje - timedelta(days=60)),
+                          dias_61_90=faixa(data_vencimento__lt=hoje - timedelta(days=60),
+                                           data_vencimento__gte=hoje - timedelta(days=90)),
+                          acima_90=faixa(data_vencimento__lt=hoje - timedelta(days=90)),
+                          em_aberto=Sum('total', output_field=valor))
+                .order_by('-em_aberto', 'cliente__nome'))
+
+    def reconstruir(self):
+        # Apaga e recalcula os saldos a partir das receitas pendentes, agrupando no banco
+        linhas = (LancamentoFinanceiro.objects
+                  .filter(status='PE', categoria__tipo='RE', contrato__evento__cliente__isnull=False)
+                  .annotate(vencimento=Coalesce('data_vencimento', TruncDate('criado_em')))
+                  .values('contrato__evento__cliente_id', 'vencimento')
+                  .annotate(quantidade=Count('id'), total=Sum('valor'))
+                  .order_by())
+        with transaction.atomic():
+            self.all().delete()
+            return self.bulk_create(
+                (SaldoReceberCliente(cliente_id=linha['contrato__evento__cliente_id'],
+                                     data_vencimento=linha['vencimento'], quantidade=linha['quantidade'],
+                                     total=linha['total'])
+                 for linha in linhas.iterator()),
+                batch_size=1000)
+
+
+class SaldoReceberCliente(models.Model):
+    # Receitas pendentes por cliente e vencimento, mantidas a cada lançamento
+    # (lançamento -> contrato -> evento -> cliente)
+    cliente = models.ForeignKey("core.Cliente", on_delete=models.CASCADE, related_name='saldos_receber',
+                                verbose_name=_('Cliente'))
+    data_vencimento = models.DateField(verbose_name=_('Vencimento'))
+    quantidade = models.IntegerField(default=0)
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    objects = SaldoReceberClienteQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = _('Saldo a Receber')
+        verbose_name_plural = _('Saldos a Receber')
+        constraints = [
+            models.UniqueConstraint(fields=['cliente', 'data_vencimento'], name='saldo_receber_cliente_uniq'),
+        ]
+        indexes = [
+            # Só os saldos em aberto, já com o que é somado por cliente
+            models.Index(fields=['cliente', 'data_vencimento', 'total'], condition=models.Q(quantidade__gt=0),
+                         name='saldo_receber_aberto_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.cliente} - {self.data_vencimento:%d/%m/%Y}: R${self.total}"
+
+
+class TransacaoBancaria(models.Model):
+    # Linha de extrato bancário importada, à espera de conciliação com um lançamento
+    STATUS_CHOICES = [
+        ('PE', 'Pendente'),
+        ('CO', 'Conciliada'),
+        ('IG', 'Ignorada'),
+    ]
+
+    caixa = models.ForeignKey(Caixa, on_delete=models.CASCADE, related_name='transacoes', verbose_name=_('Caixa'))
+    identificador = models.CharField(max_length=255, verbose_name=_('Identificador no Banco'))
+    data = models.DateField()
+    valor = models.DecimalField(max_digits=12, decimal_places=2)
+    descricao = models.CharField(max_length=255, blank=True, verbose_name=_('Descrição'))
+    referencia = models.CharField(max_length=100, blank=True, verbose_name=_('Referência'))
+    lancamento = models.ForeignKey(LancamentoFinanceiro, on_delete=models.SET_NULL, null=True, blank=True,
+                                   related_name='transacoes', verbose_name=_('Lançamento'))
+    status = models.CharField(max_length=2, choices=STATUS_CHOICES, default='PE')
+    importado_em = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = _('Transação Bancária')
+        verbose_name_plural = _('Transações Bancárias')
+        ordering = ['-data', '-id']
+        constraints = [
+            # Reimportar o mesmo extrato não duplica as transações
+            models.UniqueConstraint(fields=['caixa', 'identificador'], name='transacao_bancaria_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['caixa', 'status', 'data'], name='transacao_bancaria_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.data:%d/%m/%Y} - R${self.valor} ({self.descricao})"
 
+    def clean(self):
+        # Conciliação manual: só um lançamento pendente do mesmo caixa pode ser liquidado pela transação
+        if self.lancamento_id and self.status == 'PE':
+            lancamento = LancamentoFinanceiro.objects.select_related('categoria').get(pk=self.lancamento_id)
+            if lancamento.categoria.caixa_id != self.caixa_id:
+                raise ValidationError({'lancamento': _('O lançamento é de outro caixa.')})
+            if lancamento.status != 'PE':
+                raise ValidationError({'lancamento': _('O lançamento não está pendente.')})
@@ -0,0 +1,59 @@
+from calendar import monthrange
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db.models import DateField, DecimalField, F, Q, Sum, Value
+from django.db.models.functions import Coalesce, Greatest, TruncDay, TruncWeek
+from django.utils import timezone
+
+from .models import Caixa, LancamentoFinanceiro
+
+PERIODOS = {'dia': TruncDay, 'semana': TruncWeek}
+
+
+def somar_meses(data, meses):
+    ano, mes = divmod(data.month - 1 + meses, 12)
+    ano += data.year
+    return data.replace(year=ano, month=mes + 1, day=min(data.day, monthrange(ano, mes + 1)[1]))
+
+
+def pendentes_por_periodo(inicio, fim, periodo='dia', caixas=None):
+    # Soma no banco as receitas e despesas pendentes por caixa e período de vencimento.
+    # Pendências já vencidas entram no primeiro período; sem vencimento ficam de fora.
+    truncar = PERIODOS[periodo]
+    valor = DecimalField(max_digits=14, decimal_places=2)
+    lancamentos = LancamentoFinanceiro.objects.filter(status='PE', data_vencimento__lt=fim)
+    if caixas is not None:
+        lancamentos = lancamentos.filter(categoria__caixa__in=caixas)
+    return (lancamentos
+            .annotate(periodo=truncar(Greatest(F('data_vencimento'), Value(inicio)), output_field=DateField()))
+            .values('categoria__caixa', 'periodo')
+            .annotate(receitas=Coalesce(Sum('valor', filter=Q(categoria__tipo='RE')), Value(Decimal(0)),
+                                        output_field=valor),
+                      despesas=Coalesce(Sum('valor', filter=Q(categoria__tipo='DE')), Value(Decimal(0)),
+                                        output_field=valor))
+            .order_by('categoria__caixa', 'periodo'))
+
+
+def projetar_fluxo(meses=3, periodo='dia', caixas=None, inicio=None):
+    # Projeção do saldo de cada caixa ({caixa: [linhas]}) para os próximos `meses`: saldo atual
+    # mais as receitas e menos as despesas pendentes, acumulado período a período
+    inicio = inicio or timezone.localdate()
+    fim = somar_meses(inicio, meses)
+    selecionados = Caixa.objects.select_related('empresa').order_by('id')
+    if caixas is not None:
+        selecionados = selecionados.filter(pk__in=caixas)
+    projecao = {caixa: [] for caixa in selecionados}
+    por_id = {caixa.id: caixa for caixa in projecao}
+    saldos = {caixa.id: caixa.saldo for caixa in projecao}
+    linhas = defaultdict(list)
+    for linha in pendentes_por_periodo(inicio, fim, periodo, list(por_id)):
+        linhas[linha['categoria__caixa']].append(linha)
+    for caixa_id, pendentes in linhas.items():
+        for linha in pendentes:
+            saldos[caixa_id] += linha['receitas'] - linha['despesas']
+            projecao[por_id[caixa_id]].append({
+                'periodo': linha['periodo'], 'receitas': linha['receitas'],
+                'despesas': linha['despesas'], 'saldo': saldos[caixa_id],
+            })
+    return projecao
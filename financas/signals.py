@@ -0,0 +1,22 @@
+from django.db.models.signals import pre_delete
+from django.dispatch import receiver
+
+from eventos.custos import aplicar, deltas_lancamentos
+from .models import LancamentoFinanceiro, MovimentoCaixa, ResumoFinanceiroMensal, SaldoReceberCliente
+
+
+@receiver(pre_delete, sender=LancamentoFinanceiro)
+def estornar_lancamento(sender, instance, using, **kwargs):
+    # Roda na transação da exclusão: o estorno parte da linha gravada, travada como em save(),
+    # e não da instância em memória, que pode estar desatualizada (ex.: liquidada depois de lida).
+    # O lançamento vai deixar de existir: o estorno fica no diário sem a referência.
+    anterior = (LancamentoFinanceiro.objects.using(using).select_for_update(of=('self',))
+                .select_related('contrato__evento', 'categoria').filter(pk=instance.pk).first())
+    if anterior is None:
+        return
+    MovimentoCaixa.objects.lancar([anterior.movimento_caixa(estorno=True)])
+    ResumoFinanceiroMensal.objects.aplicar([anterior.efeito_resumo(-1)])
+    SaldoReceberCliente.objects.aplicar([anterior.efeito_receber(-1)])
+    custos, receitas = deltas_lancamentos(
+        [(anterior.evento_id, anterior.categoria.tipo, anterior.status, anterior.valor, -1)])
+    aplicar(custos, receitas)
@@ -1,3 +1,368 @@
+import io
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.management import call_command
+from django.db.models import Sum
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from core.models import Cliente, Empresa
+from core.tests import ConsultasChangelistMixin
+from eventos.models import Evento
+from .conciliacao import conciliar, importar_extrato, ler_csv, ler_ofx
+from .models import (AgendamentoFinanceiro, Caixa, CategoriaFinanceira, Contrato, LancamentoFinanceiro, MovimentoCaixa,
+                     ResumoFinanceiroMensal, SaldoReceberCliente, TransacaoBancaria)
+from .projecao import projetar_fluxo, somar_meses
+
+
+class ChangelistFinancasTests(ConsultasChangelistMixin, TestCase):
+    def categoria(self, numero, tipo='RE'):
+        empresa = Empresa.objects.create(nome_fantasia=f"Empresa {numero}", cnpj=str(numero))
+        caixa = Caixa.objects.create(empresa=empresa, banco=f"Banco {numero}", agencia=1, conta=numero, saldo=0)
+        return CategoriaFinanceira.objects.create(nome=f"Categoria {numero}", caixa=caixa, tipo=tipo)
+
+    def contrato(self, numero):
+        evento = Evento.objects.create(
+            nome_evento=f"Evento {numero}", numero_convidados=10, valor_total=0,
+            cliente=Cliente.objects.create(nome=f"Cliente {numero}", tipo='PF', cpf_cnpj=str(numero)))
+        return Contrato.objects.create(evento=evento)
+
+    def test_categoria(self):
+        self.assertChangelistConsultas(CategoriaFinanceira, self.categoria, 5)
+
+    def test_contrato(self):
+        self.assertChangelistConsultas(Contrato, self.contrato, 5)
+
+    def test_lancamento(self):
+        def criar(numero):
+            LancamentoFinanceiro.objects.create(categoria=self.categoria(numero), contrato=self.contrato(numero),
+                                                valor=100, data_vencimento=date.today())
+        self.assertChangelistConsultas(LancamentoFinanceiro, criar, 3)
+
+
+class DiarioCaixaTests(TestCase):
+    def setUp(self):
+        empresa = Empresa.objects.create(nome_fantasia="Buffet", cnpj="1")
+        self.caixa = Caixa.objects.create(empresa=empresa, banco="Banco", agencia=1, conta=1, saldo=100)
+        self.despesa = CategoriaFinanceira.objects.create(nome="Compras", caixa=self.caixa, tipo='DE')
+
+    def saldo(self, caixa=None):
+        caixa = caixa or self.caixa
+        caixa.refresh_from_db()
+        self.assertEqual(caixa.movimentos.aggregate(total=Sum('valor'))['total'], caixa.saldo)
+        return caixa.saldo
+
+    def resumos(self):
+        return set(ResumoFinanceiroMensal.objects.filter(quantidade__gt=0).values_list(
+            'competencia', 'categoria', 'status', 'quantidade', 'total'))
+
+    def test_alteracoes_lancam_so_a_diferenca(self):
+        outro = Caixa.objects.create(empresa=self.caixa.empresa, banco="Outro", agencia=1, conta=2, saldo=0)
+        lancamento = LancamentoFinanceiro.objects.create(categoria=self.despesa, valor=30)
+        lancamento.status = 'PA'
+        lancamento.save()
+        lancamento.save()
+        self.assertEqual(self.saldo(), 70)
+        lancamento.valor = 40
+        lancamento.save()
+        self.assertEqual(self.saldo(), 60)
+        lancamento.status = 'CA'
+        lancamento.save()
+        self.assertEqual(self.saldo(), 100)
+
+        receita = LancamentoFinanceiro.objects.create(
+            categoria=CategoriaFinanceira.objects.create(nome="Eventos", caixa=self.caixa, tipo='RE'),
+            valor=50, status='PA')
+        receita.categoria = CategoriaFinanceira.objects.create(nome="Eventos 2", caixa=outro, tipo='RE')
+        receita.save()
+        self.assertEqual((self.saldo(), self.saldo(outro)), (100, 50))
+        receita.delete()
+        self.assertEqual(self.saldo(outro), 0)
+        with self.assertRaises(ValueError):
+            MovimentoCaixa.objects.first().save()
+
+    def test_exclusao_estorna_o_que_esta_gravado(self):
+        lancamento = LancamentoFinanceiro.objects.create(categoria=self.despesa, valor=30,
+                                                         data_vencimento=date.today())
+        LancamentoFinanceiro.objects.filter(pk=lancamento.pk).liquidar()
+        self.assertEqual(self.saldo(), 70)
+        lancamento.delete()
+        self.assertEqual(self.saldo(), 100)
+        atuais = self.resumos()
+        ResumoFinanceiroMensal.objects.reconstruir()
+        self.assertEqual(atuais, self.resumos())
+
+
+    def test_liquidar_em_lote(self):
+        outro = Caixa.objects.create(empresa=self.caixa.empresa, banco="Outro", agencia=1, conta=2, saldo=0)
+        receita = CategoriaFinanceira.objects.create(nome="Eventos", caixa=outro, tipo='RE')
+        for _ in range(50):
+            LancamentoFinanceiro.objects.create(categoria=self.despesa, valor=1)
+            LancamentoFinanceiro.objects.create(categoria=receita, valor=3)
+        LancamentoFinanceiro.objects.create(categoria=receita, valor=100, status='PA')
+
+        self.assertEqual(LancamentoFinanceiro.objects.liquidar(date(2026, 1, 2)), 100)
+        self.assertEqual((self.saldo(), self.saldo(outro)), (50, 250))
+        self.assertEqual(LancamentoFinanceiro.objects.filter(data_pagamento=date(2026, 1, 2)).count(), 100)
+        self.assertEqual(LancamentoFinanceiro.objects.liquidar(), 0)
+        atuais = self.resumos()
+        ResumoFinanceiroMensal.objects.reconstruir()
+        self.assertEqual(atuais, self.resumos())
+
+
+class ProjecaoFluxoTests(TestCase):
+    def test_saldo_projetado_por_periodo(self):
+        empresa = Empresa.objects.create(nome_fantasia="Buffet", cnpj="1")
+        caixa = Caixa.objects.create(empresa=empresa, banco="Banco", agencia=1, conta=1, saldo=1000)
+        despesa = CategoriaFinanceira.objects.create(nome="Compras", caixa=caixa, tipo='DE')
+        receita = CategoriaFinanceira.objects.create(nome="Eventos", caixa=caixa, tipo='RE')
+        hoje = date(2026, 10, 14)
+        for categoria, valor, dias in ((despesa, 10, -5), (despesa, 20, 0), (receita, 300, 8), (receita, 5, 200)):
+            LancamentoFinanceiro.objects.create(categoria=categoria, valor=valor,
+                                                data_vencimento=hoje + timedelta(days=dias))
+        LancamentoFinanceiro.objects.create(categoria=receita, valor=7, data_vencimento=hoje, status='PA')
+        linhas = lambda projecao: [(linha['periodo'], linha['receitas'], linha['despesas'], linha['saldo'])
+                                   for linha in projecao[caixa]]
+
+        # Pendências vencidas entram no primeiro período; as além do horizonte ficam de fora
+        with self.assertNumQueries(2):
+            projecao = projetar_fluxo(3, 'dia', inicio=hoje)
+        self.assertEqual(linhas(projecao), [(date(2026, 10, 14), 0, 30, 977), (date(2026, 10, 22), 300, 0, 1277)])
+        self.assertEqual(linhas(projetar_fluxo(3, 'semana', inicio=hoje)),
+                         [(date(2026, 10, 12), 0, 30, 977), (date(2026, 10, 19), 300, 0, 1277)])
+
+        saida = io.StringIO()
+        call_command('fluxo_caixa', '--periodo', 'semana', stdout=saida)
+        self.assertEqual(saida.getvalue().splitlines()[0], 'caixa,periodo,receitas,despesas,saldo')
+
+    def test_somar_meses_ajusta_o_dia(self):
+        self.assertEqual(somar_meses(date(2026, 1, 31), 1), date(2026, 2, 28))
+        self.assertEqual(somar_meses(date(2026, 11, 30), 3), date(2027, 2, 28))
+
+class ResumoFinanceiroTests(TestCase):
+    def test_resumo_incremental_igual_ao_reconstruido(self):
+        empresa = Empresa.objects.create(nome_fantasia="Buffet", cnpj="1")
+        caixa = Caixa.objects.create(empresa=empresa, banco="Banco", agencia=1, conta=1, saldo=0)
+        despesa = CategoriaFinanceira.objects.create(nome="Compras", caixa=caixa, tipo='DE')
+        receita = CategoriaFinanceira.objects.create(nome="Eventos", caixa=caixa, tipo='RE')
+        compra = LancamentoFinanceiro.objects.create(categoria=despesa, valor=10, data_vencimento=date(2026, 1, 5))
+        festa = LancamentoFinanceiro.objects.create(categoria=receita, valor=100, data_vencimento=date(2026, 1, 20))
+        sem_vencimento = LancamentoFinanceiro.objects.create(categoria=receita, valor=7)
+        LancamentoFinanceiro.objects.create(categoria=receita, valor=9, data_vencimento=date(2026, 2, 1)).delete()
+        compra.status = 'PA'
+        compra.save()
+        compra.valor = 12
+        compra.save()
+        festa.data_vencimento = date(2026, 3, 1)
+        festa.save()
+        LancamentoFinanceiro.objects.filter(pk=sem_vencimento.pk).liquidar(date(2026, 5, 5))
+
+        resumos = lambda: set(ResumoFinanceiroMensal.objects.filter(quantidade__gt=0).values_list(
+            'competencia', 'categoria', 'status', 'quantidade', 'total'))
+        atuais = resumos()
+        ResumoFinanceiroMensal.objects.reconstruir()
+        self.assertEqual(atuais, resumos())
+        self.assertEqual(
+            [(linha['competencia'], linha['receitas'], linha['despesas'], linha['resultado'])
+             for linha in ResumoFinanceiroMensal.objects.resultado('categoria__caixa')],
+            [(date(2026, 1, 1), 0, 12, -12), (date(2026, 3, 1), 100, 0, 100), (date(2026, 5, 1), 7, 0, 7)])
+
+class AgendamentoFinanceiroTests(TestCase):
+    def setUp(self):
+        empresa = Empresa.objects.create(nome_fantasia="Buffet", cnpj="1")
+        caixa = Caixa.objects.create(empresa=empresa, banco="Banco", agencia=1, conta=1, saldo=0)
+        self.receita = CategoriaFinanceira.objects.create(nome="Eventos", caixa=caixa, tipo='RE')
+        self.despesa = CategoriaFinanceira.objects.create(nome="Aluguel", caixa=caixa, tipo='DE')
+
+    def test_parcelas_e_recorrencias_em_lote(self):
+        cliente = Cliente.objects.create(nome="Maria", tipo='PF', cpf_cnpj="1")
+        evento = Evento.objects.create(cliente=cliente, nome_evento="Casamento", numero_convidados=10, valor_total=0)
+        AgendamentoFinanceiro.objects.create(modalidade='PC', contrato=Contrato.objects.create(evento=evento),
+                                             categoria=self.receita, descricao="Parcelas", valor=100,
+                                             numero_parcelas=3, data_inicio=date(2026, 1, 31))
+        AgendamentoFinanceiro.objects.create(categoria=self.despesa, descricao="Aluguel", valor=50,
+                                             data_inicio=date(2026, 1, 10), data_fim=date(2026, 6, 30))
+
+        self.assertEqual(len(AgendamentoFinanceiro.objects.gerar(12)), 3 + 6)
+        evento.refresh_from_db()
+        self.assertEqual(evento.valor_total, 100)
+        self.assertEqual(list(LancamentoFinanceiro.objects.filter(contrato__evento=evento).order_by('parcela')
+                              .values_list('valor', 'data_vencimento')),
+                         [(Decimal('33.33'), date(2026, 1, 31)), (Decimal('33.33'), date(2026, 2, 28)),
+                          (Decimal('33.34'), date(2026, 3, 31))])
+        self.assertEqual(AgendamentoFinanceiro.objects.gerar(12), [])
+        resumos = lambda: set(ResumoFinanceiroMensal.objects.filter(quantidade__gt=0).values_list(
+            'competencia', 'categoria', 'status', 'quantidade', 'total'))
+        atuais = resumos()
+        ResumoFinanceiroMensal.objects.reconstruir()
+        self.assertEqual(atuais, resumos())
+
+    def test_recorrencia_sem_fim_gera_sob_demanda(self):
+        luz = AgendamentoFinanceiro.objects.create(categoria=self.despesa, descricao="Luz", valor=5,
+                                                   data_inicio=date(2026, 1, 10))
+        agendamentos = AgendamentoFinanceiro.objects.filter(pk=luz.pk)
+        self.assertEqual(len(agendamentos.gerar(None, date(2026, 4, 1))), 3)
+        # A parcela de abril já venceu em 15/04: só as de maio e junho contam como a vencer
+        vencimentos = lambda: [lancamento.data_vencimento
+                               for lancamento in agendamentos.gerar(2, hoje=date(2026, 4, 15))]
+        self.assertEqual(vencimentos(), [date(2026, 4, 10), date(2026, 5, 10), date(2026, 6, 10)])
+        self.assertEqual(vencimentos(), [])
+        LancamentoFinanceiro.objects.filter(data_vencimento=date(2026, 5, 10)).liquidar()
+        self.assertEqual(vencimentos(), [date(2026, 7, 10)])
+        with self.assertRaises(ValueError):
+            agendamentos.gerar(None)
+
+    def test_execucoes_repetidas_nao_avancam_o_horizonte(self):
+        AgendamentoFinanceiro.objects.create(categoria=self.despesa, descricao="Aluguel", valor=50,
+                                             data_inicio=timezone.localdate())
+        for _ in range(2):
+            call_command('gerar_lancamentos_agendados', stdout=io.StringIO())
+            self.assertEqual(LancamentoFinanceiro.objects.count(), 12)
+        call_command('gerar_lancamentos_agendados', '--quantidade', '13', stdout=io.StringIO())
+        self.assertEqual(LancamentoFinanceiro.objects.count(), 13)
+
+
+class SaldoReceberTests(ConsultasChangelistMixin, TestCase):
+    def test_aging_por_cliente(self):
+        empresa = Empresa.objects.create(nome_fantasia="Buffet", cnpj="1")
+        caixa = Caixa.objects.create(empresa=empresa, banco="Banco", agencia=1, conta=1, saldo=0)
+        receita = CategoriaFinanceira.objects.create(nome="Eventos", caixa=caixa, tipo='RE')
+        despesa = CategoriaFinanceira.objects.create(nome="Compras", caixa=caixa, tipo='DE')
+        hoje = timezone.localdate()
+        contratos = []
+        for nome in ("Ana", "Bruno", "Carla"):
+            evento = Evento.objects.create(cliente=Cliente.objects.create(nome=nome, tipo='PF', cpf_cnpj=nome),
+                                           nome_evento="Festa", numero_convidados=1, valor_total=0)
+            contratos.append(Contrato.objects.create(evento=evento))
+        ana, bruno, carla = contratos
+
+        def lancar(contrato, valor, dias=None, categoria=receita):
+            vencimento = hoje + timedelta(days=dias) if dias is not None else None
+            return LancamentoFinanceiro.objects.create(contrato=contrato, categoria=categoria, valor=valor,
+                                                       data_vencimento=vencimento)
+
+        lancar(ana, 100, -45)
+        parcela = lancar(ana, 50, 5)
+        parcela.valor = 60
+        parcela.save()
+        atrasado = lancar(bruno, 70, -100)
+        atrasado.data_vencimento = hoje - timedelta(days=95)
+        atrasado.save()
+        lancar(bruno, 70, 0, categoria=despesa)
+        LancamentoFinanceiro.objects.filter(pk=lancar(carla, 10).pk).liquidar()
+        lancar(carla, 5, 0).delete()
+        cancelado = lancar(carla, 5, 0)
+        cancelado.status = 'CA'
+        cancelado.save()
+        AgendamentoFinanceiro.objects.create(modalidade='PC', contrato=carla, categoria=receita, descricao="Parcelas",
+                                             valor=90, numero_parcelas=3, data_inicio=hoje)
+        AgendamentoFinanceiro.objects.gerar(12)
+
+        saldos = lambda: set(SaldoReceberCliente.objects.filter(quantidade__gt=0).values_list(
+            'cliente', 'data_vencimento', 'quantidade', 'total'))
+        atuais = saldos()
+        SaldoReceberCliente.objects.reconstruir()
+        self.assertEqual(atuais, saldos())
+        with self.assertNumQueries(1):
+            aging = {linha['cliente__nome']: (linha['a_vencer'], linha['dias_31_60'], linha['acima_90'],
+                                              linha['em_aberto'])
+                     for linha in SaldoReceberCliente.objects.aging(hoje)}
+        self.assertEqual(aging, {"Ana": (60, 100, 0, 160), "Bruno": (0, 0, 70, 70), "Carla": (90, 0, 0, 90)})
+
+        self.assertContains(self.client.get(reverse('admin:financas_saldorecebercliente_changelist')), "Ana")
+
+class AutocompleteContratoTests(ConsultasChangelistMixin, TestCase):
+    def test_contratos_buscados_pelo_evento(self):
+        for numero in range(ConsultasChangelistMixin.linhas):
+            cliente = Cliente.objects.create(nome=f"Cliente {numero}", tipo='PF', cpf_cnpj=str(numero))
+            evento = Evento.objects.create(cliente=cliente, nome_evento=f"Festa {numero}", numero_convidados=1,
+                                           valor_total=0)
+            Contrato.objects.create(evento=evento)
+        parametros = {'term': 'festa', 'app_label': 'financas', 'model_name': 'lancamentofinanceiro',
+                      'field_name': 'contrato'}
+        # Sessão, usuário, contagem e página: o nome do evento vem na mesma consulta dos contratos
+        with self.assertNumQueries(4):
+            resposta = self.client.get(reverse('admin:autocomplete'), parametros)
+        self.assertEqual(len(resposta.json()['results']), ConsultasChangelistMixin.linhas)
+        # O formulário não lista os contratos: eles vêm do autocomplete
+        self.assertNotContains(self.client.get(reverse('admin:financas_lancamentofinanceiro_add')), "Festa 1")
+
+OFX = """OFXHEADER:100
+<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKTRANLIST>
+<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20260105120000[-3:BRT]<TRNAMT>-10.00<FITID>A1<MEMO>Fornecedor</STMTTRN>
+<STMTTRN>
+<TRNTYPE>CREDIT
+<DTPOSTED>20260110
+<TRNAMT>500,00
+<FITID>A2
+<CHECKNUM>77
+<MEMO>Cliente
+</STMTTRN>
+<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20260112<TRNAMT>-20.00<FITID>A3<MEMO>Tarifa</STMTTRN>
+</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>
+"""
+
+
+class ConciliacaoTests(ConsultasChangelistMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        empresa = Empresa.objects.create(nome_fantasia="Buffet", cnpj="1")
+        self.caixa = Caixa.objects.create(empresa=empresa, banco="Banco", agencia=1, conta=1, saldo=0)
+        self.despesa = CategoriaFinanceira.objects.create(nome="Compras", caixa=self.caixa, tipo='DE')
+        self.receita = CategoriaFinanceira.objects.create(nome="Eventos", caixa=self.caixa, tipo='RE')
+
+    def lancamento(self, categoria, valor, vencimento, **campos):
+        return LancamentoFinanceiro.objects.create(categoria=categoria, valor=valor, data_vencimento=vencimento,
+                                                   **campos)
+
+    def test_importa_e_concilia_extrato(self):
+        compra = self.lancamento(self.despesa, 10, date(2026, 1, 4))
+        sem_referencia = self.lancamento(self.receita, 500, date(2026, 1, 9))
+        boleto = self.lancamento(self.receita, 500, date(2026, 1, 10), observacoes="boleto 77")
+        self.lancamento(self.despesa, 20, date(2026, 1, 11))
+        self.lancamento(self.despesa, 20, date(2026, 1, 13))
+        transacoes = list(ler_ofx(io.StringIO(OFX)))
+        self.assertEqual(importar_extrato(self.caixa, transacoes), 3)
+        self.assertEqual(importar_extrato(self.caixa, transacoes + transacoes[:1]), 0)
+        self.assertEqual(TransacaoBancaria.objects.count(), 3)
+
+        # A tarifa tem dois candidatos na janela e fica para a conciliação manual
+        self.assertEqual(conciliar(self.caixa), (2, 1))
+        compra.refresh_from_db()
+        boleto.refresh_from_db()
+        sem_referencia.refresh_from_db()
+        self.assertEqual((compra.status, compra.data_pagamento), ('PA', date(2026, 1, 5)))
+        self.assertEqual((boleto.status, sem_referencia.status), ('PA', 'PE'))
+        self.caixa.refresh_from_db()
+        self.assertEqual(self.caixa.saldo, 490)
+
+    def test_lancamento_casado_sai_do_indice(self):
+        self.lancamento(self.despesa, 20, date(2026, 1, 11))
+        for identificador in ("T1", "T2"):
+            TransacaoBancaria.objects.create(caixa=self.caixa, identificador=identificador, data=date(2026, 1, 11),
+                                             valor=-20)
+        self.assertEqual(conciliar(self.caixa), (1, 1))
+
+    def test_csv_sem_identificador(self):
+        linhas = list(ler_csv(io.StringIO('data,valor,descricao\n12/01/2026,"-20,00",x\n12/01/2026,"-20,00",x\n')))
+        self.assertNotEqual(linhas[0]['identificador'], linhas[1]['identificador'])
 
-# Create your tests here.
+    def test_conciliacao_manual_valida_o_lancamento(self):
+        outro = Caixa.objects.create(empresa=self.caixa.empresa, banco="Outro", agencia=1, conta=2, saldo=0)
+        de_outro_caixa = self.lancamento(CategoriaFinanceira.objects.create(nome="Outro", caixa=outro, tipo='RE'),
+                                         500, date(2026, 1, 10))
+        pago = self.lancamento(self.receita, 500, date(2026, 1, 10), status='PA')
+        pendente = self.lancamento(self.receita, 500, date(2026, 1, 10))
+        transacao = TransacaoBancaria.objects.create(caixa=self.caixa, identificador="A2", data=date(2026, 1, 10),
+                                                     valor=500)
+        url = reverse('admin:financas_transacaobancaria_change', args=[transacao.pk])
+        for lancamento in (de_outro_caixa, pago):
+            resposta = self.client.post(url, {'lancamento': lancamento.pk, 'status': 'PE'})
+            self.assertEqual(resposta.status_code, 200)
+            self.assertTrue(resposta.context['adminform'].form.errors['lancamento'])
+        self.assertEqual(self.client.post(url, {'lancamento': pendente.pk, 'status': 'PE'}).status_code, 302)
+        transacao.refresh_from_db()
+        pendente.refresh_from_db()
+        self.assertEqual((transacao.status, transacao.lancamento, pendente.status), ('CO', pendente, 'PA'))
@@ -1,5 +1,9 @@
 from storages.backends.s3boto3 import S3Boto3Storage
 
-class MediaStorage(S3Boto3Storage):
+from core.armazenamento import ArmazenamentoPorConteudoMixin
+
+
+class MediaStorage(ArmazenamentoPorConteudoMixin, S3Boto3Storage):
     location = 'media'
-    file_overwrite = False
\ No newline at end of file
+    # O nome é o hash do conteúdo: o mesmo nome é sempre o mesmo arquivo
+    file_overwrite = True
@@ -11,6 +11,7 @@ class RegistroMovimentoAdmin(admin.ModelAdmin):
     list_display = ('funcionario', 'veiculo',
                     'data_saida', 'odometro_saida',
                     'data_chegada', 'odometro_chegada')
+    list_select_related = ('funcionario', 'veiculo')
 
 admin.site.register(Veiculo, VeiculoAdmin)
 admin.site.register(RegistroMovimento, RegistroMovimentoAdmin)
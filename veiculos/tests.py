@@ -1,3 +1,19 @@
+from datetime import date
+
 from django.test import TestCase
+from django.utils import timezone
+
+from core.models import Funcao, Funcionario
+from core.tests import ConsultasChangelistMixin
+from .models import RegistroMovimento, Veiculo
+
 
-# Create your tests here.
+class ChangelistVeiculosTests(ConsultasChangelistMixin, TestCase):
+    def test_registro_movimento(self):
+        def criar(numero):
+            funcao = Funcao.objects.create(nome=f"Função {numero}", valor_hora=10)
+            funcionario = Funcionario.objects.create(nome=f"Motorista {numero}", funcao=funcao,
+                                                     data_admissao=date.today())
+            RegistroMovimento.objects.create(veiculo=Veiculo.objects.create(marca="Fiat", modelo=f"Fiorino {numero}"),
+                                             funcionario=funcionario, data_saida=timezone.now())
+        self.assertChangelistConsultas(RegistroMovimento, criar, 5)